@@ -0,0 +1,237 @@
+import re
+import sys
+
+import corefwindow
+from nonlpparse import claim_bounds, parse_depends
+from spanindex import SpanIndex
+
+#antecedent basis without a model: claims introduce every element with "a"/"an" ("a lid") and refer back to it with
+#"the"/"said" ("the lid", "said lid"), so most of coreference in a claim is matching those noun phrases up
+#   clusters, issues, pronouns = antecedent_basis(text)   #clusters in the same (start_char, end_char) form as corefwindow
+#   clusters = resolve_clusters(text, corefwindow.spacy_coref(nlp))   #plus the model, but only for "it"/"which"/...
+#each claim in a claim set has its own antecedents, plus those of the claims it depends on ("the lid of claim 1")
+#a definite mention that has nothing to point back to is reported as missing, one that could be several is ambiguous
+#run "python antecedents.py < claims.txt" to print the clusters and the antecedent problems of a claim set
+
+WORD_RX = re.compile(r"[A-Za-z][A-Za-z0-9\-]*|\d+(?:\.\d+)?|[^\w\s]")
+INDEFINITE = {"a", "an"}
+DEFINITE = {"the", "said"}
+PRONOUNS = {"it", "its", "itself", "they", "them", "their", "which"}
+QUANTITY = {"plurality", "number", "pair", "set", "series", "group", "array"} #"a plurality of pins" also introduces "the pins"
+NOT_A_REFERENCE = {"same", "other", "rest", "remainder", "one", "ones"} #"the same", "the other" point at nothing of their own
+MAX_WORDS = 6 #longest noun phrase we index
+
+#words a noun phrase never runs through, the phrase after a determiner stops right before any of these
+ENDS_PHRASE = {
+    "a", "an", "the", "said", "each", "every", "any", "all", "its", "their", "this", "that", "these", "those",
+    "and", "or", "but", "nor", "which", "who", "whom", "whose", "wherein", "whereby", "where", "when", "while",
+    "is", "are", "was", "were", "be", "been", "being", "has", "have", "having", "can", "may", "must", "will",
+    "comprising", "comprises", "including", "includes", "consisting", "containing", "contains",
+    "configured", "adapted", "operable", "capable", "arranged", "positioned", "located", "such", "so", "not",
+    "to", "in", "on", "at", "for", "from", "with", "without", "through", "about", "by", "into", "onto", "over",
+    "under", "between", "along", "within", "adjacent", "opposite", "relative", "via", "against", "around",
+    "across", "toward", "towards", "upon", "above", "below", "behind", "beneath", "near", "after", "before",
+    "during", "of", "than", "therefrom", "thereto", "therein", "thereon", "thereby", "further",
+}
+PARTICIPLE_ENDS = ("ed", "ing", "able", "ible")
+
+
+def _words(text, start, end):
+    #(start, end, lowercase word) for every word and punctuation mark
+    return [(m.start(), m.end(), m.group().lower()) for m in WORD_RX.finditer(text, start, end)]
+
+def _breaks(word):
+    return word in ENDS_PHRASE or not word[0].isalnum()
+
+def _phrase(words, i):
+    #index one past the last word of the noun phrase after the determiner at i
+    j = i + 1
+    while j < len(words) and j - i <= MAX_WORDS:
+        w = words[j][2]
+        nxt = words[j + 1][2] if j + 1 < len(words) else "."
+        if w == "of" and words[j - 1][2] in QUANTITY and j > i + 1 and not _breaks(nxt):
+            j += 1 #"plurality of lift pins" is one phrase
+            continue
+        if _breaks(w):
+            break
+        if j > i + 1 and w.endswith(PARTICIPLE_ENDS) and len(w) > 4 and (_breaks(nxt) or nxt.endswith("ly")):
+            break #"a lid coupled to", "an arm extending generally", but "a housing" and "the driving part" stay whole
+        if w.endswith("ly") and nxt.endswith(PARTICIPLE_ENDS):
+            break #"a lid fixedly attached", while "a substantially inert environment" stays whole
+        if j > i + 1 and (nxt in INDEFINITE or nxt in DEFINITE):
+            break #a word with an object right after it is the verb, "the spring presses the lid"
+        j += 1
+    return j
+
+def _keys(key):
+    #"plurality of lift pins" can be referred to as itself or as "the lift pins"
+    yield key
+    if len(key) > 2 and key[0] in QUANTITY and key[1] == "of":
+        yield key[2:]
+
+
+def claim_scopes(text):
+    #(claim number, start, end, parent claim numbers) per claim, parents only ever point at earlier claims we saw
+    seen = set()
+    out = []
+    for cid, start, end in claim_bounds(text):
+        parents = [p for p in parse_depends(text[start:end]) or [] if p in seen and cid is not None and p < cid]
+        out.append((cid, start, end, parents))
+        seen.add(cid)
+    return out
+
+def antecedent_basis(text):
+    #clusters: [[(start_char, end_char), ...], ...], each one starting with the "a/an" mention that introduced it
+    #issues: {"start", "end", "text", "problem"} for definite mentions with no ("missing") or no single ("ambiguous") antecedent
+    #pronouns: (start_char, end_char) of the pronouns, which rules cant place
+    entities = [] #entity id -> its mentions
+    intros = {} #claim number -> {key: [(start, entity id), ...]}, in text order
+    heads = {} #claim number -> {last word: [(start, entity id, key), ...]}
+    issues = []
+    pronouns = []
+    parents_of = {}
+    bounds = {}
+    for cid, start, end, parents in claim_scopes(text):
+        parents_of[cid] = parents
+        bounds[cid] = (start, end)
+        scope = [cid] #this claim, then every claim it depends on, nearest first
+        for c in scope:
+            for p in parents_of.get(c, []):
+                if p not in scope:
+                    scope.append(p)
+        own_intros = intros.setdefault(cid, {})
+        own_heads = heads.setdefault(cid, {})
+        words = _words(text, start, end)
+        i = 0
+        while i < len(words):
+            w_start, _w_end, w = words[i]
+            if w in PRONOUNS:
+                pronouns.append((w_start, words[i][1]))
+                i += 1
+                continue
+            if w not in INDEFINITE and w not in DEFINITE:
+                i += 1
+                continue
+            j = _phrase(words, i)
+            if j == i + 1 or words[i + 1][2] in NOT_A_REFERENCE:
+                i += 1
+                continue
+            key = tuple(x[2] for x in words[i + 1:j])
+            if w in INDEFINITE:
+                span = (w_start, words[j - 1][1]) #a new element, even when one with the same name came before it
+                ent = len(entities)
+                entities.append([span])
+                for k in _keys(key):
+                    own_intros.setdefault(k, []).append((w_start, ent))
+                    own_heads.setdefault(k[-1], []).append((w_start, ent, k))
+            else:
+                ent, problem, n = _find(key, w_start, scope, intros, heads)
+                if problem == "missing": #"receiving data; ... the data", plural and mass nouns come without an article
+                    bare, found, n = _bare(text, key, w_start, scope, bounds)
+                    if bare is not None:
+                        ent, problem = len(entities), None
+                        entities.append([bare])
+                        own_intros.setdefault(found, []).append((bare[0], ent))
+                        own_intros[found].sort()
+                        own_heads.setdefault(found[-1], []).append((bare[0], ent, found))
+                        own_heads[found[-1]].sort()
+                j = i + 1 + n #the mention is only as long as what it matched, "the lid" in "the lid opposite"
+                span = (w_start, words[j - 1][1])
+                if ent is None:
+                    issues.append({"start": span[0], "end": span[1], "text": text[span[0]:span[1]], "problem": problem})
+                else:
+                    entities[ent].append(span)
+            i = j
+    clusters = [m for m in entities if len(m) > 1]
+    return clusters, issues, pronouns
+
+def _latest(entries, pos, own):
+    #the last introduction before pos in the mention's own claim, or the last one at all in a parent claim
+    best = None
+    for start, ent, *_rest in entries:
+        if own and start >= pos:
+            break
+        best = ent
+    return best
+
+def _bare(text, key, pos, scope, bounds):
+    #(span, words it matched, words of the mention covered) for the same words earlier in the claim (or anywhere in a
+    #claim it depends on) without a determiner in front: the whole phrase, the phrase cut short ("the data to be"),
+    #then the phrase without its first words ("the stored data" after "storing data")
+    tries = [(key[:n], n) for n in range(len(key), 1, -1)] + [(key[n:], len(key)) for n in range(len(key))]
+    for words, covered in tries:
+        rx = re.compile(r"(?<![\w-])" + r"\s+".join(re.escape(w) for w in words) + r"(?![\w-])", re.I)
+        for c in scope:
+            start, end = bounds[c]
+            for m in rx.finditer(text, start, pos if c == scope[0] else end):
+                before = text[max(start, m.start() - 8):m.start()].split()
+                if not before or before[-1].lower() not in INDEFINITE | DEFINITE:
+                    return m.span(), words, covered
+    return None, key, len(key)
+
+def _find(key, pos, scope, intros, heads):
+    #(entity id, None, words matched) or (None, "missing"/"ambiguous", words) for the definite mention `key` at pos
+    for n in range(len(key), 0, -1): #"the lid opposite" when the phrase ran too far, longest match first
+        for c in scope:
+            ent = _latest(intros.get(c, {}).get(key[:n], []), pos, c == scope[0])
+            if ent is not None:
+                return ent, None, n
+    #"the extension" after "a first extension", or else "the stored data" after "data": fine when there is only one
+    #thing it can be
+    for longer in (True, False):
+        candidates = []
+        for c in scope:
+            for start, ent, k in heads.get(c, {}).get(key[-1], []):
+                if c == scope[0] and start >= pos:
+                    break
+                if longer and len(k) > len(key) and k[-len(key):] == key or not longer and len(k) < len(key) and key[-len(k):] == k:
+                    if ent not in candidates:
+                        candidates.append(ent)
+            if candidates:
+                break #the nearest claim that has one wins
+        if len(candidates) == 1:
+            return candidates[0], None, len(key)
+        if candidates:
+            return None, "ambiguous", len(key)
+    return None, "missing", len(key)
+
+
+def resolve_clusters(text, coref=None, **window):
+    #antecedent_basis clusters, with the pronouns put in by the coref model (a corefwindow adapter) when one is given
+    #the model only sees the windows that have a pronoun in them, a claim without one never loads it
+    clusters, _issues, pronouns = antecedent_basis(text)
+    if coref is None or not pronouns:
+        return clusters
+    is_pronoun = set(pronouns)
+    mentions = [(s, e) for c in clusters for s, e in c]
+    owner = [n for n, c in enumerate(clusters) for _m in c]
+    index = SpanIndex([(s, e - 1) for s, e in mentions], owner)
+    clusters = [list(c) for c in clusters]
+    extra = {} #anchor span -> new cluster, for pronouns pointing at something the rules didnt cluster
+    for model_cluster in corefwindow.resolve_clusters(text, coref, need=[s for s, _e in pronouns], **window):
+        anchor = None
+        for s, e in model_cluster:
+            if (s, e) not in is_pronoun:
+                anchor = (s, e)
+                continue
+            if anchor is None:
+                continue #a pronoun before anything it could mean
+            hits = index.overlapping(anchor[0], anchor[1] - 1)
+            if hits:
+                clusters[hits[0][1]].append((s, e))
+            else:
+                extra.setdefault(anchor, [anchor]).append((s, e))
+    out = [sorted(c) for c in clusters] + list(extra.values())
+    out.sort()
+    return out
+
+
+if __name__ == "__main__":
+    text = sys.stdin.read()
+    clusters, issues, pronouns = antecedent_basis(text)
+    for c in clusters:
+        print(" <- ".join(text[s:e] for s, e in c))
+    for issue in issues:
+        print(f"{issue['problem']} antecedent: {issue['text']!r} at {issue['start']}")
+    if pronouns:
+        print(f"{len(pronouns)} pronouns need the coref model")
@@ -0,0 +1,117 @@
+import json
+import re
+import subprocess
+import sys
+import time
+
+import corefwindow
+import nlploader
+from benchrawspacy import CLAIMS
+from nonlpparse import NUM_RX
+
+#times whole-text coreference against the windowed engine in corefwindow.py on claim sets of 2k-10k tokens
+#every (size, mode) runs in a fresh interpreter so the peak memory it reports is its own
+#"python benchcoref.py" uses a toy determiner-noun coref so the windowing and merging can be timed without a model
+#"python benchcoref.py --model en_coreference_web_trf" runs the real spacy coref model (the whole-text run may not fit)
+#the link columns are how many of the whole-text run's mention pairs the windowed run also put in one cluster, and
+#how many of its own pairs the whole-text run agrees with
+
+SIZES = [2000, 4000, 6000, 8000, 10000]
+MENTION_RX = re.compile(r"\b(an?|the|said)\s+(\w+)", re.I)
+
+
+def claim_set(n_tokens):
+    #numbered claims from benchrawspacy repeated until the set has about n_tokens tokens
+    out, n, i = [], 0, 0
+    while n < n_tokens:
+        claim = CLAIMS[i % len(CLAIMS)]
+        out.append(f"{i + 1}. {claim}")
+        n += corefwindow.count_tokens(claim) + 2
+        i += 1
+    return "\n".join(out)
+
+def toy_coref(texts):
+    #antecedent basis the way claims use it: "a/an X" starts a new X, "the/said X" is the latest X before it
+    #in the same claim (the bench claims are all independent)
+    out = []
+    for text in texts:
+        clusters, latest = [], {}
+        starts = [m.start() for m in NUM_RX.finditer(text)]
+        for m in MENTION_RX.finditer(text):
+            if starts and m.start() >= starts[0]:
+                latest = {}
+                while starts and m.start() >= starts[0]:
+                    starts.pop(0)
+            noun = m.group(2).lower()
+            if m.group(1).lower() in ("a", "an") or noun not in latest:
+                latest[noun] = len(clusters)
+                clusters.append([])
+            clusters[latest[noun]].append(m.span())
+        out.append([c for c in clusters if len(c) > 1])
+    return out
+
+def coref_fn(model):
+    if model is None:
+        return toy_coref
+    return corefwindow.spacy_coref(nlploader.load(model, "full"))
+
+def run_one(size, mode, model, max_tokens, overlap):
+    text = claim_set(size)
+    coref = coref_fn(model)
+    coref(["A warm up call; the call loads the model."]) #dont time the model load
+    t0 = time.perf_counter()
+    if mode == "whole":
+        windows = 1
+        clusters = corefwindow.merge_clusters([(0, coref([text])[0])])
+    else:
+        windows = len(corefwindow.make_windows(text, max_tokens, overlap))
+        clusters = corefwindow.resolve_clusters(text, coref, max_tokens, overlap)
+    return {"seconds": time.perf_counter() - t0, "windows": windows, "clusters": clusters,
+            "tokens": corefwindow.count_tokens(text), "peak_rss_mb": nlploader.peak_rss_mb()}
+
+def links(clusters):
+    #every (mention, mention) pair that shares a cluster
+    pairs = set()
+    for c in clusters:
+        c = [tuple(m) for m in c]
+        for i in range(len(c)):
+            for j in range(i + 1, len(c)):
+                pairs.add((c[i], c[j]))
+    return pairs
+
+def run_fresh(size, mode, model, max_tokens, overlap):
+    args = [sys.executable, __file__, "--one", str(size), mode, str(max_tokens), str(overlap)]
+    if model:
+        args += ["--model", model]
+    proc = subprocess.run(args, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": (proc.stderr.strip().splitlines() or ["no output"])[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    model = sys.argv[sys.argv.index("--model") + 1] if "--model" in sys.argv else None
+    if "--one" in sys.argv:
+        i = sys.argv.index("--one")
+        size, mode, max_tokens, overlap = sys.argv[i + 1:i + 5]
+        print(json.dumps(run_one(int(size), mode, model, int(max_tokens), int(overlap))))
+        sys.exit()
+
+    max_tokens, overlap = 384, 96
+    print(f"coref: {model or 'toy'}, windows of {max_tokens} tokens sharing {overlap}")
+    print(f"{'tokens':>7} {'mode':<9} {'windows':>7} {'seconds':>8} {'peak MB':>8} {'clusters':>8} {'recall':>7} {'precision':>9}")
+    for size in SIZES:
+        whole = run_fresh(size, "whole", model, max_tokens, overlap)
+        for mode, row in (("whole", whole), ("windowed", run_fresh(size, "windowed", model, max_tokens, overlap))):
+            if "error" in row:
+                print(f"{size:>7} {mode:<9} failed: {row['error']}")
+                continue
+            recall = precision = "-"
+            if mode == "windowed" and "error" not in whole:
+                truth, got = links(whole["clusters"]), links(row["clusters"])
+                recall = f"{len(truth & got) / len(truth):.3f}" if truth else "-"
+                precision = f"{len(truth & got) / len(got):.3f}" if got else "-"
+            rss = row["peak_rss_mb"]
+            rss = f"{rss:>8.0f}" if rss is not None else f"{'?':>8}"
+            print(f"{row['tokens']:>7} {mode:<9} {row['windows']:>7} {row['seconds']:>8.3f} {rss} "
+                  f"{len(row['clusters']):>8} {recall:>7} {precision:>9}")
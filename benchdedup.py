@@ -0,0 +1,83 @@
+import random
+import time
+
+import claimdedup
+
+#times the old every-requirement-against-every-other redundancy filter against claimdedup on big fake subject groups
+#run it with "python benchdedup.py"
+
+WORDS = ("the", "first", "second", "end", "portion", "arm", "column", "connected", "with", "to", "having", "a",
+         "channel", "extending", "generally", "vertically", "support", "frame", "rotatable", "relative", "driving", "part")
+
+def make_group(n, seed=0):
+    #n requirement dicts under one generic subject, about a third of them are pieces of other ones
+    rng = random.Random(seed)
+    reqs = []
+    while len(reqs) < n:
+        if reqs and rng.random() < 0.35:
+            src = rng.choice(reqs).split()
+            i = rng.randrange(len(src))
+            piece = " ".join(src[i:i + rng.randint(1, max(1, len(src) - i))])
+            reqs.append(piece)
+        else:
+            reqs.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 16))))
+    reqs = list(dict.fromkeys(reqs)) #get_claims has already removed exact duplicates by this point
+    return [{"subject": "the device", "requirement": r, "index": i} for i, r in enumerate(reqs)]
+
+
+def make_worst_group(n, seed=0):
+    #n requirements none of which is inside another, so every find in drop_contained scans everything before it
+    rng = random.Random(seed)
+    reqs = ["".join(rng.choice("ab") for _ in range(40)) + f" {i}" for i in range(n)]
+    return [{"subject": "the device", "requirement": r, "index": i} for i, r in enumerate(reqs)]
+
+
+def old_filter(items): #what cleantest3/cleantest4 used to do for each subject group
+    reqs = [i['requirement'] for i in items]
+    filtered = []
+    for r in reqs:
+        redundant = False
+        for o in reqs:
+            if r != o and r in o:
+                redundant = True
+                break
+        if not redundant:
+            filtered.append(r)
+    out = []
+    for r in filtered:
+        for i in items:
+            if i['requirement'] == r:
+                out.append(i)
+                break
+    return out
+
+def timeit(fn, arg, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        dt = time.perf_counter() - t0
+        if best is None or dt < best:
+            best = dt
+    return best
+
+
+if __name__ == "__main__":
+    print(f"{'reqs':>6} {'kept':>6} {'old ms':>9} {'new ms':>9} {'speedup':>8}")
+    for n in (50, 200, 800, 3200):
+        items = make_group(n, seed=n)
+        assert old_filter(items) == claimdedup.drop_contained_items(items)
+        repeat = 5 if n <= 800 else 1
+        t_old = timeit(old_filter, items, repeat) * 1000
+        t_new = timeit(claimdedup.drop_contained_items, items, repeat) * 1000
+        kept = len(claimdedup.drop_contained_items(items))
+        print(f"{len(items):>6} {kept:>6} {t_old:>9.2f} {t_new:>9.2f} {t_old / t_new:>7.1f}x")
+
+    #drop_contained is O(n * total length) here, doubling n about quadruples the time
+    print("worst case, nothing is contained in anything")
+    print(f"{'reqs':>6} {'chars':>8} {'old ms':>9} {'new ms':>9}")
+    for n in (1000, 2000, 4000, 8000, 16000):
+        items = make_worst_group(n, seed=n)
+        t_new = timeit(claimdedup.drop_contained_items, items, 1) * 1000
+        old = f"{timeit(old_filter, items, 1) * 1000:>9.2f}" if n <= 2000 else f"{'-':>9}" #the old filter alone would take most of a minute past this
+        print(f"{n:>6} {sum(len(i['requirement']) for i in items):>8} {old} {t_new:>9.2f}")
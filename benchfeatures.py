@@ -0,0 +1,139 @@
+import random
+import sys
+import time
+
+import nlploader
+import rawspacytest as R
+from benchrawspacy import CLAIMS
+from spanindex import SpanIndex, drop_nested
+
+#times the old Token-by-Token findBounds and span filters in rawspacytest against the to_array/numpy ones
+#the docs are parsed up front so only the filtering is timed, run it with "python benchfeatures.py" (needs en_core_web_sm)
+#"python benchfeatures.py --synthetic" uses random claim-sized parse trees on a blank pipeline instead of the model
+
+FUNCTION_POS = {"ADP","DET","PRON","PART","PUNCT","CCONJ","SCONJ"}
+
+
+def old_findBounds(tok):
+    rightmost_index = None
+    for t in tok.subtree:
+        if rightmost_index is None or t.i > rightmost_index:
+            rightmost_index = t.i
+    return (tok.left_edge.i, rightmost_index)
+
+def old_extract(doc, req_text): #extract_subrequirements before the feature arrays, minus the nlp() call
+    cand = []
+    for tok in doc:
+        if tok.dep_ in R.CLAUSE_DEPS:
+            cand.append(old_findBounds(tok))
+    for i, tok in enumerate(doc):
+        if tok.lower_ == "to" and i+1 < len(doc) and doc[i+1].pos_ in R.VERBISH_POS:
+            cand.append(old_findBounds(tok))
+    for tok in doc:
+        if tok.dep_ == "prep":
+            s, e = old_findBounds(tok)
+            span = doc[s:e+1]
+            content = [t for t in span if t.pos_ in R.CONTENT_POS]
+            if len(span) >= 5 and len(content) >= 2:
+                cand.append((s, e))
+    kept = drop_nested(cand)
+    conjs = [c for c in doc if c.dep_ == "conj"]
+    conj_index = SpanIndex([old_findBounds(c) for c in conjs], [c.head.i for c in conjs])
+    split_spans = []
+    for s, e in kept:
+        local = [(cs, ce) for (cs, ce), h in conj_index.inside(s, e) if s <= h <= e]
+        split_spans.extend(local or [(s, e)])
+    out, seen = [], set()
+    for s, e in sorted(set(split_spans), key=lambda se: se[0]):
+        span = doc[s:e+1]
+        if len(span) < 3: continue
+        func = sum(1 for t in span if t.pos_ in FUNCTION_POS)
+        if func / len(span) > 0.6: continue
+        text = span.text.strip(" ,.;")
+        base = set(w.lower() for w in R.re.findall(r"\w+", req_text))
+        here = set(w.lower() for w in R.re.findall(r"\w+", text))
+        if here and len(here & base) / len(here) >= 0.8: continue
+        if text not in seen:
+            seen.add(text); out.append(text)
+    return out
+
+def old_actions(doc, text): #decompose_actions before the feature arrays, for docs without a colon
+    if not list(doc): return [text]
+    if R.colon_index(doc) is not None: raise ValueError("bench docs shouldnt have a colon")
+    roots = [t for t in doc if t.dep_ == "ROOT" and t.pos_ in R.VERBISH_POS]
+    roots += [t for t in doc if t.pos_ in R.VERBISH_POS and t.dep_ in {"conj","xcomp","ccomp","parataxis"}]
+    if not roots: return [text]
+    kept = drop_nested([old_findBounds(h) for h in roots], longest_first=False)
+    out = []
+    for s, e in kept:
+        span = doc[s:e+1]
+        if sum(1 for t in span if t.pos_ in R.CONTENT_POS) >= 2:
+            out.append(span.text.strip(" ,.;"))
+    return out if len(out) >= 2 else [text]
+
+def new_extract(doc, req_text):
+    return R.extract_subrequirements(req_text, lambda _text: doc)
+
+def new_actions(doc, text):
+    return R.decompose_actions(text, lambda _text: doc)
+
+
+def synthetic_docs(n_docs, seed=0):
+    #random projective trees the size of a long claim, tagged with the same POS/dep labels the filters look at
+    import spacy
+    from spacy.tokens import Doc
+    nlp = spacy.blank("en")
+    rng = random.Random(seed)
+    pos = ["NOUN","NOUN","VERB","AUX","ADJ","ADP","DET","PRON","PART","PUNCT","CCONJ","PROPN","ADV"]
+    deps = ["relcl","acl","advcl","ccomp","xcomp","prep","prep","conj","pobj","det","amod","nsubj","dobj","cc","compound"]
+    words = ["the","support","arm","to","drive","column","with","a","frame","relative","and","portion","slide"]
+    docs = []
+    for _ in range(n_docs):
+        n = rng.randint(120, 260)
+        heads = [0] * n
+        stack = [(0, n, None)]
+        while stack:
+            lo, hi, parent = stack.pop()
+            if lo >= hi: continue
+            r = rng.randrange(lo, hi)
+            heads[r] = r if parent is None else parent
+            stack += [(lo, r, r), (r + 1, hi, r)]
+        labels = [("ROOT" if heads[i] == i else rng.choice(deps)) for i in range(n)]
+        docs.append(Doc(nlp.vocab, words=[rng.choice(words) for _ in range(n)], heads=heads, deps=labels,
+                        pos=[rng.choice(pos) for _ in range(n)]))
+    return docs
+
+def model_docs(repeat):
+    nlp = nlploader.load("en_core_web_sm", "split")
+    #every whole claim plus each of its semicolon elements, the long inputs are where the subtree walks hurt
+    texts = [piece.replace(":", ",") for c in CLAIMS for piece in [c] + c.split(";") if piece.strip()]
+    return list(nlp.pipe(texts * repeat))
+
+def timeit(fn, docs, repeat=3):
+    best = None
+    for _ in range(repeat):
+        for d in docs:
+            d.user_data.pop(R.FEATURES_KEY, None) #count building the arrays too
+        t0 = time.perf_counter()
+        out = [fn(d, d.text) for d in docs]
+        dt = time.perf_counter() - t0
+        if best is None or dt < best:
+            best = dt
+    return best, out
+
+
+if __name__ == "__main__":
+    docs = synthetic_docs(200) if "--synthetic" in sys.argv else model_docs(20)
+    print(f"{len(docs)} docs, {sum(len(d) for d in docs) / len(docs):.0f} tokens each on average")
+    print(f"{'':<24} {'old ms':>9} {'new ms':>9} {'speedup':>8}")
+
+    t_old, out_old = timeit(lambda d, _t: [old_findBounds(t) for t in d], docs)
+    t_new, out_new = timeit(lambda d, _t: [R.findBounds(t) for t in d], docs)
+    assert out_old == out_new, "findBounds"
+    print(f"{'findBounds every token':<24} {t_old * 1000:>9.1f} {t_new * 1000:>9.1f} {t_old / t_new:>7.1f}x")
+
+    for name, old, new in (("extract_subrequirements", old_extract, new_extract), ("decompose_actions", old_actions, new_actions)):
+        t_old, out_old = timeit(old, docs)
+        t_new, out_new = timeit(new, docs)
+        assert out_old == out_new, name
+        print(f"{name:<24} {t_old * 1000:>9.1f} {t_new * 1000:>9.1f} {t_old / t_new:>7.1f}x")
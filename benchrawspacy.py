@@ -0,0 +1,112 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import time
+import types
+
+import nlploader
+import rawspacytest as R
+
+#compares the outline pipeline in rawspacytest as it was at the baseline commit (read out of git, one nlp() call per
+#piece) against the current one, one claim at a time with a plain nlp and batched through DocEngine
+#run it with "python benchrawspacy.py" (needs en_core_web_sm), pass a number to repeat the claim set more times
+
+CLAIMS = [
+    "A child motion apparatus comprising: a base frame assembly for providing standing support on a floor; a column connected with the base frame assembly; a support arm extending generally horizontally relative to the column, the support arm having a first and a second end portion, the first end portion being assembled with the column and having a channel extending generally vertically, the support arm further being connected with the column via a hinge about which the support arm is rotatable generally horizontally relative to the column; a child seat connected with the second end portion of the support arm; a vertical actuating mechanism supported by the base frame assembly and operable to drive the column to slide upward and downward relative to the base frame assembly; and a horizontal actuating mechanism operable to drive the support arm to oscillate generally horizontally relative to the column, the horizontal actuating mechanism including a driving part movable along a circular path and guided for sliding movement along the channel at the first end portion of the support arm, wherein a circular motion of the driving part causes the driving part to slide along the channel and thereby drives an oscillating movement of the support arm.",
+    "A nanoscale device comprising an elongated crystalline semiconductor nanostructure having a plurality of substantially plane side facets, and a first facet layer of a superconductor material covering at least a part of one or more of said side facets, wherein the interface between the at least one facet of the elongated crystalline semiconductor nanostructure and the first facet layer is configured to induce a superconductor hard gap in the semiconductor nanostructure.",
+    "A method for execution by one or more processing modules of one or more computing devices of a dispersed storage network (DSN), the method comprises: receiving and storing data; receiving a corresponding task(s) to be executed on the stored data; selecting a number of distributed storage and task execution (DST EX) units to favorably execute partial tasks of the corresponding task(s), wherein the partial tasks are processed in parallel to complete an overall task within a desired task execution time period; determining task partitioning based on one or more of distributed computing capabilities of the selected DST EX units; determining processing parameters of the data based on the task partitioning; partitioning the task(s) based on the task partitioning to produce the partial tasks; processing the data in accordance with the processing parameters to produce slice groupings, wherein the slice groupings include groups of encoded data slices; and sending the slice groupings and corresponding partial tasks to the DST EX units in accordance with a pillar mapping.",
+]
+
+
+class CountingNLP: #the plain pipeline, but counting how many docs we asked it for
+    def __init__(self, nlp):
+        self.nlp = nlp
+        self.parsed = 0
+
+    def __call__(self, text):
+        self.parsed += 1
+        return self.nlp(text)
+
+
+BASELINE = "238f1e8" #the commit before any of the rawspacytest speedups
+
+
+def load_baseline():
+    #rawspacytest.py as it was at BASELINE, as a module of its own, None when there is no git checkout to read it from
+    try:
+        src = subprocess.run(["git", "show", f"{BASELINE}:rawspacytest.py"], capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    mod = types.ModuleType("rawspacytest_baseline")
+    exec(compile(src, f"{BASELINE}:rawspacytest.py", "exec"), mod.__dict__)
+    return mod
+
+def run_baseline(claims, nlp, B):
+    #the baseline main block, once per claim: B is the module load_baseline() gives
+    counter = CountingNLP(nlp)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        for text in claims:
+            head, body = B.detect_head(text, counter)
+            req_with_subs = []
+            for main, pre_subs in B.rethread_requirements(B.split_requirements(body, counter), counter):
+                colon_tail = B.split_tail_after_colon_as_subs(main)
+                main_head = main.split(':', 1)[0].strip(" ,.") if ':' in main else main
+                head_only, wh_from_main = B.split_wherein(main_head)
+                structural = B.extract_subrequirements(head_only, counter)
+                flat_subs = list(dict.fromkeys(colon_tail + pre_subs + wh_from_main + structural))
+                req_with_subs.append((head_only, flat_subs))
+            B.render_outline(head, req_with_subs, counter)
+    return counter.parsed, out.getvalue()
+
+def run_old(claims, nlp): #the current pipeline one claim at a time with a plain nlp, no DocEngine
+    counter = CountingNLP(nlp)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        for text in claims:
+            for head, reqs in R.build_outlines([text], counter):
+                R.render_outline(head, reqs, counter)
+    return counter.parsed, out.getvalue()
+
+def run_new(claims, nlp, batch_size):
+    engine = R.DocEngine(nlp, batch_size=batch_size)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        for head, reqs in R.build_outlines(claims, engine):
+            R.render_outline(head, reqs, engine)
+    return engine.parsed, out.getvalue()
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    res = fn(*args)
+    return time.perf_counter() - t0, res
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    nlp = nlploader.load("en_core_web_sm", "split")
+    #the same claim set repeated, plus a small edit to each copy so they arent all identical strings
+    claims = [c.replace("comprising", "comprising" if i % 2 else "including") for i in range(repeat) for c in CLAIMS]
+    nlp("warm up") #first call loads vectors etc, dont count it
+
+    print(f"{'run':<16} {'docs':>6} {'sec':>8} {'docs/sec':>9} {'claims/sec':>11}")
+    def row(name, t, docs, out, ref):
+        same = "" if ref is None or out == ref else "  (output differs!)"
+        print(f"{name:<16} {docs:>6} {t:>8.2f} {docs / t:>9.1f} {len(claims) / t:>11.2f}{same}")
+
+    ref = None
+    B = load_baseline()
+    if B is None:
+        print(f"(no git checkout with {BASELINE} in it, skipping the baseline run)")
+    else:
+        t_base, (docs_base, ref) = timed(run_baseline, claims, nlp, B)
+        row("baseline", t_base, docs_base, ref, None)
+    t_old, (docs_old, out_old) = timed(run_old, claims, nlp)
+    row("per claim", t_old, docs_old, out_old, ref)
+    ref = ref if ref is not None else out_old
+    for bs in (8, 32, 128):
+        t_new, (docs_new, out_new) = timed(run_new, claims, nlp, bs)
+        row(f"batch {bs}", t_new, docs_new, out_new, ref)
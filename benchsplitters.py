@@ -0,0 +1,139 @@
+import time
+
+import nonlpparse
+
+#this compares the old char-by-char splitters against the shared lexer in nonlpparse on long claims
+#run it with "python benchsplitters.py"
+
+#old versions, kept here only so we have something to compare against
+def old_split_semicolons(s):
+    parts, buf = [], []
+    dp = db = dc = 0
+    for ch in s:
+        if ch == '(': dp += 1
+        elif ch == ')': dp = max(0, dp-1)
+        elif ch == '[': db += 1
+        elif ch == ']': db = max(0, db-1)
+        elif ch == '{': dc += 1
+        elif ch == '}': dc = max(0, dc-1)
+        if ch == ';' and dp==db==dc==0:
+            seg = "".join(buf).strip(" ,.:")
+            if seg: parts.append(seg)
+            buf = []
+        else:
+            buf.append(ch)
+    tail = "".join(buf).strip(" ,.:")
+    if tail: parts.append(tail)
+    return parts
+
+def old_split_commas(s):
+    parts, buf = [], []
+    dp = db = dc = 0
+    i = 0
+    while i < len(s):
+        ch = s[i]
+        if ch == '(': dp += 1
+        elif ch == ')': dp = max(0, dp-1)
+        elif ch == '[': db += 1
+        elif ch == ']': db = max(0, db-1)
+        elif ch == '{': dc += 1
+        elif ch == '}': dc = max(0, dc-1)
+        if dp == db == dc == 0:
+            if s[i:i+6].lower() == ", and ":
+                seg = "".join(buf).strip(" ,.:")
+                if seg: parts.append(seg)
+                buf = []
+                i += 6
+                continue
+            if s[i:i+5].lower() == ", or ":
+                seg = "".join(buf).strip(" ,.:")
+                if seg: parts.append(seg)
+                buf = []
+                i += 5
+                continue
+            for kw in (" and having ", " and including ", " and containing ", " and comprising "):
+                L = len(kw)
+                if s[i:i+L].lower() == kw:
+                    seg = "".join(buf).strip(" ,.:")
+                    if seg: parts.append(seg)
+                    buf = []
+                    i += L
+                    continue
+        buf.append(ch)
+        i += 1
+    seg = "".join(buf).strip(" ,.:")
+    if seg: parts.append(seg)
+    return parts
+
+def old_find_second(s):
+    dp = db = dc = 0
+    for i, ch in enumerate(s):
+        if ch == '(': dp += 1
+        elif ch == ')': dp = max(0, dp - 1)
+        elif ch == '[': db += 1
+        elif ch == ']': db = max(0, db - 1)
+        elif ch == '{': dc += 1
+        elif ch == '}': dc = max(0, dc - 1)
+        if dp == 0 and db == 0 and dc == 0:
+            if s[i:i + 12].lower() == ", the second":
+                return i
+    return None
+
+
+#builds a fake method claim of roughly n words out of the sample elements
+ELEMENT_TEMPLATES = [
+    "receiving a first signal (e.g., a [radio] signal) from a first device, and storing the first signal in a buffer",
+    "a support arm having a first and a second end portion, the first end portion being assembled with the column and having a channel",
+    "determining, using the group, that the command was also received by the second device, or discarding the command",
+    "a controller in communication with the sensor and including a memory {with a cache; and a log}",
+    "wherein the first probe is coupled to the frame, the second probe is connected to the leg",
+]
+
+def make_long_claim(words):
+    parts = []
+    count = 0
+    i = 0
+    while count < words:
+        el = ELEMENT_TEMPLATES[i % len(ELEMENT_TEMPLATES)]
+        parts.append(el)
+        count += len(el.split())
+        i += 1
+    return nonlpparse.normalize("A method comprising: " + "; ".join(parts) + ".")
+
+def timeit(fn, arg, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        dt = time.perf_counter() - t0
+        if best is None or dt < best:
+            best = dt
+    return best
+
+def new_all(s): #the lexer scans once and all three splitters reuse the tokens
+    buf = nonlpparse.ClaimBuffer(s)
+    nonlpparse.split_top_level_spans(buf, 0, len(s))
+    nonlpparse.split_commas_coord_spans(buf, 0, len(s))
+    nonlpparse.split_first_second_spans(buf, 0, len(s))
+
+def old_all(s):
+    old_split_semicolons(s)
+    old_split_commas(s)
+    old_find_second(s)
+
+
+if __name__ == "__main__":
+    print(f"{'words':>6} {'splitter':<12} {'old ms':>9} {'new ms':>9} {'speedup':>8}")
+    for words in (500, 1000, 2000, 4000, 8000):
+        claim = make_long_claim(words)
+        #sanity check that the two implementations agree before timing them
+        assert old_split_semicolons(claim) == nonlpparse.split_semicolons_outside_parens(claim)
+        rows = [
+            ("semicolons", old_split_semicolons, nonlpparse.split_semicolons_outside_parens),
+            ("commas", old_split_commas, nonlpparse.split_commas_coord_outside_parens),
+            ("all three", old_all, new_all),
+        ]
+        for name, old_fn, new_fn in rows:
+            t_old = timeit(old_fn, claim, 5) * 1000
+            t_new = timeit(new_fn, claim, 5) * 1000
+            print(f"{words:>6} {name:<12} {t_old:>9.2f} {t_new:>9.2f} {t_old / t_new:>7.1f}x")
@@ -0,0 +1,40 @@
+#drops requirements that are just a piece of another requirement under the same subject
+#cleantest3 and cleantest4 used to compare every requirement with every other one, this does one substring search each
+
+def _separator(strings): #a character none of the strings use, so a match can never run across two of them
+    for sep in ("\x00", "\x01", "\x02", "\uffff"):
+        if not any(sep in s for s in strings):
+            return sep
+    raise ValueError("no free separator character")
+
+
+def drop_contained(strings):
+    #keeps every string that isnt inside some other (different) string, in the original order
+    #same as the old [r for r in reqs if not any(r != o and r in o for o in reqs)]
+    #worst case is still O(n * total length): a string that isnt inside anything has every find scan the whole
+    #haystack before its slot, and that is most of them, but the scan is str.find in C instead of n*n python compares,
+    #so it only shows past a few thousand requirements under one subject (see the worst case rows in benchdedup.py)
+    uniq = list(dict.fromkeys(strings)) #exact duplicates never knock each other out
+    if len(uniq) < 2:
+        return list(strings)
+    #all the strings laid out longest first, so everything before a string's own slot is at least as long as it
+    #an equal length string can only contain it by being the same string, and those are gone, so any match
+    #before its own slot means it is inside a longer one
+    order = sorted(uniq, key=len, reverse=True)
+    sep = _separator(order)
+    haystack = sep.join(order)
+    redundant = set()
+    pos = 0
+    for s in order:
+        if haystack.find(s, 0, pos) != -1:
+            redundant.add(s)
+        pos += len(s) + 1
+    return [s for s in strings if s not in redundant]
+
+
+def drop_contained_items(items, field="requirement"):
+    #the same thing over result dicts, each kept requirement comes back as the first item that had it
+    first = {}
+    for it in items:
+        first.setdefault(it[field], it)
+    return [first[r] for r in drop_contained([it[field] for it in items])]
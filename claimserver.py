@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+
+import nlploader
+
+#a long running local http service for the claim parsers, the models load once and stay loaded
+#   POST /nonlp    nonlpparse.parse_claims, one ParsedClaim.to_dict() per claim in the text
+#   POST /claims   cleantest4.get_claims plus its claim tree as flat (node, parent, subject, requirements) rows
+#   POST /outline  the rawspacytest outline (head, requirements and their subs), through the tiered engine
+#   GET  /health   what is loaded and how many requests/batches each endpoint has seen
+#the body is {"text": "..."} (answered with {"result": ...}) or {"texts": [...]} (answered with {"results": [...]})
+#requests that arrive within --window-ms of each other are handed to the parser together, so the spacy endpoints
+#get one nlp.pipe call per batch instead of one nlp() call per request
+#run it with "python claimserver.py --port 8080", only the python standard library is needed on top of the parsers
+
+MAX_BODY = 4 * 1024 * 1024 #bytes, one request can carry a lot of claims but not an unbounded amount
+
+
+class BadRequest(ValueError):
+    pass
+
+
+#the parser modules are imported inside these so the spawned /nonlp processes dont import spacy, numpy etc for nothing
+def nonlp_batch(texts): #runs in the process pool
+    import nonlpparse
+    return [[claim.to_dict() for claim in nonlpparse.parse_claims(t)] for t in texts]
+
+def claims_batch(texts): #runs on the cleantest4 thread, the md model loads on its first batch (or at warm up)
+    import cleantest4
+    out = []
+    for elements in cleantest4.get_claims_many(texts):
+        tree = [{"node": nid, "parent": parent, "subject": node['subject'], "requirements": node['requirements']}
+                for nid, parent, node in cleantest4.iter_tree_nodes(cleantest4.build_claim_tree(elements))]
+        out.append({"elements": elements, "tree": tree})
+    return out
+
+def outline_batch(texts): #runs on the rawspacytest thread
+    import rawspacytest
+    #a fresh DocEngine per batch so the docs dont pile up, the model itself is nlploader's and stays loaded
+    tiers = rawspacytest.TieredOutliner(rawspacytest.DocEngine(rawspacytest.OUTLINE_MODEL))
+    return [{"head": head, "requirements": [{"text": req, "subs": subs} for req, subs in reqs]}
+            for head, reqs in tiers.outline(texts)]
+
+def warm_models():
+    import cleantest4, rawspacytest #their lazy models register with nlploader on import
+    #a model that wont load (e.g. not installed) is only reported, its endpoint answers 500 with the error when used
+    for m, e in nlploader.warm(strict=False):
+        print(f"could not load {m.model} ({m.profile}): {type(e).__name__}: {e}", file=sys.stderr)
+
+
+class MicroBatcher:
+    #collects texts from concurrent requests for up to `window` seconds (or until max_batch of them) and runs
+    #fn(list of texts) -> list of results on the executor, up to `concurrency` batches in flight at a time (one per
+    #worker of the executor, so a process pool gets all of its processes used)
+    def __init__(self, fn, executor, window=0.005, max_batch=64, concurrency=1):
+        self.fn = fn
+        self.executor = executor
+        self.window = window
+        self.max_batch = max_batch
+        self.concurrency = concurrency
+        self.queue = None
+        self.slots = None
+        self.task = None
+        self.running = set()
+        self.stats = Counter()
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, text):
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, fut))
+        return await fut
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.slots.acquire() #wait for a free worker first, texts keep piling up into the next batch meanwhile
+            batch = [await self.queue.get()]
+            if self.queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.window) #give the rest of this burst a moment to show up
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            batch = [(t, f) for t, f in batch if not f.done()] #the client may have gone away already
+            if not batch:
+                self.slots.release()
+                continue
+            self.stats["batches"] += 1
+            self.stats["texts"] += len(batch)
+            task = loop.create_task(self._batch(batch))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _batch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            try:
+                results = await loop.run_in_executor(self.executor, self.fn, [t for t, _f in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    results = [e]
+                else:
+                    #one bad text shouldnt fail the requests batched with it, so each text goes again on its own and
+                    #only the ones that fail by themselves get an error
+                    self.stats["retried"] += len(batch)
+                    results = [await self._single(t) for t, _f in batch]
+            for (_t, f), res in zip(batch, results):
+                if f.done():
+                    continue
+                if isinstance(res, Exception):
+                    f.set_exception(res)
+                else:
+                    f.set_result(res)
+        finally:
+            self.slots.release()
+
+    async def _single(self, text):
+        try:
+            return (await asyncio.get_running_loop().run_in_executor(self.executor, self.fn, [text]))[0]
+        except Exception as e:
+            return e
+
+    async def close(self):
+        for task in [self.task, *self.running]:
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+
+class ClaimServer:
+    def __init__(self, window=0.005, max_batch=64, nonlp_workers=None):
+        #one thread per spacy model, so each model is only ever used from one thread and its batches go in order
+        workers = nonlp_workers or os.cpu_count() or 1
+        self.pools = {
+            #pure python so it needs real cores, spawned so the workers dont fork a copy of a loaded model
+            "nonlp": ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")),
+            "claims": ThreadPoolExecutor(max_workers=1, thread_name_prefix="cleantest4"),
+            "outline": ThreadPoolExecutor(max_workers=1, thread_name_prefix="rawspacytest"),
+        }
+        fns = {"nonlp": nonlp_batch, "claims": claims_batch, "outline": outline_batch}
+        concurrency = {"nonlp": workers, "claims": 1, "outline": 1} #a batch per /nonlp process, one per model thread
+        self.batchers = {name: MicroBatcher(fns[name], self.pools[name], window, max_batch, concurrency[name]) for name in fns}
+        self.requests = Counter()
+        self.started = time.time()
+
+    async def warm(self):
+        #load the models and start a /nonlp process before taking requests, so the first callers dont wait for them
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        results = await asyncio.gather(
+            loop.run_in_executor(self.pools["claims"], warm_models),
+            loop.run_in_executor(self.pools["nonlp"], nonlp_batch, []),
+            return_exceptions=True,
+        )
+        for what, res in zip(("models", "/nonlp worker"), results):
+            if isinstance(res, Exception): #keep serving, the endpoints that need it fail on their own
+                print(f"warm up of the {what} failed: {type(res).__name__}: {res}", file=sys.stderr)
+        print(f"warm up done in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    async def handle_json(self, name, payload):
+        if not isinstance(payload, dict):
+            raise BadRequest('expected a json object with "text" or "texts"')
+        batcher = self.batchers[name]
+        if "texts" in payload:
+            texts = payload["texts"]
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise BadRequest('"texts" should be a list of strings')
+            return {"results": await asyncio.gather(*(batcher.submit(t) for t in texts))}
+        text = payload.get("text")
+        if not isinstance(text, str):
+            raise BadRequest('"text" should be a string')
+        return {"result": await batcher.submit(text)}
+
+    def health(self):
+        import cleantest4, rawspacytest
+        return {
+            "ok": True,
+            "uptime": round(time.time() - self.started, 1),
+            "models": {"claims": repr(cleantest4.nlp), "outline": repr(rawspacytest.OUTLINE_MODEL)},
+            "requests": dict(self.requests),
+            "batches": {name: dict(b.stats) for name, b in self.batchers.items()},
+        }
+
+    async def dispatch(self, method, path):
+        #returns (status, body) for requests without a json body to read, None when the body is needed
+        name = path.strip("/")
+        if path == "/health":
+            if method != "GET":
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use GET"}
+            return HTTPStatus.OK, self.health()
+        if name not in self.batchers:
+            return HTTPStatus.NOT_FOUND, {"error": f"no endpoint {path}, try /nonlp, /claims, /outline or /health"}
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use POST"}
+        return None
+
+    async def serve_client(self, reader, writer):
+        #minimal http/1.1 with keep-alive, the review tool keeps its connection open between requests
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self.respond(writer, HTTPStatus.BAD_REQUEST, {"error": "bad request line"}, False)
+                    break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _sep, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                keep = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                length = headers.get("content-length") or "0"
+                if not length.isdecimal(): #not a number, or a negative one
+                    await self.respond(writer, HTTPStatus.BAD_REQUEST, {"error": "bad Content-Length"}, False)
+                    break
+                length = int(length)
+                if length > MAX_BODY:
+                    await self.respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": f"body over {MAX_BODY} bytes"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                path = target.split("?", 1)[0]
+                self.requests[path] += 1
+
+                early = await self.dispatch(method, path)
+                if early is not None:
+                    status, out = early
+                else:
+                    try:
+                        status, out = HTTPStatus.OK, await self.handle_json(path.strip("/"), json.loads(body or b"null"))
+                    except (BadRequest, json.JSONDecodeError) as e: #bad json or the wrong shape
+                        status, out = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+                    except Exception as e:
+                        status, out = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+                await self.respond(writer, status, out, keep)
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, obj, keep):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def run(self, host, port, warm=True):
+        for b in self.batchers.values():
+            b.start()
+        if warm:
+            await self.warm()
+        server = await asyncio.start_server(self.serve_client, host, port, backlog=1024)
+        print(f"serving on http://{host}:{port}", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for b in self.batchers.values():
+                await b.close()
+            for pool in self.pools.values():
+                pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Serve the claim parsers over http.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--window-ms", type=float, default=5.0, help="how long a batch waits for more requests")
+    ap.add_argument("--max-batch", type=int, default=64, help="most texts handed to a parser at once")
+    ap.add_argument("--nonlp-workers", type=int, default=None, help="processes for /nonlp (default: one per core)")
+    ap.add_argument("--no-warm", action="store_true", help="load the models on the first request instead of at startup")
+    args = ap.parse_args()
+
+    srv = ClaimServer(args.window_ms / 1000, args.max_batch, args.nonlp_workers)
+    try:
+        asyncio.run(srv.run(args.host, args.port, warm=not args.no_warm))
+    except KeyboardInterrupt:
+        pass
@@ -1,9 +1,11 @@
 import re
-import spacy
 from collections import defaultdict
 
-#spacy large model
-nlp = spacy.load("en_core_web_lg")
+import nlploader
+from claimdedup import drop_contained_items
+
+#spacy large model, loaded on first use and without ner/lemmatizer
+nlp = nlploader.lazy("en_core_web_lg", "split")
 
 def normalize(text):
     text = text.lower().strip() #lowercase and get rid of leading space
@@ -167,37 +169,13 @@ def get_claims(text):
     for norm_subj in grouped_by_subject:
         items = grouped_by_subject[norm_subj]
 
-        # extract the requirements for this subject group
-        reqs = []
-        for i in items:
-            reqs.append(i["requirement"])
-
-        # remove redundant substrings
-        filtered = []
-        for r in reqs:
-            is_redundant = False
-            for o in reqs:
-                if r != o and r in o:
-                    is_redundant = True
-                    break
-            if not is_redundant:
-                filtered.append(r)
-
-        #  recover the original subject and index for the remaining strings
-        for r in filtered:
-            orig_subj = None
-            index = None
-            for i in items:
-                if i["requirement"] == r:
-                    orig_subj = i["subject"]
-                    index = i["index"]
-                    break
-
+        # remove redundant substrings, the items that are left still have their original subject and index
+        for i in drop_contained_items(items):
             # add cleaned version to the final
             final.append({
-                "subject": orig_subj,
-                "requirement": r,
-                "index": index
+                "subject": i["subject"],
+                "requirement": i["requirement"],
+                "index": i["index"]
             })
 
     return sorted(final, key=lambda x: x["index"])
@@ -1,10 +1,16 @@
+import hashlib
+import json
 import re
-from collections import defaultdict
+import sqlite3
+import sys
+from collections import OrderedDict, defaultdict
 from typing import Dict, List
 
-import spacy
+import nlploader
+import parsecache
+from claimdedup import drop_contained_items
 
-nlp = spacy.load("en_core_web_md") #load med spacy model
+nlp = nlploader.lazy("en_core_web_md", "split") #med spacy model, loaded on first use and without ner/lemmatizer
 
 #terms to track transitions/clause splits, we can add to this dynamically
 TRANSITION_TERMS = [
@@ -114,40 +120,43 @@ def where_splits(part):
     return result
 
 
-def split_reqs(req):
-    doc = nlp(req) #run the model
-    # we search for the root token
-    root = None
-    for tok in doc:
-        if tok.head == tok:
-            root = tok
-            break
-    if not root:
-        return [req.strip(" ,.")]
+def span_roots(span):
+    # every token whose head is itself or outside the span, in a whole-claim doc there can be several of them
+    # ("a mechanism supported by the frame operable to drive the column" hangs both off "mechanism")
+    return [tok for tok in span if tok.head == tok or not (span.start <= tok.head.i < span.end)]
 
-    # get the root and its associated conjunctions
-    heads = [root] + list(root.conjuncts)
 
-    # Find tokens belonging to sub-conjunctions
-    conj_subtrees = set() #we use a set because there are no duplicates in sets!
-    for c in root.conjuncts:
-        for tok in c.subtree:
-            conj_subtrees.add(tok)
+def split_req_span(span):
+    req = span.text
+    # we search for the root tokens
+    roots = span_roots(span) if len(span) else []
+    if not roots:
+        return [req.strip(" ,.")]
+
+    # get the roots and their associated conjunctions, only the ones inside this requirement
+    heads = []
+    for root in roots:
+        for h in [root] + [c for c in root.conjuncts if span.start <= c.i < span.end]:
+            if h not in heads:
+                heads.append(h)
+    head_ids = {h.i for h in heads}
+
+    # each token goes to the nearest head above it, so no two phrases share a token (the root's phrase
+    # leaves out its conjuncts' subtrees) and none of the span gets dropped
+    owned = {h.i: [] for h in heads}
+    for t in span:
+        # skip coordinating conjunction tokens
+        if t.dep_ == "cc":
+            continue
+        h = t
+        while h.i not in head_ids:
+            h = h.head
+        owned[h.i].append(t)
 
     independent: List[str] = []
-    for head in heads: #root tokens
-        tokens = []
-        for t in head.subtree:
-            # skip coordinating conjunction tokens in the subtree
-            if t.dep_ == "cc":
-                continue
-            # avoid overlapping subtrees
-            if head is root and t in conj_subtrees:
-                continue
-            tokens.append(t)
+    for head in heads:
+        tokens = owned[head.i] # already in doc order
         if tokens:
-            # sort tokens by their position in the doc
-            tokens = sorted(tokens, key=lambda x: x.i)
             phrase = " ".join(t.text for t in tokens).strip(" ,.")
             independent.append(phrase)
 
@@ -184,100 +193,220 @@ def split_reqs(req):
     return result
 
 
-def get_claims(text):
-    body = extract_body(text) #grab the body text
+def split_reqs(req):
+    doc = nlp(req) #run the model, get_claims doesnt come through here anymore, it reuses the segment doc
+    return split_req_span(doc[:])
 
-    parts = split_segs(body)
-    raw_results: List[Dict[str, object]] = []
-    idx = 0
-    for part in parts:
+
+class LRUCache:
+    # small lru keyed on the model and a hash of the segment text, boilerplate segments repeat a lot across a patent family
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key in self.data:
+            self.data.move_to_end(key)
+            self.hits += 1
+            return self.data[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False) #drop the least recently used one
+
+    def clear(self):
+        self.data.clear()
+        self.hits = self.misses = 0
+
+
+SEGMENT_CACHE = LRUCache()
+
+def content_key(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def claim_segments(text):
+    # the regex half of get_claims, no model needed to find the segments
+    body = extract_body(text) #grab the body text
+    segs: List[str] = []
+    for part in split_segs(body):
         # search for "wherein"/"whereby" subclauses within the parts
-        segments = where_splits(part)
-        for seg in segments:
+        for seg in where_splits(part):
             seg = seg.strip().rstrip('.')
             if not seg:
                 continue
             # Omit leading "and" from the segment
             seg = re.sub(r"^\band\s+", "", seg, flags=re.IGNORECASE)
-            # Discern if this is a subclause using this identifier language
-            if re.match(r"^(wherein|whereby)\b", seg, flags=re.IGNORECASE):
-                doc = nlp(seg)
-                np = next(doc.noun_chunks, None) #find the noun chunks
-                if not np: #if there arent any
-                    continue
-                subj = np.text #we take the nounchunk to be the subject
-                # requirement is the remainder of the clause after the subject
-                req = seg[len(np.text):].strip()#get rid of np and whitespace
-                req = re.sub(r"^\b(?:wherein|whereby)\b", "", req, flags=re.IGNORECASE).strip(' ,') #get rid of legal wording
-                for ar in split_reqs(req):
-                    raw_results.append({"subject": subj, "requirement": ar, "index": idx})
-                    idx += 1 #track the index of the newly appended results
+            segs.append(seg)
+    return segs
+
+
+def segment_reqs(doc):
+    # everything get_claims needs from one parsed segment, as plain (subject, requirement) tuples so it can be cached
+    np = next(iter(doc.noun_chunks), None) #we take the first noun chunk to be the subject
+    if not np:
+        return ()
+    start = np.end
+    # requirement is the remainder of the clause after the subject, minus legal wording and punctuation
+    while start < len(doc) and (doc[start].is_space or doc[start].text in (",", ".")
+                                or doc[start].lower_ in ("wherein", "whereby")):
+        start += 1
+    subj = np.text
+    return tuple((subj, ar) for ar in split_req_span(doc[start:]))
+
+
+def parse_segments(claim_segs, batch_size=64):
+    # every distinct segment goes through the model once, in batches, and the results are cached by content
+    # (and by model, so swapping nlp for another model in the same process doesnt get the old model's results)
+    model = parsecache.fingerprint(nlp)
+    results = {}
+    todo = {}
+    for segs in claim_segs:
+        for seg in segs:
+            key = content_key(seg)
+            if key in results or key in todo:
+                continue
+            cached = SEGMENT_CACHE.get((model, key))
+            if cached is not None:
+                results[key] = cached
             else:
-                # extract the first noun phrase as the subject
-                doc = nlp(seg)
-                np = next(doc.noun_chunks, None)
-                if not np:
-                    continue
-                subj = np.text
-                req = seg[np.end_char:].strip(' ,')
-                for ar in split_reqs(req):
-                    raw_results.append({"subject": subj, "requirement": ar, "index": idx})
-                    idx += 1
-
-    # Undo any duplication
+                todo[key] = seg
+    keys = list(todo)
+    if keys: # when everything was cached the model never even gets loaded
+        for key, doc in zip(keys, nlp.pipe((todo[k] for k in keys), batch_size=batch_size)):
+            results[key] = segment_reqs(doc)
+            SEGMENT_CACHE.put((model, key), results[key])
+    return results
+
+
+def raw_claim_results(segs, results):
+    raw_results: List[Dict[str, object]] = []
+    idx = 0
+    for seg in segs:
+        for subj, ar in results[content_key(seg)]:
+            raw_results.append({"subject": subj, "requirement": ar, "index": idx})
+            idx += 1 #track the index of the newly appended results
+    return raw_results
+
+
+def get_claims_many(texts, batch_size=64):
+    claim_segs = [claim_segments(t) for t in texts]
+    results = parse_segments(claim_segs, batch_size)
+    return [clean_results(raw_claim_results(segs, results)) for segs in claim_segs]
+
+
+def get_claims(text):
+    return get_claims_many([text])[0]
+
+
+def iter_claims(texts, chunk_size=64, batch_size=64):
+    # streaming get_claims for big jobs, texts can be any iterable (a file, a db cursor, ...)
+    # claims are parsed chunk_size at a time and each one yields (claim number, its records) as soon as it is done,
+    # a subject group is only complete at the end of its claim so that is the smallest unit we can hand out
+    chunk = []
+    n = 0
+    for text in texts:
+        chunk.append(text)
+        if len(chunk) >= chunk_size:
+            yield from _iter_chunk(chunk, n, batch_size)
+            n += len(chunk)
+            chunk = []
+    if chunk:
+        yield from _iter_chunk(chunk, n, batch_size)
+
+def _iter_chunk(texts, first, batch_size):
+    claim_segs = [claim_segments(t) for t in texts]
+    results = parse_segments(claim_segs, batch_size)
+    for n, segs in enumerate(claim_segs, first):
+        yield n, list(iter_clean_results(raw_claim_results(segs, results)))
+
+
+def clean_results(raw_results):
+    return list(iter_clean_results(raw_results))
+
+def iter_clean_results(raw_results):
+    # Undo any duplication, then drop requirements that are just part of another one under the same subject
+    # the survivors are the raw dicts themselves, yielded in index order, so nothing gets copied along the way
     seen = set()
-    unique: List[Dict[str, object]] = []
+    grouped: Dict[str, List[Dict[str, object]]] = defaultdict(list) #this is a dict that maps normalized subjects to their associated items
     for it in raw_results:
-        key = (normalize(it['subject']), it['requirement'].lower()) #subject, requirement format to be added to the list
+        norm_subj = normalize(it['subject'])
+        key = (norm_subj, it['requirement'].lower()) #subject, requirement format to be added to the list
         if key not in seen: #add new keyes
             seen.add(key)
-            unique.append(it)
-
-    final_results: List[Dict[str, object]] = [] #this is a formatted list with info as follows: [sub, req, idx]
-    grouped: Dict[str, List[Dict[str, object]]] = defaultdict(list) #this is a dict that maps normalized subjects to their associated items
-    for it in unique:
-        grouped[normalize(it['subject'])].append(it) #dict of subject/req grouped by items that refer to the same objext
-
-    for norm_subj, items in grouped.items(): #now that we have the subject groups
-        reqs = [i['requirement'] for i in items]
-        filtered: List[str] = []
-        for r in reqs:#we take a requirement
-            redundant = False
-            for o in reqs: #and compare it to every other requirment
-                if r != o and r in o:
-                    redundant = True
-                    break #if they are the same then mark as redundant
-            if not redundant:
-                filtered.append(r) #otherwise append
-        for r in filtered:
-            orig_subj = None# Retrieve the original subject and index from one of the items
-            index = None
-            for i in items:
-                if i['requirement'] == r:
-                    orig_subj = i['subject']
-                    index = i['index']
+            grouped[norm_subj].append(it) #dict of subject/req grouped by items that refer to the same objext
+    keep = set()
+    for items in grouped.values(): #now that we have the subject groups
+        for i in drop_contained_items(items):
+            keep.add(id(i))
+    for it in raw_results: #raw results are already in index order
+        if id(it) in keep:
+            yield it
+
+
+class SubjectIndex:
+    # trie over the normalized subject keys, finds the longest key that appears anywhere inside a phrase
+    def __init__(self, keys):
+        self.root: Dict[object, object] = {}
+        self.order: Dict[str, int] = {} # ties go to the subject we saw first, like the old stable sort did
+        for key in keys:
+            if key in self.order:
+                continue
+            self.order[key] = len(self.order)
+            node = self.root
+            for ch in key:
+                node = node.setdefault(ch, {})
+            node[None] = key # None marks the end of a key
+
+    def matches(self, text):
+        found = []
+        if None in self.root: # an empty key is inside everything
+            found.append(self.root[None])
+        n = len(text)
+        for i in range(n): # walk the trie from every start position
+            node = self.root
+            j = i
+            while j < n:
+                node = node.get(text[j])
+                if node is None:
                     break
-            final_results.append({"subject": orig_subj, "requirement": r, "index": index}) #append a clean dict to the final output
-
-    return sorted(final_results, key=lambda x: x['index']) #return the list sorted by the idx
+                if None in node:
+                    found.append(node[None])
+                j += 1
+        return found
+
+    def longest(self, text, exclude=None):
+        best = None
+        for key in self.matches(text):
+            if key == exclude:
+                continue
+            if best is None or len(key) > len(best) or (len(key) == len(best) and self.order[key] < self.order[best]):
+                best = key
+        return best
 
 
 def build_claim_tree(elements):
+    subj_keys = [normalize(el['subject']) for el in elements] # normalize each subject once
     nodes: Dict[str, Dict[str, object]] = {} # This stores each subject as a dict with [subject, req, children]
-    for el in elements:
-        key = normalize(el['subject']) #populate the list
-        if key not in nodes:
+    for el, key in zip(elements, subj_keys):
+        if key not in nodes: #populate the list
             nodes[key] = {
                 'subject': el['subject'],
                 'requirements': [],
                 'children': [],
             }
         nodes[key]['requirements'].append(el['requirement'])#add requirements
+    index = SubjectIndex(nodes) # built once per claim, parent lookups below are one scan of the phrase each
 
     # case:"having/including/comprising ..." patterns
     parent_of: Dict[str, str] = {}
-    for el in elements:
-        subj_key = normalize(el['subject']) #normalize the subject
+    for el, subj_key in zip(elements, subj_keys):
         req = el['requirement'].lower().strip() #essentially standardzing the requirnemtn text too
         # case: node has child
         m1 = re.match(
@@ -300,13 +429,7 @@ def build_claim_tree(elements):
         )
         if m2: #for case 2
             parent_phrase = m2.group(1).strip().rstrip('.') #get the parent NP
-            parent_candidate = None
-            for key in sorted(nodes.keys(), key=lambda k: -len(k)): #finds the closest matching subject key
-                if key == subj_key:
-                    continue
-                if key in normalize(parent_phrase):
-                    parent_candidate = key
-                    break
+            parent_candidate = index.longest(normalize(parent_phrase), exclude=subj_key) #the longest other subject named in it
             if parent_candidate:
                 # record the parent match
                 parent_of.setdefault(subj_key, parent_candidate) #setdefault ensures we don't overwrite a preexisting assingmnet
@@ -323,6 +446,86 @@ def build_claim_tree(elements):
     return roots
 
 
+def iter_tree_nodes(roots):
+    # flattens a claim tree into (node id, parent id, node) in pre-order, parent id is None for the roots
+    stack = [(root, None) for root in reversed(roots)]
+    nid = 0
+    while stack:
+        node, parent = stack.pop()
+        yield nid, parent, node
+        for child in reversed(node['children']):
+            stack.append((child, nid))
+        nid += 1
+
+
+class JsonlSink:
+    # one line per tree node: {"claim", "node", "parent", "subject", "requirements"}
+    def __init__(self, path):
+        self.fp = open(path, "w", encoding="utf-8")
+
+    def write_tree(self, claim, roots):
+        for nid, parent, node in iter_tree_nodes(roots):
+            row = {"claim": claim, "node": nid, "parent": parent, "subject": node['subject'], "requirements": node['requirements']}
+            self.fp.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SqliteSink:
+    # same rows in a "nodes" table, committed every commit_every claims so a long job doesnt hold one huge transaction
+    def __init__(self, path, commit_every=256):
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS nodes (claim INTEGER, node INTEGER, parent INTEGER, subject TEXT, requirements TEXT, "
+            "PRIMARY KEY (claim, node))"
+        )
+        self.commit_every = commit_every
+        self.pending = 0
+
+    def write_tree(self, claim, roots):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?)",
+            ((claim, nid, parent, node['subject'], json.dumps(node['requirements'], ensure_ascii=False))
+             for nid, parent, node in iter_tree_nodes(roots)),
+        )
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.db.commit()
+            self.pending = 0
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_sink(path): # .db/.sqlite goes to sqlite, anything else is jsonl
+    if path.endswith((".db", ".sqlite", ".sqlite3")):
+        return SqliteSink(path)
+    return JsonlSink(path)
+
+
+def stream_claim_trees(texts, sink, chunk_size=64):
+    # the bulk version of the main block: claims go in, trees go straight to the sink, nothing piles up in memory
+    count = 0
+    for n, elements in iter_claims(texts, chunk_size):
+        sink.write_tree(n, build_claim_tree(elements))
+        count += 1
+    return count
+
+
 def _print_claim_tree(node, indent: int = 0):
     indent_str = '  ' * indent #start with zero indent for primary subjects
     print(indent_str + "Subject: " + node['subject']) #print subject
@@ -332,7 +535,14 @@ def _print_claim_tree(node, indent: int = 0):
         _print_claim_tree(child, indent + 1) #print children with an indent
 
 
-if __name__ == "__main__":
+if __name__ == "__main__" and len(sys.argv) > 2:
+    # bulk mode: python cleantest4.py claims.jsonl trees.db (input can also be csv or one claim per line)
+    from nonlpbatch import detect_format, read_records
+    with open(sys.argv[1], encoding="utf-8", newline="") as fp_in, open_sink(sys.argv[2]) as sink:
+        texts = (text for _rid, text in read_records(fp_in, detect_format(sys.argv[1])))
+        print(f"wrote {stream_claim_trees(texts, sink)} claim trees to {sys.argv[2]}")
+
+elif __name__ == "__main__":
     sample_claim = (
         "1. A child motion apparatus comprising: a base frame assembly for providing "
         "standing support on a floor; a column connected with the base frame "
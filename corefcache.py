@@ -0,0 +1,109 @@
+import json
+import os
+import sqlite3
+import sys
+
+from nonlpparse import normalize_offsets
+from parsecache import LOOKUP_CHUNK, text_key
+
+#coref clusters kept on disk between runs, coref is the slowest stage and the claims dont change between runs
+#wrap a corefwindow coref callable with it and use it the same way, only texts it hasnt seen go to the model, so a run
+#where everything is cached never loads the model at all
+#   coref = corefcache.cached(spanbertcoref.SpanBertCoref(), coref_model.fingerprint())
+#entries are keyed by the model id and a hash of the normalized text (whitespace and punctuation spacing dont matter),
+#the clusters are stored as offsets into that normalized text and mapped back onto whatever spacing the caller has
+#set COREF_CACHE=coref.db to turn it on for thomastest1 and nltktestcont, "python corefcache.py coref.db" shows what is in it
+
+CACHE_ENV = "COREF_CACHE"
+
+
+def spacy_model_id(name):
+    #name and installed version of a spacy model package, without loading it
+    from importlib import metadata
+    try:
+        return f"{name}-{metadata.version(name)}"
+    except metadata.PackageNotFoundError:
+        return name
+
+
+class CorefCache:
+    def __init__(self, coref, model, path):
+        self.coref = coref #texts -> clusters per text, e.g. corefwindow.spacy_coref(nlp) or a SpanBertCoref
+        self.model = model #which model (and version/config) the clusters come from
+        self.path = path
+        self.db = None #opened on first use
+        self.hits = 0
+        self.misses = 0
+
+    def connect(self):
+        if self.db is None:
+            self.db = sqlite3.connect(self.path, timeout=60)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS clusters (model TEXT, key TEXT, clusters TEXT, PRIMARY KEY (model, key))")
+        return self.db
+
+    def lookup(self, keys):
+        #key -> clusters (offsets into the normalized text) for every key that is in the cache
+        db = self.connect()
+        keys = list(keys)
+        found = {}
+        for i in range(0, len(keys), LOOKUP_CHUNK):
+            part = keys[i:i + LOOKUP_CHUNK]
+            rows = db.execute(f"SELECT key, clusters FROM clusters WHERE model = ? AND key IN ({','.join('?' * len(part))})",
+                              [self.model, *part])
+            for key, blob in rows:
+                found[key] = [[tuple(m) for m in c] for c in json.loads(blob)]
+        return found
+
+    def store(self, entries):
+        db = self.connect()
+        db.executemany("INSERT OR REPLACE INTO clusters VALUES (?, ?, ?)",
+                       [(self.model, key, json.dumps(clusters)) for key, clusters in entries])
+        db.commit()
+
+    def __call__(self, texts):
+        texts = list(texts)
+        normed = [normalize_offsets(t) for t in texts]
+        keys = [text_key(norm) for norm, _offsets in normed]
+        found = self.lookup(set(keys))
+        todo = {k: norm for k, (norm, _offsets) in zip(keys, normed) if k not in found}
+        self.hits += len(texts) - len(todo) #a text repeated in the call runs once, its repeats are hits
+        self.misses += len(todo)
+        if todo: #the model only runs (and only loads) when something isnt cached
+            fresh = list(zip(todo, self.coref(list(todo.values()))))
+            self.store(fresh)
+            found.update(fresh)
+        return [[[offsets.span(s, e) for s, e in c] for c in found[k]] for k, (_norm, offsets) in zip(keys, normed)]
+
+    def stats(self):
+        rows = self.connect().execute("SELECT model, COUNT(*), SUM(LENGTH(clusters)) FROM clusters GROUP BY model ORDER BY model")
+        return [{"model": m, "texts": n, "bytes": b} for m, n, b in rows]
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"CorefCache({self.coref!r}, {self.model!r}, {self.path!r})"
+
+
+def cached(coref, model, path=None):
+    #coref wrapped in a CorefCache when path (or $COREF_CACHE) is set, coref itself otherwise
+    path = path or os.environ.get(CACHE_ENV)
+    return CorefCache(coref, model, path) if path else coref
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or not os.path.exists(sys.argv[1]):
+        sys.exit("usage: python corefcache.py CACHE_FILE")
+    with CorefCache(None, None, sys.argv[1]) as cache:
+        print(f"{'model':<60} {'texts':>8} {'MB':>8}")
+        for row in cache.stats():
+            print(f"{row['model']:<60} {row['texts']:>8} {row['bytes'] / 1e6:>8.1f}")
@@ -0,0 +1,178 @@
+import re
+from bisect import bisect_left
+
+import offsetmap
+from nonlpparse import NUM_RX, lex_claim
+from spanindex import SpanIndex
+
+#coreference over claim sets that are too long for one model call, thomastest1 and nltktestcont both go through this
+#the text is cut into elements at top-level semicolons (and where a numbered claim starts), the elements are packed
+#into windows of at most max_tokens with the last few elements of each window repeated at the start of the next one,
+#every window goes through the model on its own and the clusters are joined back up wherever two windows found the
+#same mention in the part they share
+#   clusters = resolve_clusters(text, spacy_coref(nlp))   #[[(start_char, end_char), ...], ...] into text
+#only batch_size windows are in the model at a time and only their char offset clusters are kept, so peak memory
+#depends on max_tokens and batch_size, not on how long the claim set is
+
+TOKEN_RX = re.compile(r"\w+|[^\w\s]") #close enough to a spacy token count for sizing windows
+SPLIT_TRIM = " \n\t"
+
+
+def count_tokens(text, start=0, end=None):
+    return sum(1 for _ in TOKEN_RX.finditer(text, start, len(text) if end is None else end))
+
+def element_bounds(text):
+    #(start, end) char spans that cover the whole text, cut after every top-level ";" and before every claim number
+    cuts = {tok[1] for tok in lex_claim(text) if tok[2] == "semi" and tok[3] == 0}
+    cuts.update(m.start() for m in NUM_RX.finditer(text))
+    cuts.discard(0)
+    bounds, prev = [], 0
+    for c in sorted(cuts):
+        bounds.append((prev, c))
+        prev = c
+    if prev < len(text):
+        bounds.append((prev, len(text)))
+    return bounds
+
+def _split_long(text, start, end, limit):
+    #an element longer than a whole window gets cut at whitespace every `limit` tokens
+    out = []
+    n = 0
+    for m in TOKEN_RX.finditer(text, start, end):
+        n += 1
+        if n > limit and text[m.start() - 1] in SPLIT_TRIM:
+            out.append((start, m.start()))
+            start, n = m.start(), 1
+    out.append((start, end))
+    return out
+
+def make_windows(text, max_tokens=384, overlap=96):
+    #(start, end) char spans of the windows, each starting on an element boundary
+    #every window after the first repeats about `overlap` tokens of the one before it (whole elements, so it can be a
+    #little more, or nothing when the elements are too big for two to share a window)
+    if overlap >= max_tokens:
+        raise ValueError(f"overlap ({overlap}) has to be smaller than max_tokens ({max_tokens})")
+    elems = []
+    for s, e in element_bounds(text):
+        for piece in _split_long(text, s, e, max_tokens - overlap):
+            elems.append((piece[0], piece[1], count_tokens(text, *piece)))
+    windows = []
+    first = 0
+    while first < len(elems):
+        last, size = first, elems[first][2]
+        while last + 1 < len(elems) and size + elems[last + 1][2] <= max_tokens:
+            last += 1
+            size += elems[last][2]
+        windows.append((elems[first][0], elems[last][1]))
+        if last == len(elems) - 1:
+            break
+        #walk back from the end of this window until the shared part is big enough, as long as the next element
+        #still fits after it (otherwise the next window would only repeat this one) and we still move forward
+        room = max_tokens - elems[last + 1][2]
+        nxt, shared = last + 1, 0
+        while nxt - 1 > first and shared < overlap and shared + elems[nxt - 1][2] <= room:
+            nxt -= 1
+            shared += elems[nxt][2]
+        first = nxt
+    return windows
+
+
+def merge_clusters(window_clusters, min_overlap=0.5):
+    #window_clusters: (window start, clusters with offsets inside that window) per window, in text order
+    #two mentions from different windows are taken to be the same mention when they share at least min_overlap of
+    #the longer one (so "the lid" isnt the same as a long mention that ends in it), and their clusters are joined,
+    #which means one cluster can pull in clusters from either side of it
+    mentions = [] #(start, end, window number, cluster id)
+    n_clusters = 0
+    for w, (offset, clusters) in enumerate(window_clusters):
+        for cluster in clusters:
+            for s, e in cluster:
+                if e <= s:
+                    continue #a token the adapter couldnt place
+                mentions.append((s + offset, e + offset, w, n_clusters))
+            n_clusters += 1
+    parent = list(range(n_clusters))
+
+    def find(c):
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        return c
+
+    index = SpanIndex([(s, e - 1) for s, e, _w, _c in mentions], list(range(len(mentions))))
+    same = {} #mention number -> the first mention it duplicates
+    for i, (s, e, w, c) in enumerate(mentions):
+        for _span, j in index.overlapping(s, e - 1):
+            ms, me, mw, mc = mentions[j]
+            if mw == w:
+                continue #nested mentions inside one window are the model's business
+            shared = min(e, me) - max(s, ms)
+            if shared >= min_overlap * max(e - s, me - ms):
+                parent[find(c)] = find(mc)
+                if j < i:
+                    same.setdefault(i, same.get(j, j))
+
+    groups = {}
+    for i, (s, e, _w, c) in enumerate(mentions):
+        if i in same:
+            continue #the earlier window's copy of this mention stays
+        groups.setdefault(find(c), set()).add((s, e))
+    out = [sorted(g) for g in groups.values() if len(g) > 1]
+    out.sort()
+    return out
+
+def resolve_clusters(text, coref, max_tokens=384, overlap=96, batch_size=8, need=None):
+    #coref: list of window texts -> list of clusters per text, each cluster a list of (start_char, end_char)
+    #short texts are one window, so they get exactly the clusters the model gives for the whole text
+    #need: char offsets, when given only the windows holding one of them go through the model
+    windows = make_windows(text, max_tokens, overlap)
+    if need is not None:
+        need = sorted(need)
+        windows = [(s, e) for s, e in windows if bisect_left(need, s) < bisect_left(need, e)]
+    found = []
+    for i in range(0, len(windows), batch_size):
+        part = windows[i:i + batch_size]
+        for (s, _e), clusters in zip(part, coref([text[s:e] for s, e in part])):
+            found.append((s, clusters))
+    return merge_clusters(found)
+
+def substitute(text, clusters):
+    #(resolved text, offsetmap.OffsetMap from it back to text), every later mention of a cluster becomes the text of
+    #its first mention, all of them in one pass over the text with the original spacing kept around them
+    #a mention overlapping one that was already replaced is left alone
+    edits = sorted((s, e, text[c[0][0]:c[0][1]]) for c in clusters for s, e in c[1:])
+    kept, pos = [], 0
+    for s, e, main in edits:
+        if s < pos or text[s:e] == main:
+            continue
+        kept.append((s, e, main))
+        pos = e
+    return offsetmap.rewrite(text, kept)
+
+def apply_clusters(text, clusters):
+    return substitute(text, clusters)[0]
+
+
+#adapter from the spacy coref model to the coref callable resolve_clusters wants, spanbertcoref.SpanBertCoref is the
+#callable for the AllenNLP model
+def spacy_coref(nlp, batch_size=8):
+    #en_coreference_web_trf keeps each cluster as a span group named coref_clusters_N
+    def run(texts):
+        out = []
+        for doc in nlp.pipe(texts, batch_size=batch_size):
+            out.append([[(sp.start_char, sp.end_char) for sp in doc.spans[key]]
+                        for key in doc.spans if key.startswith("coref_clusters")])
+        return out
+    return run
+
+def token_offsets(text, tokens):
+    #char (start, end) of each token (of a model with its own tokenizer), found in order, a token the tokenizer rewrote gets an empty span where it would be
+    offsets, pos = [], 0
+    for tok in tokens:
+        i = text.find(tok, pos)
+        if i < 0 or text[pos:i].strip():
+            offsets.append((pos, pos))
+            continue
+        offsets.append((i, i + len(tok)))
+        pos = i + len(tok)
+    return offsets
@@ -0,0 +1,187 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError: #windows
+    resource = None
+
+#one place to load spacy models from, so every script only loads what it needs and only when it first needs it
+#   nlp = nlploader.lazy("en_core_web_md", "split")   #nothing is loaded until nlp(...) or nlp.pipe(...) is called
+#   nlp = nlploader.load("en_core_web_sm", "split")   #load now (or reuse the copy this process already has)
+#run "python nlploader.py en_core_web_sm en_core_web_md" to see load time and peak memory per model/profile
+#set SPACY_PARSE_CACHE=parses.db and every lazy split/attributes model keeps its parsed docs there between runs (see parsecache.py)
+
+#components left out of the pipeline for each kind of task, they are never loaded so they cost no time or memory
+#note the md/lg tok2vec reads the static vectors as features, so the vectors stay in for every profile that parses
+PROFILES = {
+    "split": ["ner", "lemmatizer"], #tagger/attribute_ruler/parser, enough for pos, morph, deps, sents and noun_chunks
+    "attributes": ["ner"], #same plus lemma_, thomastest1.getattributes uses it
+    "vectors": ["tok2vec", "tagger", "morphologizer", "parser", "attribute_ruler", "lemmatizer", "ner", "senter"], #only doc.similarity
+    "full": [], #everything, e.g. the coref pipelines
+}
+
+CACHE_ENV = "SPACY_PARSE_CACHE"
+CACHEABLE = {"split", "attributes"} #a DocBin keeps all of their annotation, coref output lives in extensions it would drop
+
+_models = {} #(model, profile) -> loaded pipeline, one copy per process
+_lazy = [] #every lazy model made in this process, so warm() can load them all up front
+LOAD_STATS = [] #what each load cost, see report()
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin": #bytes on mac, kilobytes on linux
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def load(model, profile="split"):
+    key = (model, profile)
+    nlp = _models.get(key)
+    if nlp is None:
+        if profile not in PROFILES:
+            raise ValueError(f"unknown profile {profile!r}, expected one of {sorted(PROFILES)}")
+        import spacy
+        t0 = time.perf_counter()
+        nlp = spacy.load(model, exclude=PROFILES[profile])
+        LOAD_STATS.append({
+            "model": model,
+            "profile": profile,
+            "seconds": time.perf_counter() - t0,
+            "peak_rss_mb": peak_rss_mb(),
+            "pipes": list(nlp.pipe_names),
+        })
+        _models[key] = nlp
+    return nlp
+
+
+def model_dir(model):
+    #the directory of an installed model package (or the model directory itself), found without importing it
+    import importlib.util
+    if os.path.isdir(model):
+        return model
+    spec = importlib.util.find_spec(model)
+    if spec is None or not spec.submodule_search_locations:
+        raise OSError(f"cant find the spacy model {model!r}")
+    return list(spec.submodule_search_locations)[0]
+
+def model_meta(model):
+    #meta.json of an installed model package (or a model directory) read off disk, nothing gets imported or loaded
+    with open(os.path.join(model_dir(model), "meta.json"), encoding="utf-8") as fp:
+        return json.load(fp)
+
+def model_vocab(model):
+    #the model's vocab (strings, lookups and static vectors) read off disk without building the pipeline,
+    #None when the model has no vocab directory where we expect one
+    import spacy
+    meta = model_meta(model)
+    path = model_dir(model)
+    if not os.path.exists(os.path.join(path, "config.cfg")): #a package keeps the model in a versioned subdirectory
+        path = os.path.join(path, f"{meta['lang']}_{meta['name']}-{meta['version']}")
+    if not os.path.isdir(os.path.join(path, "vocab")):
+        return None
+    return spacy.blank(meta["lang"]).vocab.from_disk(os.path.join(path, "vocab"))
+
+def profile_pipes(meta, profile):
+    #pipe_names the model will have once load(model, profile) loads it
+    skip = set(PROFILES[profile]) | set(meta.get("disabled", []))
+    return [p for p in meta.get("pipeline", []) if p not in skip]
+
+
+class LazyModel:
+    #stands in for the pipeline until it is actually used, then forwards everything to it
+    def __init__(self, model, profile="split"):
+        self.model = model
+        self.profile = profile
+        _lazy.append(self)
+
+    @property
+    def loaded(self):
+        return (self.model, self.profile) in _models
+
+    def get(self):
+        return load(self.model, self.profile)
+
+    def __call__(self, text, **kwargs):
+        return self.get()(text, **kwargs)
+
+    def pipe(self, texts, **kwargs):
+        return self.get().pipe(texts, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith("__"): #dont load a model because pickle or copy went looking for a dunder
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"LazyModel({self.model!r}, {self.profile!r}, {state})"
+
+
+def lazy(model, profile="split", cache=None):
+    #cache: a parsecache file for this model, defaults to $SPACY_PARSE_CACHE
+    nlp = LazyModel(model, profile)
+    if cache and profile not in CACHEABLE:
+        raise ValueError(f"docs from the {profile!r} profile cant be cached, only {sorted(CACHEABLE)}")
+    cache = cache or os.environ.get(CACHE_ENV)
+    if cache and profile in CACHEABLE:
+        from parsecache import ParseCache
+        return ParseCache(nlp, cache)
+    return nlp
+
+def warm(strict=True):
+    #loads every lazy model created so far, the worker farm calls this so workers load before they report ready
+    #strict=False keeps going past a model that wont load and returns [(LazyModel, error), ...] for those
+    failed = []
+    for m in _lazy:
+        try:
+            m.get()
+        except Exception as e:
+            if strict:
+                raise
+            failed.append((m, e))
+    return failed
+
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import spacy
+t_import = time.perf_counter() - t0
+import nlploader
+nlploader.load(sys.argv[1], sys.argv[2])
+stats = nlploader.LOAD_STATS[-1]
+stats["import_seconds"] = t_import
+print(json.dumps(stats))
+"""
+
+def report(models, profiles=None):
+    #every model/profile pair is loaded in a fresh interpreter, otherwise peak rss would just keep the first big number
+    rows = []
+    for model in models:
+        for profile in profiles or list(PROFILES):
+            proc = subprocess.run([sys.executable, "-c", _PROBE, model, profile], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)))
+            if proc.returncode != 0:
+                rows.append({"model": model, "profile": profile, "error": proc.stderr.strip().splitlines()[-1:]})
+                continue
+            rows.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return rows
+
+
+if __name__ == "__main__":
+    models = [a for a in sys.argv[1:] if not a.startswith("--")] or ["en_core_web_sm"]
+    print(f"{'model':<24} {'profile':<11} {'import s':>9} {'load s':>7} {'peak MB':>8}  pipes")
+    for row in report(models):
+        if "error" in row:
+            print(f"{row['model']:<24} {row['profile']:<11} failed: {' '.join(row['error'])}")
+            continue
+        rss = row["peak_rss_mb"]
+        rss = f"{rss:>8.0f}" if rss is not None else f"{'?':>8}"
+        print(f"{row['model']:<24} {row['profile']:<11} {row['import_seconds']:>9.2f} {row['seconds']:>7.2f} {rss}  {','.join(row['pipes'])}")
@@ -6,8 +6,11 @@ from nltk.tokenize import sent_tokenize, word_tokenize
 from transformers import AutoTokenizer
 import coreferee
 import spacy
-from allennlp.predictors.predictor import Predictor
-import allennlp_models.coref
+
+import antecedents
+import corefcache
+import corefwindow
+import spanbertcoref
 
 # import os
 # os.environ["TRANSFORMERS_OFFLINE"] = "1"
@@ -19,24 +22,21 @@ import allennlp_models.coref
 
 # AutoTokenizer.from_pretrained("SpanBERT/spanbert-large-cased")
 
-coref_predictor = Predictor.from_path("models/coref-spanbert-local")
+#loaded on first use, batched by length, COREF_THREADS/COREF_INT8 set its thread count and int8 quantization
+coref_predictor = spanbertcoref.SpanBertCoref()
+#with COREF_CACHE set, claims resolved on an earlier run come from the cache and never load the model (see corefcache.py)
+coref = corefcache.cached(coref_predictor, coref_predictor.fingerprint())
+
+#the config caps a document at max_length 512 wordpieces, claim text runs about 1.3 wordpieces a token
+COREF_WINDOW = 320
+COREF_OVERLAP = 80
 
 def corefresolution(text):
-    prediction = coref_predictor.predict(document=text)
-    clusters = prediction['clusters']
-    tokens = prediction['document']
-
-    resolved_tokens = tokens[:]
-    for cluster in clusters:
-        main_mention = cluster[0]
-        for mention in cluster[1:]:
-            start, end = mention
-            resolved_tokens[start] = tokens[main_mention[0]]
-            for i in range(start+1, end+1):
-                resolved_tokens[i] = ''
-
-    resolved_text = ' '.join([token for token in resolved_tokens if token])
-    return resolved_text
+    #antecedent basis ("a lid ... the lid") by rules, SpanBERT only for pronouns, run on the windows that have one
+    #(see antecedents.py and corefwindow.py)
+    clusters = antecedents.resolve_clusters(text, coref,
+                                            max_tokens=COREF_WINDOW, overlap=COREF_OVERLAP)
+    return corefwindow.apply_clusters(text, clusters) #keeps the original spacing, mentions become the whole main mention
 
 
 # def corefresolution(text):
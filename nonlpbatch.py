@@ -0,0 +1,199 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import nonlpparse
+
+#batch mode for the regex-only parser, there is no model to load so this fans out across every core
+#usage: python nonlpbatch.py claims.jsonl -o parsed.jsonl
+#       cat claims.txt | python nonlpbatch.py - --format text
+#every input record is one claim or a whole claims section, the output has one line per record in input order
+
+
+def detect_format(path): #guess the input format from the extension, stdin is treated as plain text
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".json", ".ndjson"):
+        return "jsonl"
+    if ext in (".csv", ".tsv"):
+        return "csv"
+    return "plain"
+
+def read_records(fp, fmt, field="text", id_field="id"): #yields (record id, claim text)
+    if fmt == "jsonl":
+        for n, line in enumerate(fp, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError as e:
+                yield _bad_record(n, n, f"not json ({e})")
+                continue
+            if isinstance(obj, str): #a bare json string per line is fine too
+                yield (n, obj)
+            elif not isinstance(obj, dict):
+                yield _bad_record(n, n, f"expected an object or a string, got {type(obj).__name__}")
+            elif not isinstance(obj.get(field) or "", str):
+                yield _bad_record(n, obj.get(id_field, n), f"{field!r} is not a string (got {type(obj[field]).__name__})")
+            else:
+                yield (obj.get(id_field, n), obj.get(field) or "")
+    elif fmt == "csv":
+        first = fp.readline()
+        dialect = "excel-tab" if "\t" in first and "," not in first else "excel"
+        reader = csv.DictReader(_chain(first, fp), dialect=dialect)
+        for n, row in enumerate(reader, 1):
+            yield (row.get(id_field) or n, row.get(field) or "")
+    else: #plain text, one record per line
+        for n, line in enumerate(fp, 1):
+            if line.strip():
+                yield (n, line.rstrip("\r\n")) #the file is read with newline="", so crlf lines keep their \r
+
+def _bad_record(n, rid, why):
+    #a record we cant read still gets its (empty) output line, so the output stays one line per input record
+    print(f"line {n}: bad record, {why}", file=sys.stderr)
+    return (rid, "")
+
+def _chain(first, fp): #put the sniffed first line back in front of the rest of the file
+    yield first
+    yield from fp
+
+
+def _init_worker(cues): #runs once in every worker process, replays any --cue additions
+    for category, phrase in cues:
+        nonlpparse.CUES.add(category, phrase)
+
+def parse_chunk(chunk, out_fmt):
+    #one unit of work: a list of (position, record id, text), returns (position, output line, claim count) for each
+    out = []
+    for pos, rid, text in chunk:
+        claims = list(nonlpparse.parse_claims(text))
+        if out_fmt == "jsonl":
+            line = json.dumps({"record": pos, "id": rid, "claims": [c.to_dict() for c in claims]}, ensure_ascii=False)
+        else:
+            line = "\n".join(nonlpparse.render_text(c) for c in claims) + "\n"
+        out.append((pos, line, len(claims)))
+    return out
+
+
+def chunked(records, size, skip=0): #groups records into work units, numbering them so we can keep input order
+    chunk = []
+    for pos, (rid, text) in enumerate(records):
+        if pos < skip:
+            continue
+        chunk.append((pos, rid, text))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def run_chunks(chunks, out_fmt, workers, window, cues):
+    #yields finished chunks in input order, at most window chunks are in flight so a huge input is never read all at once
+    if workers <= 1:
+        _init_worker(cues)
+        for chunk in chunks:
+            yield parse_chunk(chunk, out_fmt)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cues,)) as pool:
+        pending = []
+        for chunk in chunks:
+            pending.append(pool.submit(parse_chunk, chunk, out_fmt))
+            if len(pending) >= window:
+                yield pending.pop(0).result() #oldest first, that keeps the output in input order
+        for fut in pending:
+            yield fut.result()
+
+
+def resume_point(path):
+    #how many records an earlier jsonl run already wrote, a half written last line gets cut off so we can append after it
+    if not os.path.exists(path):
+        return 0
+    done = 0
+    good_end = 0
+    with open(path, "rb") as fp:
+        for line in fp:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                json.loads(line)
+            except ValueError:
+                break
+            done += 1
+            good_end += len(line)
+    with open(path, "r+b") as fp:
+        fp.truncate(good_end)
+    return done
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Parse claims in bulk with the regex-only nonlpparse parser.")
+    ap.add_argument("input", help="input file, or - for stdin")
+    ap.add_argument("-o", "--output", help="output file (default stdout)")
+    ap.add_argument("--input-format", choices=["jsonl", "csv", "plain"], help="default: guessed from the extension")
+    ap.add_argument("--format", choices=["jsonl", "text"], default="jsonl", help="output format")
+    ap.add_argument("--field", default="text", help="jsonl/csv field holding the claim text")
+    ap.add_argument("--id-field", default="id", help="jsonl/csv field holding the record id")
+    ap.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="worker processes, 1 runs in this process")
+    ap.add_argument("--chunk-size", type=int, default=64, help="records per work unit")
+    ap.add_argument("--resume", action="store_true", help="skip the records already in the jsonl output file")
+    ap.add_argument("--cue", action="append", default=[], metavar="CATEGORY=PHRASE",
+                    help="extra cue phrase, e.g. opener=incorporating (repeatable)")
+    ap.add_argument("--progress", type=float, default=5.0, help="seconds between throughput reports on stderr, 0 for none")
+    args = ap.parse_args(argv)
+
+    cues = []
+    for c in args.cue:
+        category, sep, phrase = c.partition("=")
+        if not sep or not phrase:
+            ap.error(f"--cue expects CATEGORY=PHRASE, got {c!r}")
+        cues.append((category, phrase))
+
+    skip = 0
+    if args.resume:
+        if not args.output or args.format != "jsonl":
+            ap.error("--resume needs a jsonl --output file")
+        skip = resume_point(args.output)
+        print(f"resuming after {skip} records", file=sys.stderr)
+
+    in_fmt = args.input_format or ("plain" if args.input == "-" else detect_format(args.input))
+    fp_in = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+    if args.output:
+        fp_out = open(args.output, "a" if args.resume else "w", encoding="utf-8")
+    else:
+        fp_out = sys.stdout
+
+    records = read_records(fp_in, in_fmt, args.field, args.id_field)
+    chunks = chunked(records, max(1, args.chunk_size), skip)
+    window = max(2, args.workers * 4)
+
+    n_records = n_claims = 0
+    t0 = last = time.perf_counter()
+    try:
+        for result in run_chunks(chunks, args.format, args.workers, window, cues):
+            for _pos, line, count in result:
+                fp_out.write(line if args.format == "text" else line + "\n")
+                n_records += 1
+                n_claims += count
+            fp_out.flush() #a crash only ever loses whole chunks, which --resume picks back up
+            now = time.perf_counter()
+            if args.progress and now - last >= args.progress:
+                rate = n_claims / (now - t0)
+                print(f"{n_records} records, {n_claims} claims, {rate:.0f} claims/sec", file=sys.stderr)
+                last = now
+    finally:
+        if fp_in is not sys.stdin:
+            fp_in.close()
+        if fp_out is not sys.stdout:
+            fp_out.close()
+
+    elapsed = time.perf_counter() - t0
+    rate = n_claims / elapsed if elapsed > 0 else 0.0
+    print(f"done: {n_records} records, {n_claims} claims in {elapsed:.2f}s ({rate:.0f} claims/sec)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
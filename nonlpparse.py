@@ -1,13 +1,130 @@
 from __future__ import annotations
+import json
 import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+import offsetmap
+
+#these are the identifiers we will search through with regex, the lists can be added onto at runtime with CUES.add(...)
+#every cue phrase in every category gets compiled into one combined pattern (factored like a trie so the regex engine only
+#follows the branch that matches the next character), so one pass over a claim reports every cue with its offsets and category
+#cues are matched against normalized text (single spaces), case-insensitively
+DEFAULT_CUES = {
+    "priority_opener": ["comprising", "including", "consisting of", "consisting essentially of"], #opener keywords that usually split the preamble from the main body
+    "opener": ["comprising", "including", "consisting of", "consisting essentially of", "having", "containing", "characterized in that", "features"], #secondary openers, also what we look for once we are inside a top level claim
+    "wherein": ["wherein", "whereby"], #wherein clauses
+    "coord": [", and ", ", or ", " and having ", " and including ", " and containing ", " and comprising "], #coordinating phrases we split lists on
+    "split_second": [", the second"], #where a "first ..., the second ..." clause gets split
+    "first": ["the first"], #both of these have to show up before we try that split
+    "second": ["the second"],
+    "clause_verb": ["is", "are", "being", "configured", "coupled", "connected", "disposed", "comprises", "includes"], #verbs that make the "second ..." part a full clause
+    "root_cue": ["for", "configured", "having", "including", "comprising"], #words that end the root subject when a claim has no opener
+}
+STRUCTURE_RX = r'[(\[{)\]};]' #brackets and semicolons always come first in the combined pattern
+NOT_SCANNED = ("root_cue",) #only used as a lookahead in CUES.root_rx, scanning for every "for" would just be noise
+
+def _is_word(ch):
+    return ch.isalnum() or ch == "_"
+
+def _trie_regex(phrases): #one alternation, factored on shared prefixes, longest match wins at each position
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = True #a phrase ends here
+
+    def emit(node, last):
+        alts = [re.escape(ch) + emit(node[ch], ch) for ch in sorted(k for k in node if k)]
+        if "" in node:
+            alts.append(r"\b" if _is_word(last) else "") #ending last means the longer phrases get tried first
+        if len(alts) == 1:
+            return alts[0]
+        return "(?:" + "|".join(alts) + ")"
+
+    #phrases starting with a word character share one \b check up front instead of testing it per phrase
+    punct = [re.escape(ch) + emit(trie[ch], ch) for ch in sorted(trie) if not _is_word(ch)]
+    words = [re.escape(ch) + emit(trie[ch], ch) for ch in sorted(trie) if _is_word(ch)]
+    if words:
+        first = "".join(sorted(re.escape(ch) for ch in trie if _is_word(ch)))
+        punct.append(r"\b(?=[" + first + r"])(?:" + "|".join(words) + ")")
+    return "|".join(punct)
+
+def _nested(outer, inner): #offsets where inner shows up inside outer as a phrase of its own
+    out = []
+    i = outer.find(inner)
+    while i != -1:
+        j = i + len(inner)
+        ok_start = not _is_word(inner[0]) or i == 0 or not _is_word(outer[i - 1])
+        ok_end = not _is_word(inner[-1]) or j == len(outer) or not _is_word(outer[j])
+        if ok_start and ok_end:
+            out.append(i)
+        i = outer.find(inner, i + 1)
+    return out
+
+class CueRegistry:
+    def __init__(self, cues):
+        self.cues = {cat: list(phrases) for cat, phrases in cues.items()}
+        self.compile()
+
+    def add(self, category, *phrases): #extend a cue list, the combined pattern is rebuilt so it is still one pass
+        current = self.cues.setdefault(category, [])
+        for phrase in phrases:
+            if phrase.lower() not in (c.lower() for c in current):
+                current.append(phrase)
+        self.compile()
+
+    def pattern(self, category): #regex for one category on its own, for callers that only want e.g. the openers
+        return re.compile(_trie_regex(sorted({p.lower() for p in self.cues.get(category, [])})), re.I)
+
+    def compile(self):
+        categories = {} #lowercased phrase -> every category it belongs to
+        for cat, phrases in self.cues.items():
+            if cat in NOT_SCANNED:
+                continue
+            for phrase in phrases:
+                cats = categories.setdefault(phrase.lower(), [])
+                if cat not in cats:
+                    cats.append(cat)
+        self.categories = categories
+        #a match only reports the longest phrase at that spot, so remember which other cues sit inside each phrase
+        #(" and having " also has the opener "having" in it, ", the second" has "the second")
+        self.nested = {}
+        for outer in categories:
+            hits = []
+            for inner in categories:
+                if inner != outer:
+                    for i in _nested(outer, inner):
+                        hits.append((i, len(inner), categories[inner]))
+            self.nested[outer] = sorted(hits)
+        self.rx = re.compile(STRUCTURE_RX + "|" + _trie_regex(sorted(categories)), re.I)
+        roots = "|".join(re.escape(p) for p in self.cues.get("root_cue", []))
+        self.root_rx = re.compile( #An/A/The + words up to a root cue word, a comma or a period
+            r'^\s*((?:An?|The)\s+[A-Za-z][\w\s\-]*?)'
+            r'(?=\s+(' + roots + r')\b|,|\.)',
+            re.I
+        )
+
+    def scan(self, text): #every cue hit in text as (start, end, category), in order
+        return [(s, e, kind) for s, e, kind, _ in lex_claim(text) if kind not in STRUCTURE_KINDS]
 
-#these are the identifiers we will search through with regex, the list can be added onto
-NUM_RX = re.compile(r'(?m)^\s*(\d+)\.\s') #claims with numbers
-PRIORITY_OPENERS = re.compile(r'\b(comprising|including|consisting of|consisting essentially of)\b', re.I) #opener keywords that usually split the preamble from the main body
-OPENERS = re.compile(r'\b(comprising|including|consisting of|consisting essentially of|having|containing|characterized in that|features)\b', re.I) #secondary openers that are deffered to if no primary openers exist
-INNER_OPENER = re.compile(r'\b(comprising|including|consisting of|consisting essentially of|having|containing|characterized in that|features)\b\s*:?', re.I) #generally looking for openers where we are already inside a top level claim
-WHEREIN = re.compile(r'\b(wherein|whereby)\b', re.I) #wherein clauses
-DEPEND_RX = re.compile(r'\bof\s+claims?\s+([\d,\-\u2013\u2014\s]+)\b', re.I) #captures numbers for claims
+CUES = CueRegistry(DEFAULT_CUES)
+
+NUM_RX = re.compile(r'(?:^|(?<=\s))(\d+)\s*\.\s+(?=\S)') #claims with numbers, at the start of a line or inline after the previous claim
+#standalone versions of the default cue lists, the parser itself goes through CUES
+PRIORITY_OPENERS = CUES.pattern("priority_opener")
+OPENERS = CUES.pattern("opener")
+INNER_OPENER = re.compile("(?:" + OPENERS.pattern + r")\s*:?", re.I)
+WHEREIN = CUES.pattern("wherein")
+DEPEND_RX = re.compile(r'\b(?:of|in|to)\s+claims?\s+(\d+(?:\s*(?:[,\-\u2013\u2014]|to|or|and)\s*\d+)*)', re.I) #captures numbers for claims ("of claim 3", "of claims 1-5", "according to claim 1 or 2")
+LEAD_SUBJECT_RX = re.compile(r'^\s*((?:An?|The)\s+[A-Za-z][\w\s\-]*?)\b', re.I) #An/A/The + the shortest run of words
+#the words naming what a claim is to, "device" in "The device of claim 3" and "child motion apparatus" in "A child motion apparatus"
+SUBJECT_HEAD_RX = re.compile(r'^\s*(?:(?:an?|the|said)\s+)?([A-Za-z][\w\-]*(?:\s+[A-Za-z][\w\-]*)*?)'
+                             r'(?=\s*(?:[,:;.(]|$)|\s+(?:of|for|to|in|on|at|with|by|as|according|that|which|wherein|whereby|'
+                             r'comprising|including|having|consisting|claimed|recited|defined)\b)', re.I)
 
 #standardize the text here
 def normalize(text):
@@ -17,65 +134,88 @@ def normalize(text):
     # text = re.sub(r'\belectrically\s*conductive\b', 'electrically-conductive', text, flags=re.I) #short term fix
     return text.strip()
 
-#
-# def split_into_claims(text): #this looks for numerical claims and attempts to seperate them
-#     t = re.sub(r'\n+', '\n', text.strip())
-#     positions = []
-#     for m in NUM_RX.finditer(t):
-#         start_index = m.start()  # index in string t where the match begins
-#         claim_number_str = m.group(1)  # first capture group from the regex (the digits)
-#         claim_number = int(claim_number_str)  # convert from string to integer
-#         positions.append((start_index, claim_number))
-#     if not positions:
-#         return [(1, normalize(text))]
-#     out = []
-#     for i, (pos, cid) in enumerate(positions):
-#         end = positions[i+1][0] if i+1 < len(positions) else len(t)
-#         chunk = t[pos:end]
-#         chunk = re.sub(r'^\s*\d+\.\s*', '', chunk).strip()
-#         out.append((cid, normalize(chunk)))
-#     return out
-
-#
-# def parse_depends(text): #
-#     m = DEPEND_RX.search(text)
-#     if not m: return None #searches for parent claims using specific identifying words, returns none if not found
-#     raw = m.group(1).replace(" ", "") #take the captured parent claims and strip space out
-#     ids = []
-#     for part in raw.split(","): #split on commas
-#         if "-" in part:
-#             a,b = part.split("-",1)
-#             if a.isdigit() and b.isdigit():
-#                 a,b = int(a), int(b)
-#                 ids.extend(range(min(a,b), max(a,b)+1))
-#         elif part.isdigit():
-#             ids.append(int(part))
-#     return ids or None
-
-#grab and seperate body and preamble
-def extract_preamble_and_subject(claim_text):
-    m = PRIORITY_OPENERS.search(claim_text)
+def normalize_offsets(text): #same as normalize(text), plus an OffsetMap from the normalized text back to text
+    text = text.replace("\u2013", "-").replace("\u2014", "-") #one character for one, nothing moves
+    text, ws = offsetmap.sub(r'\s+', ' ', text)
+    text, punct = offsetmap.sub(r'\s*([;:,])\s*', r'\1 ', text)
+    text, ends = offsetmap.sub(r'^\s+|\s+$', '', text)
+    return text, ends.through(punct).through(ws)
+
+def claim_bounds(text): #(claim number, start, end) for each claim, as offsets into the raw text (the number itself is left out)
+    start = None #where the text of the claim we are currently in begins
+    cid = None
+    for m in NUM_RX.finditer(text):
+        n = int(m.group(1)) #first capture group from the regex (the digits)
+        line_start = text.rfind('\n', 0, m.start(1)) + 1
+        at_line_start = not text[line_start:m.start(1)].strip()
+        if cid is None and not at_line_start:
+            continue #the first number has to start a line, otherwise it is just a number inside an unnumbered claim
+        if cid is not None and n != cid + 1:
+            continue #claims are numbered in order, anything else is a number inside the claim text
+        if not at_line_start and not text[m.end()].isupper():
+            continue #inline claims start with "A"/"An"/"The", "about 2. liters" does not
+        if cid is not None:
+            yield (cid, start, m.start()) #the previous claim ends where this one starts
+        cid = n
+        start = m.end()
+    if cid is None: #no numbers at all, the whole thing is one claim
+        yield (None, 0, len(text))
+        return
+    yield (cid, start, len(text))
+
+def iter_claims(text): #streams (claim number, normalized claim) pairs out of a whole claims section in one scan
+    for cid, start, end in claim_bounds(text):
+        chunk = normalize(text[start:end])
+        if chunk: yield (cid, chunk)
+
+def split_into_claims(text): #this looks for numerical claims and attempts to seperate them
+    return list(iter_claims(text))
+
+def parse_depends(text): #returns the parent claim numbers a claim refers to, or None for independent claims
+    m = DEPEND_RX.search(text)
+    if not m: return None #searches for parent claims using specific identifying words, returns none if not found
+    raw = re.sub(r'\s*to\s*', '-', m.group(1), flags=re.I) #"1 to 5" is a range too (dashes are already "-" after normalize)
+    raw = re.sub(r'\s*(?:or|and)\s*', ',', raw, flags=re.I).replace(" ", "") #take the captured parent claims and strip space out
+    ids = []
+    for part in raw.split(","): #split on commas
+        if "-" in part:
+            a,b = part.split("-",1)
+            if a.isdigit() and b.isdigit():
+                a,b = int(a), int(b)
+                ids.extend(range(min(a,b), max(a,b)+1))
+        elif part.isdigit():
+            ids.append(int(part))
+    return ids or None
+
+def claim_dependency_graph(claims): #(claim number, text) pairs -> {claim number: [parent claim numbers]}
+    graph = {}
+    for cid, text in claims:
+        parents = parse_depends(text) or []
+        #only keep references to earlier claims we have actually seen, that way the graph is always a DAG
+        graph[cid] = [p for p in parents if p in graph and cid is not None and p < cid]
+    return graph
+
+#grab and seperate body and preamble, the body comes back as (start, end) offsets into claim_text
+def extract_preamble_and_body(claim_text, buf=None):
+    if buf is None:
+        buf = ClaimBuffer(claim_text)
+    m = first_token(buf.toks, 'priority_opener')
     if not m:
-        m = OPENERS.search(claim_text) #find opener words first
+        m = first_token(buf.toks, 'opener') #find opener words first
     if not m: #look for the specific pattern of An/A/The + a cue word like for/configured/etc
-        m2 = re.search(
-            r'^\s*((?:An?|The)\s+[A-Za-z][\w\s\-]*?)'
-            r'(?=\s+(for|configured|having|including|comprising)\b|,|\.)',
-            claim_text,
-            flags=re.I
-        )
+        m2 = CUES.root_rx.search(claim_text)
 
-        # If we find the pattern, we will clean the percieved root
+    # If we find the pattern, we will clean the percieved root
         if m2:
             root = m2.group(1).strip(" ,.")
         else:
             root = None
 
-        # return as preamble, body
-        return (claim_text, root, "")
+        # return as preamble, empty body
+        return (claim_text, root, (len(claim_text), len(claim_text)))
 
     # Alternatively, if we find an opener off rip
-    match_start_index = m.start() #we find the start of body
+    match_start_index = m[0] #we find the start of body
 
     preamble_portion = claim_text[:match_start_index] #grab the preamble
 
@@ -83,23 +223,11 @@ def extract_preamble_and_subject(claim_text):
 
     preamble = preamble_cleaned
 
-    # The rest is everything after the opener.
-    match_end_index = m.end()
-
-    rest_portion = claim_text[match_end_index:] #get everything after the preamble
-
-    # clean-up
-    rest_cleaned = rest_portion.strip(" ,.")
-
-    #body
-    rest = rest_cleaned
+    # The rest is everything after the opener, cleaned up but kept as offsets
+    rest = strip_span(claim_text, m[1], len(claim_text))
 
     #get the root out of the preamble, this is very much not working well yet
-    mlead = re.match(
-        r'^\s*((?:An?|The)\s+[A-Za-z][\w\s\-]*?)\b',
-        preamble,
-        flags=re.I
-    )
+    mlead = LEAD_SUBJECT_RX.match(preamble)
     if mlead:
         root_subject = mlead.group(1).strip(" ,.")
     else:
@@ -116,317 +244,623 @@ def extract_preamble_and_subject(claim_text):
     # return cleaned up pieces
     return (preamble, root_subject, rest)
 
+def extract_preamble_and_subject(claim_text): #same as above but with the body copied out as a string
+    preamble, root_subject, (start, end) = extract_preamble_and_body(claim_text)
+    return (preamble, root_subject, claim_text[start:end])
+
 #these are essentially helper methods that can help partition up the text
-def split_semicolons_outside_parens(s):
-    parts = [] #for the final
-    buf = [] #buffer for characters in curr segment
-    dp = 0 #counts depth of parenthesis
-    db = 0 #counts depth of brakcets
-    dc = 0 #counts depth of curly braces
-    for ch in s: #go thru each char in the string
-        if ch == '(': dp += 1 #increase or decrease the count for each [],(),{} incrementing and decrementing where necessary
-        elif ch == ')': dp = max(0, dp-1) #note: we use max(0,dp-1) because we dont want a negative number
-        elif ch == '[': db += 1
-        elif ch == ']': db = max(0, db-1)
-        elif ch == '{': dc += 1
-        elif ch == '}': dc = max(0, dc-1)
-        if ch == ';' and dp==db==dc==0: #once we get to a semicolon and we are outside of any parenthesis, then we can split
-            seg = "".join(buf).strip(" ,.:")
-            if seg: parts.append(seg)
-            buf = [] #this just saves the current segment and appends it to parts and then clears the buffer
+#the splitters below all share one lexer, a single CUES.rx scan that records every boundary and cue with its bracket depth
+OPENER_TAIL = re.compile(r'\s*:?') #INNER_OPENER also eats the whitespace/colon after the keyword
+OPEN_BRACKETS = {'(': 0, '[': 1, '{': 2}
+CLOSE_BRACKETS = {')': 0, ']': 1, '}': 2}
+STRUCTURE_KINDS = ('open', 'close', 'semi')
+
+def lex_claim(s): #scan once, returns a list of (start, end, kind, depth) tokens in order
+    depth = [0, 0, 0] #one counter per bracket type, same as the old dp/db/dc
+    d = 0 #all counters are >= 0 so their sum is 0 only when we are outside every bracket
+    toks = []
+    categories = CUES.categories
+    nested = CUES.nested
+    for m in CUES.rx.finditer(s):
+        start, end = m.span()
+        ch = s[start]
+        if ch in OPEN_BRACKETS:
+            depth[OPEN_BRACKETS[ch]] += 1
+            d = sum(depth)
+            toks.append((start, end, 'open', d))
+        elif ch in CLOSE_BRACKETS:
+            b = CLOSE_BRACKETS[ch]
+            depth[b] = max(0, depth[b] - 1) #we dont want a negative number
+            d = sum(depth)
+            toks.append((start, end, 'close', d))
+        elif ch == ';':
+            toks.append((start, end, 'semi', d))
         else:
-            buf.append(ch) #if not keep splitting
-    tail = "".join(buf).strip(" ,.:")
-    if tail: parts.append(tail)
-    return parts #following the loop, ensures the stuff after the last break gets included
+            phrase = m.group().lower()
+            for kind in categories[phrase]: #a phrase can be in more than one list, e.g. "comprising"
+                toks.append((start, end, kind, d))
+            for offset, length, kinds in nested[phrase]: #cues hiding inside the longer phrase we matched
+                for kind in kinds:
+                    toks.append((start + offset, start + offset + length, kind, d))
+    return toks
+
+def first_token(toks, kind, limit=None): #first token of a kind (any depth), optionally starting before limit
+    for t in toks:
+        if limit is not None and t[0] >= limit:
+            return None
+        if t[2] == kind:
+            return t
+    return None
+
+def strip_span(text, start, end, chars=" ,."): #same as text[start:end].strip(chars) but we only move the offsets
+    while start < end and text[start] in chars:
+        start += 1
+    while end > start and text[end - 1] in chars:
+        end -= 1
+    return (start, end)
+
+
+#the tree builder works on (start, end) offsets into one normalized claim instead of copying substrings
+#the claim is lexed once up front, every span after that just slices the token list
+class ClaimBuffer:
+    __slots__ = ("text", "toks", "starts", "hits")
+
+    def __init__(self, text):
+        self.text = text
+        self.toks = lex_claim(text)
+        self.starts = [t[0] for t in self.toks] #for bisecting into the token list
+        self.hits = {} #(start, end) -> tokens inside that span, so the same span is never rescanned
+
+    def tokens(self, start, end):
+        #tokens inside [start, end) with the bracket depth counted from start, the same depth a substring lexed on
+        #its own would get (the max(0, ...) clamping means we can't just subtract the depth at start)
+        key = (start, end)
+        hit = self.hits.get(key)
+        if hit is not None:
+            return hit
+        lo = bisect_left(self.starts, start)
+        hi = bisect_left(self.starts, end)
+        depth = [0, 0, 0]
+        d = 0
+        hit = []
+        for t_start, t_end, kind, _ in self.toks[lo:hi]:
+            if kind == 'open':
+                depth[OPEN_BRACKETS[self.text[t_start]]] += 1
+                d = sum(depth)
+            elif kind == 'close':
+                b = CLOSE_BRACKETS[self.text[t_start]]
+                depth[b] = max(0, depth[b] - 1)
+                d = sum(depth)
+            elif t_end > end:
+                continue #a phrase like " and having " that runs past the end of the span doesn't count
+            hit.append((t_start, t_end, kind, d))
+        self.hits[key] = hit
+        return hit
+
+
+def split_at_tokens(buf, start, end, kinds): #cut a span at every top-level token of the given kinds
+    text = buf.text
+    parts = []
+    prev = start
+    for t_start, t_end, kind, d in buf.tokens(start, end):
+        if d == 0 and kind in kinds:
+            seg = strip_span(text, prev, t_start, " ,.:")
+            if seg[0] < seg[1]: parts.append(seg)
+            prev = t_end
+    tail = strip_span(text, prev, end, " ,.:")
+    if tail[0] < tail[1]: parts.append(tail) #ensures the stuff after the last break gets included
+    return parts
 
-def split_top_level_elements(rest):
+LEAD_CONJ = re.compile(r'(and|or)\s+', re.I) #leading "and "/"or " on an element
+
+def split_top_level_spans(buf, start, end):
     # return empty list if there is no input
-    if not rest:
+    if start >= end:
         return []
 
-    # call to split on semicolons
-    raw_parts = split_semicolons_outside_parens(rest)
-
-    #get rid of empty strings
-    parts = []
-    for p in raw_parts:
-        if p:  # keep only non-empty strings
-            parts.append(p)
-
-    #strip out and, ors
+    #split on semicolons that are outside of any parenthesis
     cleaned = []
-    for p in parts:
+    for s, e in split_at_tokens(buf, start, end, ('semi',)):
         # Remove a leading "and " or "or " if present
-        without_lead_conj = re.sub(r'^(and|or)\s+', '', p, flags=re.I)
-        cleaned.append(without_lead_conj)
+        m = LEAD_CONJ.match(buf.text, s, e)
+        if m:
+            s = m.end()
+        cleaned.append((s, e))
 
     #return main subjects
     return cleaned
 
-def flush_buffer(buf, parts):#gets rid of
-    seg = "".join(buf).strip(" ,.:") #buffer content
-    if seg: #if the list isnt empty
-        parts.append(seg)
-    final = [] , parts
-    return final #return empty list + parts
+def split_commas_coord_spans(buf, start, end):
+    #", and ", ", or " and the longer " and having "/" and including "/etc phrases outside brackets
+    return split_at_tokens(buf, start, end, ('coord',))
 
-def split_commas_coord_outside_parens(s):
-    parts = []  # for the final
-    buf = []  # buffer for characters in curr segment
-    dp = 0  # counts depth of parenthesis
-    db = 0  # counts depth of brakcets
-    dc = 0  # counts depth of curly braces
-    i = 0
-
-    while i < len(s):
-        ch = s[i]
-        if ch == '(': dp += 1
-        elif ch == ')': dp = max(0, dp-1)
-        elif ch == '[': db += 1
-        elif ch == ']': db = max(0, db-1)
-        elif ch == '{': dc += 1
-        elif ch == '}': dc = max(0, dc-1) #same thing as above, we increment or decrease based on opening and closing brackets
-
-        if dp == db == dc == 0: #if we are outside brackets, then we look
-            if s[i:i+6].lower() == ", and ": #look 6 chars ahead for an "and" becase ", and " <-6 characters
-                buf, parts = flush_buffer(buf, parts)
-                i += 6
-                continue
-            if s[i:i+5].lower() == ", or ": #same thing here, look for "or" because ", or " <-5 char
-                buf, parts = flush_buffer(buf, parts)
-                i += 5
-                continue
-            for kw in (" and having ", " and including ", " and containing ", " and comprising "): #longer coordinating prases to think of
-                L = len(kw) #number of chars to skip
-                if s[i:i+L].lower() == kw: #find a match
-                    buf, parts = flush_buffer(buf, parts) #flush
-                    i += L #jump past phrase
-                    continue
+def split_first_second_spans(buf, start, end): #looks for the "first ____, the second ___" pattern
+    text = buf.text
+    toks = buf.tokens(start, end) #every cue we need below is already in here
+    kinds = {t[2] for t in toks}
+    if not ('first' in kinds and 'second' in kinds):
+        return [(start, end)] #just return original span if "the first" and "the second" don't both exist
 
-        buf.append(ch)
-        i += 1
-
-    # Flush the last segment
-    buf, parts = flush_buffer(buf, parts)
-
-    return parts
-
-
-def split_first_second_clauses(s): #looks for the "first ____, the second ___" pattern
-    m1 = re.search(r'\bthe\s+first\b', s, flags=re.I) #we confirm that "the first" exists
-    m2 = re.search(r'\bthe\s+second\b', s, flags=re.I) #we confirm that "the second" exists
-    if not (m1 and m2):
-        return [s] #just return original string if these don't both exist
-
-    parts = [] #final list of segments
-    dp = 0 #depth counter for parentheses
-    db = 0 #depth counter for brackets
-    dc = 0 #depth counter for curly braces
     split_idx = None #index where we split on ", the second"
-
-    #loop over every character with its index
-    for i, ch in enumerate(s): #enumerate gives each entry a id
-        if ch == '(': dp += 1
-        elif ch == ')': dp = max(0, dp - 1)
-        elif ch == '[': db += 1
-        elif ch == ']': db = max(0, db - 1)
-        elif ch == '{': dc += 1
-        elif ch == '}': dc = max(0, dc - 1) #increment or decrement depth counters depending on bracket type
-        #check if we are outside brackets
-        if dp == 0 and db == 0 and dc == 0:
-            #check for the  string ", the second" starting here
-            if s[i:i + 12].lower() == ", the second":
-                split_idx = i
-                break #stop after finding a match
+    for t_start, t_end, kind, d in toks: #first ", the second" outside of brackets
+        if kind == 'split_second' and d == 0:
+            split_idx = t_start
+            break #stop after finding a match
 
     #return original if no split
     if split_idx is None:
-        return [s]
+        return [(start, end)]
 
     #start index of "the second..." text skipping 3 spaces for ", "
     sec_start = split_idx + 3
 
-    #look for identifiers like ", wherein" or ";" in the text after "the second"
-    tail_after_second = s[sec_start:]
-    m_wherein = re.search(r',\s*wherein\b', tail_after_second, flags=re.I)
-    m_semicolon = re.search(r';', tail_after_second)
-
-    #determine when the clause ends
-    boundary = len(s)
-    if m_wherein:
-        boundary = min(boundary, sec_start + m_wherein.start())
-    if m_semicolon:
-        boundary = min(boundary, sec_start + m_semicolon.start())
+    #look for identifiers like ", wherein" or ";" in the text after "the second" to determine when the clause ends
+    boundary = end
+    verbs = [] #end offsets of the clause verbs after "the second"
+    for t_start, t_end, kind, d in toks:
+        if t_start < sec_start:
+            continue
+        if kind == 'clause_verb':
+            verbs.append(t_end)
+        elif kind == 'wherein' and boundary == end and text[t_start:t_end].lower() == "wherein":
+            j = t_start
+            while j > sec_start and text[j - 1].isspace():
+                j -= 1
+            if j > sec_start and text[j - 1] == ',': #", wherein"
+                boundary = j - 1
+    semi = text.find(';', sec_start, end)
+    if semi != -1:
+        boundary = min(boundary, semi)
 
     #check if the "second ..." section before the boundary contains an of these seperating verbs
-    looks_like_clause = re.search(
-        r'\b(is|are|being|configured|coupled|connected|disposed|comprises|includes)\b',
-        s[sec_start:boundary],
-        flags=re.I
-    )
-    if not looks_like_clause:
-        return [s] #don't split if the right-hand side isn't a full independent clause/subclause
+    if not any(v <= boundary for v in verbs):
+        return [(start, end)] #don't split if the right-hand side isn't a full independent clause/subclause
 
     #split into left/right parts, strip punctuation/whitespace
-    left = s[:split_idx].strip(" ,.:")
-    right = s[split_idx + 1:].strip(" ,.:")
+    left = strip_span(text, start, split_idx, " ,.:")
+    right = strip_span(text, split_idx + 1, end, " ,.:")
 
     #only return split if both sides are non-empty
-    if left and right:
+    if left[0] < left[1] and right[0] < right[1]:
         return [left, right]
-    return [s]
+    return [(start, end)]
 
 
-#build the struct
-def make_node(text, kind="limitation", children=None): #we make a node tuple
-    return (text, kind, children or []) #creates an empty list for a child
+#string versions of the splitters for callers that just have a piece of text
+def split_semicolons_outside_parens(s):
+    buf = ClaimBuffer(s)
+    return [s[a:b] for a, b in split_at_tokens(buf, 0, len(s), ('semi',))]
+
+def split_top_level_elements(rest):
+    buf = ClaimBuffer(rest)
+    return [rest[a:b] for a, b in split_top_level_spans(buf, 0, len(rest))]
+
+def split_commas_coord_outside_parens(s):
+    buf = ClaimBuffer(s)
+    return [s[a:b] for a, b in split_commas_coord_spans(buf, 0, len(s))]
+
+def split_first_second_clauses(s):
+    buf = ClaimBuffer(s)
+    return [s[a:b] for a, b in split_first_second_spans(buf, 0, len(s))]
 
-def parse_element_recursive(text): #get one element into the tree using recursion
-    text = text.strip(" ,.") #clean up leading and trailing spaces
-    if not text: return make_node("") #if empty then make an empty node
-    m_where = WHEREIN.search(text) #searches for wherein statements
+
+#build the struct
+#every node lives in a ClaimTree as one slot of a few parallel arrays (parent, kind code, span offsets, subtree size),
+#nodes are added in pre-order so the children of i are i+1, then i+1+size[i+1], ... up to i+size[i]
+KIND_NAMES = ["limitation", "wherein"] #kind codes are the index into this list
+KIND_CODES = {k: i for i, k in enumerate(KIND_NAMES)}
+TREE_MAGIC = b"CTR1" #header for the flat binary form
+TREE_HEADER = struct.Struct("<4sII") #magic, node count, utf-8 text length
+
+class ClaimTree:
+    __slots__ = ("text", "parent", "kind", "start", "end", "size")
+
+    def __init__(self, text=""):
+        self.text = text #the normalized claim, node spans are offsets into this
+        self.parent = array("i") #index of the parent node, -1 for top-level elements
+        self.kind = array("b") #code into KIND_NAMES
+        self.start = array("i")
+        self.end = array("i")
+        self.size = array("i") #number of nodes in the subtree, the node itself included
+
+    def __len__(self):
+        return len(self.parent)
+
+    def add(self, start, end, parent=-1, kind="limitation"): #append a node, its size gets fixed by close()
+        self.parent.append(parent)
+        self.kind.append(KIND_CODES[kind])
+        self.start.append(start)
+        self.end.append(end)
+        self.size.append(1)
+        return len(self.parent) - 1
+
+    def close(self, i): #everything added after i so far belongs to its subtree
+        self.size[i] = len(self.parent) - i
+
+    def child_indexes(self, i): #walk the direct children of i (or the top-level nodes when i is -1)
+        if i < 0:
+            j, stop = 0, len(self.parent)
+        else:
+            j, stop = i + 1, i + self.size[i]
+        while j < stop:
+            yield j
+            j += self.size[j]
+
+    def roots(self):
+        return [ClaimNode(self, j) for j in self.child_indexes(-1)]
+
+    def hoist(self, i):
+        #drop node i and move its children up to its parent, only legal on the last subtree added
+        p = self.parent[i]
+        for arr in (self.parent, self.kind, self.start, self.end, self.size):
+            del arr[i]
+        for j in range(i, len(self.parent)):
+            if self.parent[j] == i:
+                self.parent[j] = p
+            elif self.parent[j] > i:
+                self.parent[j] -= 1
+        while p >= 0: #every ancestor lost one node
+            self.size[p] -= 1
+            p = self.parent[p]
+
+    def to_bytes(self): #flat little-endian dump: header, text, then each array back to back
+        raw = self.text.encode("utf-8")
+        out = [TREE_HEADER.pack(TREE_MAGIC, len(self.parent), len(raw)), raw]
+        for arr in (self.parent, self.start, self.end, self.size, self.kind):
+            if sys.byteorder != "little":
+                arr = array(arr.typecode, arr)
+                arr.byteswap()
+            out.append(arr.tobytes())
+        return b"".join(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, n, text_len = TREE_HEADER.unpack_from(data, 0)
+        if magic != TREE_MAGIC:
+            raise ValueError("not a serialized ClaimTree")
+        pos = TREE_HEADER.size
+        tree = cls(bytes(data[pos:pos + text_len]).decode("utf-8"))
+        pos += text_len
+        for name in ("parent", "start", "end", "size", "kind"):
+            arr = getattr(tree, name)
+            width = arr.itemsize * n
+            arr.frombytes(data[pos:pos + width])
+            if sys.byteorder != "little":
+                arr.byteswap()
+            pos += width
+        return tree
+
+
+class ClaimNode: #lightweight view of one slot in a ClaimTree, nothing is copied out until you ask for it
+    __slots__ = ("tree", "i")
+
+    def __init__(self, tree, i):
+        self.tree = tree
+        self.i = i
+
+    @property
+    def start(self):
+        return self.tree.start[self.i]
+
+    @property
+    def end(self):
+        return self.tree.end[self.i]
+
+    @property
+    def kind(self):
+        return KIND_NAMES[self.tree.kind[self.i]]
+
+    @property
+    def text(self):
+        return self.tree.text[self.tree.start[self.i]:self.tree.end[self.i]]
+
+    @property
+    def children(self):
+        return [ClaimNode(self.tree, j) for j in self.tree.child_indexes(self.i)]
+
+    def source_span(self, offsets): #(start, end) in the text the tree's text was made from, offsets is an offsetmap.OffsetMap
+        return offsets.span(self.tree.start[self.i], self.tree.end[self.i])
+
+    @property
+    def parent(self):
+        p = self.tree.parent[self.i]
+        return ClaimNode(self.tree, p) if p >= 0 else None
+
+    def __repr__(self):
+        return f"ClaimNode({self.text!r}, {self.kind!r}, {self.tree.size[self.i] - 1} below)"
+
+
+def make_node(tree, start, end, parent=-1, kind="limitation"): #we make a node slot in the tree
+    return tree.add(start, end, parent, kind)
+
+def parse_element_recursive(buf, start, end, tree, parent=-1): #get one element span into the tree using recursion
+    text = buf.text
+    start, end = strip_span(text, start, end) #clean up leading and trailing spaces
+    if start >= end: return make_node(tree, start, start, parent) #if empty then make an empty node
+    toks = buf.tokens(start, end) #one cached lookup gives us both the wherein and the inner opener positions
+    m_where = first_token(toks, 'wherein') #searches for wherein statements
     if m_where:
-        before = text[:m_where.start()].strip(" ,.")  # stuff before wherein
-        where_tail = text[m_where.end():].strip(" ,.")  # stuff after wherein
+        b_start, b_end = strip_span(text, start, m_where[0])  # stuff before wherein
+        w_start, w_end = strip_span(text, m_where[1], end)  # stuff after wherein
     else:
-        before = text  # no wherein, so all text is "before"
-        where_tail = None #no tail
+        b_start, b_end = start, end  # no wherein, so all text is "before"
+        w_start = w_end = end #no tail
 
-        # inner-subclause opener search
-    m_open = INNER_OPENER.search(before)
+    # inner-subclause opener search, before is a prefix of the span so the same tokens apply
+    m_open = first_token(toks, 'opener', b_end)
     if not m_open:#make a leaf if there is no inner opening
-        node = make_node(before)
+        node = make_node(tree, b_start, b_end, parent)
     else:
-        # split the before "wherein" term around the inner opener into head (parent) and tail (list block)
-        head = before[:m_open.start()].strip(" ,.")  # the parent text
-        tail = before[m_open.end():].strip(" ,.")  # the list text after opener
+        # split the before "wherein" span around the inner opener into head (parent) and tail (list block)
+        h_start, h_end = strip_span(text, b_start, m_open[0])  # the parent text
+        t_start, t_end = strip_span(text, min(OPENER_TAIL.match(text, m_open[1]).end(), b_end), b_end)  # the list text after opener
 
         # create the parent node; use head if available, otherwise "before"
-        if head:
-            node = make_node(head)
+        if h_start < h_end:
+            node = make_node(tree, h_start, h_end, parent)
         else:
-            node = make_node(before)
+            node = make_node(tree, b_start, b_end, parent)
 
         #first split by top-level semicolons
-        result = split_top_level_elements(tail)
-        if result:
-            chunks = result
-        else:
-            chunks = [tail]
+        chunks = split_top_level_spans(buf, t_start, t_end) or [(t_start, t_end)]
         #split each chunk by top-level comma patterns
         subitems = []
-        for ch in chunks:
-            pieces = split_commas_coord_outside_parens(ch) or [ch]
+        for c_start, c_end in chunks:
+            pieces = split_commas_coord_spans(buf, c_start, c_end) or [(c_start, c_end)]
             subitems.extend(pieces)
 
         # recurse on sub-subjects and attach nodes as children
-        for sub in subitems:
-            if sub:
-                _text, _kind, kids = node  # unpack to get the children list reference
-                kids.append(parse_element_recursive(sub))
+        for s, e in subitems:
+            if s < e:
+                parse_element_recursive(buf, s, e, tree, node)
 
     # wherein tail handling
-    if m_where and where_tail:
+    if m_where and w_start < w_end:
         # split the wherein tail by top-level semicolons first
-        wherein_blocks = split_top_level_elements(where_tail) or [where_tail]
+        wherein_blocks = split_top_level_spans(buf, w_start, w_end) or [(w_start, w_end)]
 
-        for w in wherein_blocks:
+        for s, e in wherein_blocks:
             # handle patterns like "the first ..., the second ..." inside wherein blocks
-            pieces = split_first_second_clauses(w)
-            for piece in pieces:
-                wn = parse_element_recursive(piece)  # recurse as usual
-                wn = (wn[0], "wherein", wn[2])  # tag the node as "wherein"
-                node[2].append(wn)  # append under current node
+            for p_start, p_end in split_first_second_spans(buf, s, e):
+                wn = parse_element_recursive(buf, p_start, p_end, tree, node)  # recurse as usual, under current node
+                tree.kind[wn] = KIND_CODES["wherein"]  # tag the node as "wherein"
 
+    tree.close(node)
     return node
 
-def build_elements(rest): #builds the top-level elements
-    prelim = [] #return list
-
-    # split top-level pieces via semicolons
-    for p in split_top_level_elements(rest): #we split at top-level ';'
-        n = parse_element_recursive(p) #parse each p into a (text, kind, children) node
+def add_elements(buf, spans, tree): #parse each span as a top-level element
+    for s, e in spans:
+        n = parse_element_recursive(buf, s, e, tree) #parse each span into the tree
 
         # if the node has no text but has children, elevate child to top-level
-        if (not n[0] or n[0].strip() == "") and n[2]:
-            prelim.extend(n[2]) #append its children directly
-        else:
-            prelim.append(n) #keep the node as-is
+        if tree.start[n] == tree.end[n] and tree.size[n] > 1:
+            tree.hoist(n)
+    return tree
 
-    return prelim
+def build_elements(buf, start, end, tree=None): #builds the top-level elements from the body span
+    if tree is None:
+        tree = ClaimTree(buf.text)
+    # split top-level pieces via semicolons
+    return add_elements(buf, split_top_level_spans(buf, start, end), tree)
 
 
 # parse
-def parse_and_render(raw):
-    # checks if raw is a str
+def claim_elements(buf, body): #element tree for one claim given its body span
+    text = buf.text
+    rest_start, rest_end = body
+    if rest_start < rest_end: #build elements from body
+        return build_elements(buf, rest_start, rest_end)
+    tree = ClaimTree(text) #fallback
+    m = first_token(buf.tokens(0, len(text)), 'wherein') #or build elements from a trailing wherein
+    if m: #if we find then build based on pattern
+        t_start, t_end = strip_span(text, m[1], len(text))
+        blocks = split_top_level_spans(buf, t_start, t_end) or [(t_start, t_end)]
+        add_elements(buf, blocks, tree)
+    return tree #otherwise there is nothing in it
+
+def parse_claim(text): #normalized claim -> (preamble, root subject, element tree)
+    buf = ClaimBuffer(text) #lex the normalized claim once, everything below works on offsets into it
+    preamble, root_subject, body = extract_preamble_and_body(text, buf)
+    return (preamble, root_subject, claim_elements(buf, body))
+
+def iter_raw_claims(raw): #a whole claims section or a list of already split claims -> (claim number, text) pairs
     if isinstance(raw, str):
-        claims = [normalize(raw)] if raw.strip() else []#else assume there are plural strs
+        yield from iter_claims(raw)
     else:
-        # list of str
-        claims = []
         for c in raw:
             if isinstance(c, str) and c.strip():
-                claims.append(normalize(c))
-
-    out_blocks = []
-    for text in claims:
-        # parents = parse_depends(text)
-        # parents = text
-        parents = None
-        # ctype = "dependent" if parents else "independent"
-        ctype = "independent"
-        preamble, root_subject, rest = extract_preamble_and_subject(text)
-
-        if rest: #build elements from body
-            elements = build_elements(rest)
-        else: #fallback
-            m = WHEREIN.search(text) #or build elements from a trailing wherein
-            if m: #if we find then build based on pattern
-                tail = text[m.end():].strip(" ,.")
-                tmp = [parse_element_recursive(p) for p in split_top_level_elements(tail) or [tail]]
-                elements = []
-                for n in tmp:
-                    if (not n[0] or n[0].strip()=="") and n[2]:
-                        elements.extend(n[2])
-                    else:
-                        elements.append(n)
-            else: #otherwise return nothing
-                elements = []
-
-            # render lines
-        lines = []
-        dep_note = ""  #
-        lines.append(f"Claim ({ctype}{dep_note})")  #append claim
-        topic = (root_subject or preamble or "—").strip()
-        lines.append(f"Preamble: {topic}") #get the first word (still in progress)
-        lines.append("Requirements:")
-
-        def bullet(text, level=0, tag="•"):#text to display, depth in heirarchy, tag for type of bullet
-            indent = "  " * level #two spaces per levle
-            lines.append(f"{indent}{tag} {text.strip()}") #appends formatted string to lines
-
-        def walk(nodes, level=1): #
-            for t,k,chs in nodes: #loops through nodes
-                bullet(t, level, "•") #calls bullet to get the main claims
-                for ch in chs: #print child tags if applicable
-                    tag = "↳ (wherein)" if ch[1]=="wherein" else "↳"
-                    bullet(ch[0], level+1, tag)
-                    if ch[2]: #if there is a childs child,
-                        walk(ch[2], level+2)
-
-        if elements: #start walking at the first level if there are elemtsn
-            walk(elements, 1)
-        else: #otherwise there arent any requirements so "-"
-            lines.append("  —")
-        out_blocks.append("\n".join(lines)) #lines becomes a single block and
-
-    return "\n".join(out_blocks) #returns
+                yield from iter_claims(c)
+
+class ParsedClaim: #structured result for one claim, this is what the renderers below work from
+    __slots__ = ("number", "parents", "preamble", "root_subject", "tree")
+
+    def __init__(self, number, parents, preamble, root_subject, tree):
+        self.number = number #claim number, None when the input wasn't numbered
+        self.parents = parents #claim numbers this one depends on, empty for independent claims
+        self.preamble = preamble
+        self.root_subject = root_subject
+        self.tree = tree #ClaimTree of this claim's own elements
+
+    @property
+    def ctype(self):
+        return "dependent" if self.parents else "independent"
+
+    @property
+    def topic(self):
+        return (self.root_subject or self.preamble or "—").strip()
+
+    @property
+    def elements(self):
+        return self.tree.roots()
+
+    def to_dict(self): #plain dicts/lists so it can go straight into json
+        def node_dict(n):
+            return {"text": n.text, "kind": n.kind, "start": n.start, "end": n.end,
+                    "children": [node_dict(c) for c in n.children]}
+        return {
+            "claim": self.number,
+            "type": self.ctype,
+            "depends_on": list(self.parents),
+            "preamble": self.preamble,
+            "root_subject": self.root_subject,
+            "text": self.tree.text,
+            "elements": [node_dict(n) for n in self.elements],
+        }
+
+    def __repr__(self):
+        return f"ParsedClaim({self.number!r}, {self.ctype}, {self.topic!r}, {len(self.tree)} nodes)"
+
+
+def same_subject(text, preamble): #does a dependent claim (text) start by naming the subject of its parent's preamble
+    #"The device of claim 3" and "The apparatus of claim 1" (after "A child motion apparatus") do, "A method of using
+    #the device of claim 3" doesnt, it is a claim to something else that only refers to the device
+    own, theirs = SUBJECT_HEAD_RX.match(text), SUBJECT_HEAD_RX.match(preamble or "")
+    if not own or not theirs:
+        return False
+    own, theirs = own.group(1).lower(), theirs.group(1).lower()
+    return own == theirs or theirs.endswith(" " + own) or own.endswith(" " + theirs)
+
+def parse_claims(raw):
+    #yields a ParsedClaim for every claim in order, nothing is rendered here
+    #a dependent claim that names its parent's subject ("The device of claim 1") takes the parent's preamble and root
+    #subject, any other one ("A method of using the device of claim 1") keeps its own, either way only its own
+    #limitations get parsed, the parent's elements are already in the parent's tree
+    subjects = {} #claim number -> (preamble, root subject), for the claim set we are in
+    last = None
+    for cid, text in iter_raw_claims(raw):
+        if cid is not None:
+            if last is not None and cid <= last:
+                subjects = {} #the numbering starts over, so this is the next patent's claim set (a list of records)
+            last = cid
+        #same rules as claim_dependency_graph, only earlier claims we have already seen count
+        parents = [p for p in (parse_depends(text) or []) if p in subjects and cid is not None and p < cid]
+        buf = ClaimBuffer(text)
+        preamble, root_subject, body = extract_preamble_and_body(text, buf)
+        if parents and same_subject(text, subjects[parents[0]][0]):
+            preamble, root_subject = subjects[parents[0]] #reuse what the parent already worked out
+        if cid is not None:
+            subjects[cid] = (preamble, root_subject)
+        yield ParsedClaim(cid, parents, preamble, root_subject, claim_elements(buf, body))
+
+
+#renderers take one ParsedClaim and return its rendered form, add to RENDERERS to plug in another format
+def render_text(claim):
+    lines = []
+    dep_note = ""  #
+    if claim.parents:
+        dep_note = " on claim " if len(claim.parents) == 1 else " on claims "
+        dep_note += ", ".join(str(p) for p in claim.parents)
+    label = "Claim" if claim.number is None else f"Claim {claim.number}"
+    lines.append(f"{label} ({claim.ctype}{dep_note})")  #append claim
+    lines.append(f"Preamble: {claim.topic}") #get the first word (still in progress)
+    lines.append("Requirements:")
+
+    def bullet(text, level=0, tag="•"):#text to display, depth in heirarchy, tag for type of bullet
+        indent = "  " * level #two spaces per levle
+        lines.append(f"{indent}{tag} {text.strip()}") #appends formatted string to lines
+
+    def walk(nodes, level=1): #
+        for n in nodes: #loops through node views
+            bullet(n.text, level, "•") #calls bullet to get the main claims
+            for ch in n.children: #print child tags if applicable
+                tag = "↳ (wherein)" if ch.kind=="wherein" else "↳"
+                bullet(ch.text, level+1, tag)
+                kids = ch.children
+                if kids: #if there is a childs child,
+                    walk(kids, level+2)
+
+    for p in claim.parents: #the parent's requirements were already listed under the parent
+        bullet(f"(all requirements of claim {p})", 1)
+    elements = claim.elements
+    if elements: #start walking at the first level if there are elemtsn
+        walk(elements, 1)
+    elif not claim.parents: #otherwise there arent any requirements so "-"
+        lines.append("  —")
+    return "\n".join(lines) #lines becomes a single block
+
+def render_jsonl(claim): #one json object per claim, no trailing newline
+    return json.dumps(claim.to_dict(), ensure_ascii=False)
+
+CLAIM_HEADER = struct.Struct("<iI") #claim number (-1 if none), number of parents
+STR_LEN = struct.Struct("<i") #utf-8 length, -1 for None
+
+def _pack_str(value):
+    if value is None:
+        return STR_LEN.pack(-1)
+    raw = value.encode("utf-8")
+    return STR_LEN.pack(len(raw)) + raw
+
+def _unpack_str(data, pos):
+    (n,) = STR_LEN.unpack_from(data, pos)
+    pos += STR_LEN.size
+    if n < 0:
+        return None, pos
+    return bytes(data[pos:pos + n]).decode("utf-8"), pos + n
+
+def render_binary(claim): #compact form: header, parent numbers, preamble, root subject, then the flat tree dump
+    parents = array("i", claim.parents)
+    if sys.byteorder != "little":
+        parents.byteswap()
+    number = -1 if claim.number is None else claim.number
+    return b"".join([
+        CLAIM_HEADER.pack(number, len(claim.parents)),
+        parents.tobytes(),
+        _pack_str(claim.preamble),
+        _pack_str(claim.root_subject),
+        claim.tree.to_bytes(),
+    ])
+
+def claim_from_bytes(data): #inverse of render_binary
+    number, n_parents = CLAIM_HEADER.unpack_from(data, 0)
+    pos = CLAIM_HEADER.size
+    parents = array("i")
+    parents.frombytes(data[pos:pos + parents.itemsize * n_parents])
+    if sys.byteorder != "little":
+        parents.byteswap()
+    pos += parents.itemsize * n_parents
+    preamble, pos = _unpack_str(data, pos)
+    root_subject, pos = _unpack_str(data, pos)
+    tree = ClaimTree.from_bytes(memoryview(data)[pos:])
+    return ParsedClaim(None if number < 0 else number, list(parents), preamble, root_subject, tree)
+
+RENDERERS = {
+    "text": render_text,
+    "jsonl": render_jsonl,
+    "binary": render_binary,
+}
+
+def render_claims(claims, fmt="text"): #lazily renders ParsedClaims one at a time, e.g. render_claims(parse_claims(raw), "jsonl")
+    render = RENDERERS[fmt]
+    for claim in claims:
+        yield render(claim)
+
+FRAME_LEN = struct.Struct("<I") #binary records are length-prefixed when written to a stream
+
+def write_claims(claims, out, fmt="text"): #streams rendered ParsedClaims into a file object, returns how many were written
+    count = 0
+    for block in render_claims(claims, fmt):
+        if fmt == "binary":
+            out.write(FRAME_LEN.pack(len(block)))
+            out.write(block)
+        else:
+            out.write(block + "\n")
+        count += 1
+    return count
+
+def read_binary_claims(fp): #reads back what write_claims(..., fmt="binary") wrote, one ParsedClaim at a time
+    while True:
+        head = fp.read(FRAME_LEN.size)
+        if len(head) < FRAME_LEN.size:
+            return
+        (n,) = FRAME_LEN.unpack(head)
+        yield claim_from_bytes(fp.read(n))
+
+def parse_and_render(raw):
+    return "\n".join(render_claims(parse_claims(raw), "text")) #returns
 
 
 if __name__ == "__main__":
     raw = """
  A child motion apparatus comprising: a base frame assembly for providing standing support on a floor; a column connected with the base frame assembly; a support arm extending generally horizontally relative to the column, the support arm having a first and a second end portion, the first end portion being assembled with the column and having a channel extending generally vertically, the support arm further being connected with the column via a hinge about which the support arm is rotatable generally horizontally relative to the column; a child seat connected with the second end portion of the support arm; a vertical actuating mechanism supported by the base frame assembly and operable to drive the column to slide upward and downward relative to the base frame assembly; and a horizontal actuating mechanism operable to drive the support arm to oscillate generally horizontally relative to the column, the horizontal actuating mechanism including a driving part movable along a circular path and guided for sliding movement along the channel at the first end portion of the support arm, wherein a circular motion of the driving part causes the driving part to slide along the channel and thereby drives an oscillating movement of the support arm.
  """
-print(parse_and_render(raw))
-    
\ No newline at end of file
+    print(parse_and_render(raw))
@@ -0,0 +1,95 @@
+import re
+from array import array
+from bisect import bisect_right
+
+#maps positions in a rewritten text (coref substitution, normalize) back to the text it was made from
+#the rewritten text is a list of segments, each one either copied from the source character for character or put in
+#for a source span (a mention replaced by its antecedent, a run of whitespace collapsed to one space)
+#   new, offsets = offsetmap.rewrite(text, [(start, end, replacement), ...])
+#   offsets.span(s, e)  #the source span that new[s:e] came from
+#maps chain, so a claim tree node built on the normalized form of a coref resolved claim can report where it is in the
+#raw claim:
+#   resolved, coref_map = corefwindow.substitute(raw, clusters)
+#   norm, norm_map = nonlpparse.normalize_offsets(resolved)
+#   node.source_span(norm_map.through(coref_map))   #(start, end) into raw
+
+
+class OffsetMap:
+    __slots__ = ("new_start", "old_start", "old_end", "copied", "base")
+
+    def __init__(self, base=None):
+        self.new_start = array("i") #where each segment starts in the rewritten text
+        self.old_start = array("i") #and the source span it came from
+        self.old_end = array("i")
+        self.copied = array("b") #1 when the segment is a plain copy, so positions inside it map one to one
+        self.base = base #the map of the source text itself, when it was rewritten from something too
+
+    def add(self, new_start, old_start, old_end, copied):
+        self.new_start.append(new_start)
+        self.old_start.append(old_start)
+        self.old_end.append(old_end)
+        self.copied.append(1 if copied else 0)
+
+    def _locate(self, pos, end):
+        #source position of pos, seen as a start (the left edge of a replacement) or as an end (its right edge)
+        i = bisect_right(self.new_start, pos) - 1
+        if end and i > 0 and self.new_start[i] == pos:
+            i -= 1 #an end right at a segment start closes the segment before it
+        if i < 0:
+            return pos
+        offset = pos - self.new_start[i]
+        if self.copied[i]:
+            return self.old_start[i] + offset
+        return self.old_end[i] if end and offset > 0 else self.old_start[i]
+
+    def to_original(self, pos):
+        out = self._locate(pos, False)
+        return self.base.to_original(out) if self.base is not None else out
+
+    def span(self, start, end):
+        #source (start, end) for the rewritten text[start:end], a replaced piece maps to the whole span it replaced
+        s, e = self._locate(start, False), self._locate(end, end > start)
+        return self.base.span(s, e) if self.base is not None else (s, e)
+
+    def through(self, base):
+        #this map followed by base, for a text rewritten from a text that was itself rewritten
+        out = OffsetMap(base if self.base is None else self.base.through(base))
+        for name in ("new_start", "old_start", "old_end", "copied"):
+            setattr(out, name, getattr(self, name))
+        return out
+
+    def __len__(self):
+        return len(self.new_start)
+
+    def __repr__(self):
+        return f"OffsetMap({len(self)} segments{', chained' if self.base is not None else ''})"
+
+
+def rewrite(text, edits):
+    #(new text, map back to text) after replacing each (start, end, replacement), edits sorted and not overlapping
+    out = []
+    offsets = OffsetMap()
+    pos = new_pos = 0
+    for s, e, repl in edits:
+        if s > pos:
+            out.append(text[pos:s])
+            offsets.add(new_pos, pos, s, True)
+            new_pos += s - pos
+        if repl:
+            out.append(repl)
+            offsets.add(new_pos, s, e, False)
+            new_pos += len(repl)
+        pos = e
+    if pos < len(text) or not len(offsets):
+        out.append(text[pos:])
+        offsets.add(new_pos, pos, len(text), True)
+    return "".join(out), offsets
+
+def sub(pattern, repl, text, flags=0):
+    #re.sub that also returns the map, repl is a string (with \1 style groups) or a function of the match
+    edits = []
+    for m in re.finditer(pattern, text, flags):
+        new = m.expand(repl) if isinstance(repl, str) else repl(m)
+        if new != m.group():
+            edits.append((m.start(), m.end(), new))
+    return rewrite(text, edits)
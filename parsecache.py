@@ -0,0 +1,157 @@
+import hashlib
+import os
+import sqlite3
+import sys
+
+import nlploader
+
+#parsed docs kept on disk between runs, so changing a heuristic in cleantest4/rawspacytest doesnt mean parsing the corpus again
+#each doc is stored as its own DocBin blob in a sqlite file, keyed by the model it came from and a hash of its text
+#wrap any pipeline with it and use it like the pipeline (nlp(text), nlp.pipe(texts)), only the texts it hasnt seen get parsed
+#nlploader.lazy() does the wrapping by itself when SPACY_PARSE_CACHE points at a file
+#a run where everything is cached never loads the model, the docs are read back with its vocab (vectors too) off disk
+#run "python parsecache.py cache.db" to see what is in a cache file
+
+LOOKUP_CHUNK = 500 #keys per SELECT, stays under sqlite's limit on query parameters
+
+
+def text_key(text):
+    #the exact text, not a cleaned up version of it, since the docs character offsets and span.text have to match what was asked for
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def fingerprint(nlp):
+    #which model (and version) made a doc and with which components, a new model version never reads an old entry
+    #a LazyModel that isnt loaded yet gets it from the meta.json on disk, the same string the loaded model would give
+    if isinstance(nlp, ParseCache):
+        return nlp.model
+    if isinstance(nlp, nlploader.LazyModel) and not nlp.loaded:
+        meta = nlploader.model_meta(nlp.model)
+        pipes = nlploader.profile_pipes(meta, nlp.profile)
+    else:
+        meta, pipes = nlp.meta, nlp.pipe_names
+    return f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}:{','.join(pipes)}"
+
+
+class ParseCache:
+    def __init__(self, nlp, path, batch_size=64, chunk_size=256):
+        self.nlp = nlp #a pipeline or an nlploader.LazyModel, the model is only loaded when something isnt cached
+        self.path = path
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size #texts looked up (and their misses parsed) together by pipe()
+        self.db = None #opened on first use, so a worker process opens its own
+        self._model = None
+        self._vocab = None #vocab for reading docs back while the model isnt loaded
+        self.hits = 0
+        self.misses = 0
+
+    def connect(self):
+        if self.db is None:
+            self.db = sqlite3.connect(self.path, timeout=60) #farm workers all write to the same file
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS docs (model TEXT, key TEXT, doc BLOB, PRIMARY KEY (model, key))")
+        return self.db
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = fingerprint(self.nlp)
+        return self._model
+
+    def doc_vocab(self):
+        #the model's vocab once it is loaded, until then the same vocab read off disk (static vectors included, the md/lg
+        #split and attributes profiles keep them) so reading back cached docs doesnt build the pipeline
+        if isinstance(self.nlp, nlploader.LazyModel) and not self.nlp.loaded:
+            if self._vocab is None:
+                self._vocab = nlploader.model_vocab(self.nlp.model)
+            if self._vocab is not None:
+                return self._vocab
+        return self.nlp.vocab #loads the model when it has to
+
+    def lookup(self, keys):
+        #key -> Doc for every key that is in the cache
+        from spacy.tokens import DocBin
+        db = self.connect()
+        keys = list(keys)
+        found = {}
+        vocab = None
+        for i in range(0, len(keys), LOOKUP_CHUNK):
+            part = keys[i:i + LOOKUP_CHUNK]
+            rows = db.execute(f"SELECT key, doc FROM docs WHERE model = ? AND key IN ({','.join('?' * len(part))})",
+                              [self.model, *part])
+            for key, blob in rows:
+                if vocab is None:
+                    vocab = self.doc_vocab()
+                found[key] = next(iter(DocBin().from_bytes(blob).get_docs(vocab)))
+        return found
+
+    def store(self, docs):
+        #(key, doc) pairs, user_data isnt kept (it can hold anything, e.g. rawspacytest's feature arrays)
+        from spacy.tokens import DocBin
+        rows = []
+        for key, doc in docs:
+            bin_ = DocBin(store_user_data=False)
+            bin_.add(doc)
+            rows.append((self.model, key, bin_.to_bytes()))
+        db = self.connect()
+        db.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?, ?)", rows)
+        db.commit()
+
+    def pipe(self, texts, batch_size=None, **kwargs):
+        #same docs in the same order as nlp.pipe(texts), texts can be a generator
+        chunk = []
+        for text in texts:
+            chunk.append(text)
+            if len(chunk) >= self.chunk_size:
+                yield from self._pipe_chunk(chunk, batch_size, kwargs)
+                chunk = []
+        if chunk:
+            yield from self._pipe_chunk(chunk, batch_size, kwargs)
+
+    def _pipe_chunk(self, texts, batch_size, kwargs):
+        keys = [text_key(t) for t in texts]
+        docs = self.lookup(set(keys))
+        todo = {k: t for k, t in zip(keys, texts) if k not in docs} #a text repeated in the chunk is parsed once
+        self.hits += len(texts) - len(todo) #so its repeats count as hits
+        self.misses += len(todo)
+        if todo: #when everything was cached the model never even gets loaded
+            parsed = list(zip(todo, self.nlp.pipe(todo.values(), batch_size=batch_size or self.batch_size, **kwargs)))
+            self.store(parsed)
+            docs.update(parsed)
+        for k in keys:
+            yield docs[k]
+
+    def __call__(self, text):
+        return next(self.pipe([text]))
+
+    def stats(self):
+        #rows and stored bytes per model fingerprint
+        rows = self.connect().execute("SELECT model, COUNT(*), SUM(LENGTH(doc)) FROM docs GROUP BY model ORDER BY model")
+        return [{"model": m, "docs": n, "bytes": b} for m, n, b in rows]
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name): #everything else (vocab, pipe_names, ...) comes from the pipeline
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.nlp, name)
+
+    def __repr__(self):
+        return f"ParseCache({self.nlp!r}, {self.path!r})"
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or not os.path.exists(sys.argv[1]):
+        sys.exit("usage: python parsecache.py CACHE_FILE")
+    with ParseCache(None, sys.argv[1]) as cache:
+        print(f"{'model':<60} {'docs':>8} {'MB':>8}")
+        for row in cache.stats():
+            print(f"{row['model']:<60} {row['docs']:>8} {row['bytes'] / 1e6:>8.1f}")
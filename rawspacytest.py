@@ -1,11 +1,60 @@
 import re
-import spacy
+from collections import Counter
 from typing import List, Tuple, Dict, Any
 
+import numpy as np
+
+import nlploader
+from spanindex import SpanIndex, drop_nested
+
 #we are looking for these types of POS
 VERBISH_POS = {"VERB", "AUX"} #we treat these as verbs
 CONTENT_POS = {"VERB", "NOUN", "PROPN", "ADJ"} #we treat these as "content"
 CLAUSE_DEPS = {"relcl", "acl", "advcl", "ccomp", "xcomp"} #clauses
+FUNCTION_POS = {"ADP", "DET", "PRON", "PART", "PUNCT", "CCONJ", "SCONJ"} #function words, too many of these means a span is just filler
+FEATURE_ATTRS = ["POS", "DEP", "HEAD", "LOWER"] #the doc.to_array columns TokenFeatures works from
+FEATURES_KEY = "rawspacytest.features" #where TokenFeatures sits in doc.user_data
+BATCH_SIZE = 64 #how many texts go through nlp.pipe at once, tune this per model/machine
+OUTLINE_MODEL = nlploader.lazy("en_core_web_sm", "split") #what the outlines are parsed with, loaded on first use
+
+
+class DocEngine:
+    #stands in for nlp, every text is parsed at most once and prefetch() sends whole lists through nlp.pipe
+    #the functions below all take "nlp" so you can pass either the plain pipeline or one of these
+    def __init__(self, nlp, batch_size=BATCH_SIZE):
+        self.nlp = nlp
+        self.batch_size = batch_size
+        self.docs: Dict[str, Any] = {}
+        self.used = set() #texts asked for since the last sweep()
+        self.parsed = 0 #how many docs actually went through the model
+
+    def prefetch(self, texts):
+        texts = list(dict.fromkeys(texts)) #dedupe but keep order
+        self.used.update(texts)
+        todo = [t for t in texts if t not in self.docs]
+        if not todo: #dont even load a lazy model for nothing
+            return
+        for t, doc in zip(todo, self.nlp.pipe(todo, batch_size=self.batch_size)):
+            self.docs[t] = doc
+        self.parsed += len(todo)
+
+    def __call__(self, text):
+        self.used.add(text)
+        doc = self.docs.get(text)
+        if doc is None: #wasnt prefetched, parse it on its own
+            doc = self.docs[text] = self.nlp(text)
+            self.parsed += 1
+        return doc
+
+    def sweep(self):
+        #forget every doc nobody asked for since the last sweep, so a long lived engine doesnt keep every old text
+        self.docs = {t: d for t, d in self.docs.items() if t in self.used}
+        self.used = set()
+
+def prefetch(nlp, texts):
+    #no-op for a plain pipeline, texts can be a generator so nothing gets parsed in that case
+    if isinstance(nlp, DocEngine):
+        nlp.prefetch(texts)
 
 
 def split_top_level_semicolons(s):
@@ -27,6 +76,20 @@ def split_top_level_semicolons(s):
     return [re.sub(r'^\s*(?:,?\s*(?:and|or))\s+', '', p, flags=re.I).strip(' ,.') for p in parts]
 
 def detect_head(text, nlp):
+    found = detect_head_regex(text)
+    if found is not None:
+        return found
+
+    #worst case we call the engine by default and assign the first sentence as the head *******
+    doc = nlp(text)
+    sents = list(doc.sents)
+    if sents:
+        first = sents[0].text
+        return first.strip(' ,.'), text[len(first):].lstrip(' ,.')
+
+    return text.strip(' ,.'), ""
+
+def detect_head_regex(text): #the cheap half of detect_head, None means only the parser can tell
     colon = text.find(':') #search for early splits on colons
     semi = text.find(';') #or semicolons
     if colon != -1 and (semi == -1 or colon < semi): #
@@ -39,15 +102,7 @@ def detect_head(text, nlp):
     )
     if m: #we then treat everything to the left of the word as the head and the right as the body
         return m.group(1).strip(' ,.'), m.group(2).lstrip(' ,.')
-
-    #worst case we call the engine by default and assign the first sentence as the head *******
-    doc = nlp(text)
-    sents = list(doc.sents)
-    if sents:
-        first = sents[0].text
-        return first.strip(' ,.'), text[len(first):].lstrip(' ,.')
-
-    return text.strip(' ,.'), ""
+    return None
 
 
 APPOSITIVE_SPLIT_RE = re.compile(r",\s+(?=(?:the|a|an)\b)", re.I) #these are the primary candidates to split on for each new NP
@@ -60,7 +115,7 @@ def is_np_like(text, nlp):
             return False # and is it finite (as in past tense conjugated) and we return false because this isnt NP-like meaning we have a
     return True # full clause
 
-def safe_np_split(text, regex, nlp):
+def np_split_parts(text, regex):
     #split up text based on given regex rule
     raw_parts = regex.split(text)
     #clean up input
@@ -68,6 +123,17 @@ def safe_np_split(text, regex, nlp):
     for p in raw_parts:
         if p and p.strip(" ,."):
             parts.append(p.strip(" ,."))
+    return parts
+
+def np_split_candidates(texts, regex):
+    #every piece safe_np_split might send to is_np_like, so they can be parsed in one go
+    for text in texts:
+        parts = np_split_parts(text, regex)
+        if len(parts) > 1:
+            yield from parts
+
+def safe_np_split(text, regex, nlp):
+    parts = np_split_parts(text, regex)
 
     #if there arent enough parts then just return the whole thing
     if len(parts) <= 1:
@@ -80,92 +146,161 @@ def safe_np_split(text, regex, nlp):
     return parts
 
 def split_requirements(body, nlp):
-    if not body: return [] #return on blank input
-    primaries = split_top_level_semicolons(body) or [body] #returns based on semicolon splits or just takes the body
-    out = []
-    for r in primaries:
-        for p in safe_np_split(r, AND_DET_SPLIT_RE, nlp): #we split based on and_det
-            pieces = safe_np_split(p, APPOSITIVE_SPLIT_RE, nlp) #
-            for piece in pieces:
-                out.append(piece)
-    cleaned = []
-    for t in out:
-        x = t.strip(" ,.")  # remove leading/trailing spaces, commas, periods
-        if x:  # only keep if not empty string
-            cleaned.append(x)
-
-    return cleaned
-
-def findBounds(tok):
-    # find the leftmost edge
-    start_index = tok.left_edge.i
+    return split_requirements_many([body], nlp)[0]
 
-    # Find the rightmost edge
-    rightmost_index = None
-    for t in tok.subtree:
-        if rightmost_index is None or t.i > rightmost_index:
-            rightmost_index = t.i
+def split_requirements_many(bodies, nlp):
+    primaries = []
+    for body in bodies:
+        if not body: #blank input gives no requirements
+            primaries.append([])
+        else:
+            primaries.append(split_top_level_semicolons(body) or [body]) #returns based on semicolon splits or just takes the body
+    return split_primaries_many(primaries, nlp)
+
+def split_primaries_many(primaries, nlp):
+    #the np splits for lists of semicolon elements, every element is split on its own
+    #each round of candidate pieces (for every list) is parsed together before the np checks run
+    prefetch(nlp, np_split_candidates((r for prims in primaries for r in prims), AND_DET_SPLIT_RE))
+    firsts = []
+    for prims in primaries:
+        ps = []
+        for r in prims:
+            ps.extend(safe_np_split(r, AND_DET_SPLIT_RE, nlp)) #we split based on and_det
+        firsts.append(ps)
+
+    prefetch(nlp, np_split_candidates((p for ps in firsts for p in ps), APPOSITIVE_SPLIT_RE))
+    results = []
+    for ps in firsts:
+        cleaned = []
+        for p in ps:
+            for piece in safe_np_split(p, APPOSITIVE_SPLIT_RE, nlp):
+                x = piece.strip(" ,.")  # remove leading/trailing spaces, commas, periods
+                if x:  # only keep if not empty string
+                    cleaned.append(x)
+        results.append(cleaned)
+    return results
+
+def subtree_edges(heads):
+    #leftmost and rightmost index in every token's subtree, from the absolute head array
+    #each round pushes the edges one level up the tree, so it only takes as many rounds as the parse is deep
+    left = np.arange(len(heads))
+    right = left.copy()
+    while True:
+        new_left, new_right = left.copy(), right.copy()
+        np.minimum.at(new_left, heads, left)
+        np.maximum.at(new_right, heads, right)
+        if np.array_equal(new_left, left) and np.array_equal(new_right, right):
+            return left, right
+        left, right = new_left, new_right
+
+
+class TokenFeatures:
+    #a doc's POS/dep/head/lower columns from one doc.to_array call, plus every token's subtree bounds
+    #the span filters count tags with prefix sums over these instead of looping over Token objects
+    label_ids = {} #frozenset of labels -> their ids, these are the same for every vocab so its shared
+
+    def __init__(self, doc):
+        self.strings = doc.vocab.strings
+        arr = doc.to_array(FEATURE_ATTRS).reshape(len(doc), len(FEATURE_ATTRS))
+        self.pos, self.dep, self.lower = arr[:, 0], arr[:, 1], arr[:, 3]
+        self.heads = np.arange(len(doc)) + arr[:, 2].view(np.int64) #HEAD comes out relative to the token
+        self.left, self.right = subtree_edges(self.heads)
+        self.masks = {}
+        self.prefix = {}
+
+    def ids(self, labels):
+        ids = self.label_ids.get(labels)
+        if ids is None:
+            ids = self.label_ids[labels] = np.array([self.strings[label] for label in labels], dtype=np.uint64)
+        return ids
+
+    def mask(self, column, labels):
+        key = (column, frozenset(labels))
+        if key not in self.masks: #only a handful of ids each time, so a broadcast compare beats np.isin
+            self.masks[key] = (getattr(self, column)[:, None] == self.ids(key[1])).any(axis=1)
+        return self.masks[key]
+
+    def is_pos(self, tags):
+        return self.mask("pos", tags)
+
+    def is_dep(self, labels):
+        return self.mask("dep", labels)
+
+    def count(self, tags, starts, ends):
+        #how many tokens of each inclusive [start, end] span have one of these POS tags
+        key = frozenset(tags)
+        if key not in self.prefix:
+            self.prefix[key] = np.concatenate(([0], np.cumsum(self.is_pos(key))))
+        cum = self.prefix[key]
+        return cum[np.asarray(ends) + 1] - cum[np.asarray(starts)]
+
+    def bounds(self, idx):
+        #(start, end) subtree span of each token index in idx
+        return list(zip(self.left[idx].tolist(), self.right[idx].tolist()))
+
+def token_features(doc):
+    #built once per doc, so a doc DocEngine hands out again doesnt redo it
+    feats = doc.user_data.get(FEATURES_KEY)
+    if feats is None:
+        feats = doc.user_data[FEATURES_KEY] = TokenFeatures(doc)
+    return feats
 
-    # return as a (start, end) tuple
-    return (start_index, rightmost_index)
+def findBounds(tok):
+    # leftmost and rightmost index of the subtree, returned as a (start, end) tuple
+    feats = token_features(tok.doc)
+    return (int(feats.left[tok.i]), int(feats.right[tok.i]))
 
 
 def extract_subrequirements(req_text, nlp):
     doc = nlp(req_text) #use nlp engine on text
-    cand = []
+    feats = token_features(doc)
+    verbish = feats.is_pos(VERBISH_POS)
+    heads = []
 
     # here we check to see if the token dependency label is that of a clause dependency which makes it likely
     # candidate so we add
-    for tok in doc:
-        if tok.dep_ in CLAUSE_DEPS:
-            cand.append(findBounds(tok))
+    heads.append(np.flatnonzero(feats.is_dep(CLAUSE_DEPS)))
 
     # search for the pattern "to +VERB" and take its subtree as a candidate
-    for i, tok in enumerate(doc):
-        if tok.lower_ == "to" and i+1 < len(doc) and doc[i+1].pos_ in VERBISH_POS:
-            cand.append(findBounds(tok))
+    to_verb = np.zeros(len(doc), dtype=bool)
+    to_verb[:-1] = (feats.lower[:-1] == feats.strings["to"]) & verbish[1:]
+    heads.append(np.flatnonzero(to_verb))
 
     # what we think are contentful prepositional prases (preposition + object of interest + modifiers)
     # also note that a preposition relates an object to anoter
-    for tok in doc:
-        if tok.dep_ == "prep": #preposition phrase check using spacy
-            s, e = findBounds(tok) #get the begniing and end of the subtree
-            span = doc[s:e+1]
-            content = []  # start empty list
-            for t in span:  # iterate over every token in the span
-                if t.pos_ in CONTENT_POS:  # check if its POS is contentful
-                    content.append(t) #append if so
-            if len(span) >= 5 and len(content) >= 2: #we also duble check that there are at least two content tokens and it isnt too small
-                cand.append((s, e)) #if all is well, then append!
+    prep = np.flatnonzero(feats.is_dep({"prep"})) #preposition phrase check using spacy
+    s, e = feats.left[prep], feats.right[prep] #get the begniing and end of the subtree
+    #we also duble check that there are at least two content tokens and it isnt too small
+    heads.append(prep[(e - s + 1 >= 5) & (feats.count(CONTENT_POS, s, e) >= 2)])
+    cand = feats.bounds(np.concatenate(heads))
+
     # deduplication and sorting, keeping only spans not in another span
-    cand = sorted(set(cand), key=lambda se: (se[0], -(se[1]-se[0])))
-    kept = []
-    for s, e in cand:
-        if not any(s >= ks and e <= ke for ks, ke in kept):
-            kept.append((s, e))
+    kept = drop_nested(cand) #one sweep, outermost spans win
+
+    # we are looking for any coordinating conjunctions, indexed once by their subtree bounds with the head they hang off
+    conjs = np.flatnonzero(feats.is_dep({"conj"}))
+    conj_index = SpanIndex(feats.bounds(conjs), feats.heads[conjs].tolist())
 
     # check inside each kept span
     split_spans = []
     for s, e in kept:
-        span = doc[s:e+1]
-        local = []
-        for t in span:
-            for c in t.children:
-                if c.dep_ == "conj": # we are looking for any coordinating conjunctions
-                    cs, ce = findBounds(c)
-                    if s <= cs <= ce <= e:
-                        local.append((cs, ce)) #split into the clause before and after the CC^
+        #conjuncts of a token in the span whose whole subtree stays in the span
+        local = [(cs, ce) for (cs, ce), h in conj_index.inside(s, e) if s <= h <= e] #split into the clause before and after the CC^
         split_spans.extend(local or [(s, e)])#if unfound, keep the span as a whole item
 
     # just filtering out non-valid sets that make it thru
     out, seen = [], set()
-    for s, e in sorted(set(split_spans), key=lambda se: se[0]):
-        span = doc[s:e+1]
-        if len(span) < 3: continue #too short check
-        func = sum(1 for t in span if t.pos_ in {"ADP","DET","PRON","PART","PUNCT","CCONJ","SCONJ"})
-        if func / len(span) > 0.6: continue #too wordy check, we check if there is >60% of determiners, PP, punc, etc
-        text = span.text.strip(" ,.;")
-        base = set(w.lower() for w in re.findall(r"\w+", req_text))
+    spans = sorted(set(split_spans), key=lambda se: se[0])
+    if not spans: return out
+    starts, ends = np.array(spans).T
+    size = ends - starts + 1
+    func = feats.count(FUNCTION_POS, starts, ends)
+    #too short check, and too wordy check, we check if there is >60% of determiners, PP, punc, etc
+    ok = (size >= 3) & (func / size <= 0.6)
+    base = set(w.lower() for w in re.findall(r"\w+", req_text))
+    for (s, e), good in zip(spans, ok.tolist()):
+        if not good: continue
+        text = doc[s:e+1].text.strip(" ,.;")
         here = set(w.lower() for w in re.findall(r"\w+", text))
         if here and len(here & base) / len(here) >= 0.8: continue #too much overlap check
         if text not in seen:
@@ -196,13 +331,15 @@ def split_tail_after_colon_as_subs(text):
         return [tail] #return either pieces or tail depending on if there are valid pieces
 
 
+def root_tag(s, nlp):
+    d = nlp(s)
+    for t in d:
+        if t.dep_ == "ROOT": return t.tag_ #get the tag of the word
+    return "" #otherwise return a blank string
+
 def rethread_requirements(req_texts, nlp):
+    prefetch(nlp, (r.strip() for r in req_texts if r.strip())) #the np checks and root tags below all parse these same texts
     pairs = []
-    def root_tag(s):
-        d = nlp(s)
-        for t in d:
-            if t.dep_ == "ROOT": return t.tag_ #get the tag of the word
-        return "" #otherwise return a blank string
     for r in req_texts:
         r = r.strip()
         if not r: continue #look at the input texts and if there isnt anything then skip
@@ -210,7 +347,7 @@ def rethread_requirements(req_texts, nlp):
             pairs.append([r, []]); continue
         if pairs and pairs[-1][0].rstrip().endswith(':') and is_np_like(r, nlp): #if the previous main
             pairs[-1][1].append(r); continue #ended wit : and the current text is NP-like then attach to the previous
-        if pairs and is_np_like(r, nlp) and root_tag(pairs[-1][0]).upper() == "VBG": #if the previous main root tag is VBG
+        if pairs and is_np_like(r, nlp) and root_tag(pairs[-1][0], nlp).upper() == "VBG": #if the previous main root tag is VBG
             pairs[-1][1].append(r); continue #and current is NP-like, then attach as a child
         pairs.append([r, []])
     result = []
@@ -243,16 +380,20 @@ def _chunks_by_commas_with_verbs(tail_doc):
     flush() #whatever is left is assigned to buf
     return chunks #return the list of combined cunks
 
+def colon_index(doc):
+    for i, t in enumerate(doc): #we get index, token
+        if t.text == ':': #we check if the token is a colon
+            if 0 < i < len(doc)-1: #first colon that isnt at either index:0 or doc len -1
+                return i
+            return None
+    return None
+
 def decompose_actions(text, nlp):
     doc = nlp(text) #run nlp
     if not list(doc): return [text] #if theres noting then just return the input
 
-    colon_i = None
-    for i, t in enumerate(doc): #we get index, token
-        if t.text == ':': #we check if the token is a colon
-            colon_i = i #colon index
-            break
-    if colon_i is not None and 0 < colon_i < len(doc)-1: #find first colon that isnt at either index:0 or doc len -1
+    colon_i = colon_index(doc)
+    if colon_i is not None:
         parent = doc[:colon_i].text.strip(" ,.;") #we assign parent to text before the colon
         tail_doc = nlp(doc[colon_i+1:].text) #we run model on the stuff after the colon
         chunks = _chunks_by_commas_with_verbs(tail_doc) #and call earlier chunker to break things up better
@@ -260,44 +401,23 @@ def decompose_actions(text, nlp):
             return [parent + ":"] + chunks #return the parent + content chunks
 
     # else we look toward verb heads
-    roots = []
-    for t in doc:
-        if t.dep_ == "ROOT" and t.pos_ in VERBISH_POS: roots.append(t) # if we find a ROOT that is also a verbish pos then append to roots
-    for t in doc:
-        if t.pos_ in VERBISH_POS and t.dep_ in {"conj","xcomp","ccomp","parataxis"}: roots.append(t) #also same thing but with conjunctions,
-    if not roots: return [text] #open clausual complement, clasual complement, and loosely attached/side-by-side clauses
-
-    #collect spans from each verb head
-    spans_list = []
-    for h in roots:
-        span = findBounds(h)  # returns tart_index, end_index
-        spans_list.append(span)
-
-    # convert to set, then back to list to dedupe
-    unique_spans = set(spans_list)
-
-    # sorted by start index first
-    spans = sorted(unique_spans, key=lambda se: (se[0], se[1]))
-    kept = []
-    for s,e in spans:
-        inside_any = False
-        for ks, ke in kept:  # loop over all previously kept spans
-            if s >= ks and e <= ke:  # if current span [s,e] inside [ks,ke]
-                inside_any = True
-                break  # we are done
-
-        if not inside_any: #we append the content that isn't there already
-            kept.append((s,e))
+    feats = token_features(doc)
+    verbish = feats.is_pos(VERBISH_POS)
+    # a ROOT that is also a verbish pos, and also same thing but with conjunctions,
+    # open clausual complement, clasual complement, and loosely attached/side-by-side clauses
+    roots = np.flatnonzero(verbish & (feats.is_dep({"ROOT"}) | feats.is_dep({"conj","xcomp","ccomp","parataxis"})))
+    if not len(roots): return [text]
+
+    #collect spans from each verb head, then dedupe, sort by start index first and drop the spans already inside an earlier one
+    kept = drop_nested(feats.bounds(roots), longest_first=False) #shortest first, so spans sharing a start both stay like before
 
     out = [] #final output filtering
-    for s,e in kept:
-        span = doc[s:e+1]
-        content = []
-        for t in span: #we get the content pos and if its in our list then we append it to the ouput
-            if t.pos_ in CONTENT_POS:
-                content.append(t)
-        if len(content) >= 2:
-            out.append(span.text.strip(" ,.;")) #if there are more than two blocks then add te span with formatting
+    if kept:
+        starts, ends = np.array(kept).T
+        content = feats.count(CONTENT_POS, starts, ends) #how many content pos tokens each span has
+        for (s, e), n in zip(kept, content.tolist()):
+            if n >= 2:
+                out.append(doc[s:e+1].text.strip(" ,.;")) #if there are more than two blocks then add te span with formatting
     if len(out) >= 2:
         return out #return out if there is a reasonable amount of content
     else:
@@ -305,7 +425,32 @@ def decompose_actions(text, nlp):
 
 
 
-def render_outline(head, reqs_with_grouped, nlp):
+def outline_pieces(reqs_with_grouped):
+    #the pieces render_outline hands to decompose_actions
+    for _req, subs in reqs_with_grouped:
+        for s in subs:
+            for piece, _kids in split_internal_whereins([(s, [])]):
+                yield piece
+
+def prefetch_actions(pieces, nlp):
+    #decompose_actions parses each piece and then the text after its colon, so this is two rounds
+    if not isinstance(nlp, DocEngine):
+        return
+    pieces = list(pieces)
+    nlp.prefetch(pieces)
+    tails = []
+    for p in pieces:
+        doc = nlp(p)
+        i = colon_index(doc)
+        if i is not None:
+            tails.append(doc[i+1:].text)
+    nlp.prefetch(tails)
+
+def render_outline(head, reqs_with_grouped, nlp, decompose=None):
+    #decompose is how each sub piece gets broken up, the tiered engine passes its own
+    if decompose is None:
+        prefetch_actions(outline_pieces(reqs_with_grouped), nlp)
+        decompose = decompose_actions
     print("\n— CLAIM OUTLINE —")
     print(f"Head/Preamble: {head}")
     print("Requirements:") #preemtive outline strucutrue at the top
@@ -317,7 +462,7 @@ def render_outline(head, reqs_with_grouped, nlp):
             grouped = [(s, [])]
             grouped = split_internal_whereins(grouped) #breka down each clause on wherein
             for (piece, _kids) in grouped:
-                parts = decompose_actions(piece, nlp) #further decomposition of each piece
+                parts = decompose(piece, nlp) #further decomposition of each piece
                 if parts and parts[0].rstrip().endswith(":"): #if the first part ends with a colon, this is a paretn
                     parent = parts[0].rstrip(" :")
                     sub_idx += 1 #iterates the id
@@ -348,54 +493,32 @@ def split_internal_whereins(grouped):
             out.append((seg, [])) #appended with empty kids
     return out #return
 
-# ---------- main ----------
-if __name__ == "__main__":
-    # Put any claim text here to test
-    TEXT = (
-        # "A conductor shaping apparatus that shapes at least one first bent portion and at least one second bent portion "
-        # "of a conductor that is bent in a first bend axis and a second bend axis that is orthogonal to the first bend axis, "
-        # "respectively, the conductor shaping apparatus comprising first and second shaping dies that are movable toward and away "
-        # "from each other along a first axis, and that are moved toward each other to shape the at least one first bent portion "
-        # "and the at least one second bent portion, wherein one of the first and second shaping dies is configured to be moved away "
-        # "from the other along a second axis that is different from the first axis such that the conductor is not dragged when the "
-        # "first and second shaping dies are moved away from each other along the first axis after shaping of the first and second "
-        # "bent portions is completed, wherein, the first and second shaping dies are configured such that: the first and second "
-        # "shaping dies approach each other along the first axis until the conductor abuts a first bending portion pressing surface of "
-        # "the second shaping die, the first and second shaping dies thereafter approach each other along the second axis until the "
-        # "conductor abuts a second bending portion pressing surface of the second shaping die, the first and second shaping dies "
-        # "thereafter approach along only the first axis to form the first and second bent portions, and the first and second shaping "
-        # "dies are moved away from each along only the second axis after shaping is complete."
-        # " A nanoscale device comprising an elongated crystalline semiconductor nanostructure having a plurality of substantially plane side facets, and a first facet layer of a superconductor material covering at least a part of one or more of said side facets, wherein the interface between the at least one facet of the elongated crystalline semiconductor nanostructure and the first facet layer is configured to induce a superconductor hard gap in the semiconductor nanostructure."
-        # "A system for managing a conference meeting, the system comprising: an electronic data store; and one or more computer hardware processors in communication with the electronic data store, the one or more computer hardware processors configured to execute computerexecutable instructions to at least: receive a first audio signal from a first voice-enabled device; identify a first user profile based on the first audio signal, wherein identifying the first user profile comprises performing speaker recognition on the first audio signal and using a first user voice profile; receive a second audio signal from a second voice-enabled device; identify the first user voice profile from the second audio signal; generate a group of voice-enabled devices based on identifying the first user voice profile from both the first audio signal and the second audio signal, wherein the group comprises the first voiceenabled device and the second voice-enabled device, wherein the first voice-enabled device and the second voice-enabled device are in different rooms, wherein voice input from a conference call participant is received by the first voice-enabled device and the second voice-enabled device, and wherein the first voice-enabled device is associated with a first account different than a second account associated with the second voice enabled device; receive a third audio signal from the first voice-enabled device; identify a voice command from the third audio signal; determine, using the group, that the voice command was also received by the second voice-enabled device; determine that the voice command corresponds to a command to leave a conference call associated with a meeting; identify a first user profile based on the third audio signal, wherein identifying the first user profile comprises identifying the first user voice profile from the third audio signal; identify an association between the first user profile and the first voice-enabled device; select the first voice enabled device, from the first voice-enabled device and the second voice enabled device, based on the association between the first user profile and the first voice-enabled device; and execute the voice command, wherein execution of the first voice command causes the first voice enabled device to disconnect from the conference call."
-        # " A method for execution by one or more processing modules of one or more computing devices of a dispersed storage network (DSN), the method comprises: receiving and storing data; receiving a corresponding task(s) to be executed on the stored data; selecting a number of distributed storage and task execution (DST EX) units to favorably execute partial tasks of the corresponding task(s), wherein the partial tasks are processed in parallel to complete an overall task within a desired task execution time period; determining task partitioning based on one or more of distributed computing capabilities of the selected DST EX units; determining processing parameters of the data based on the task partitioning; partitioning the task(s) based on the task partitioning to produce the partial tasks; processing the data in accordance with the processing parameters to produce slice groupings, wherein the slice groupings include groups of encoded data slices; and sending the slice groupings and corresponding partial tasks to the DST EX units in accordance with a pillar mapping."
-        # " An apparatus for carbon dioxide gas separation, comprising a gas source, a flow distributor, a gas flow meter, a venturi jet unit provided with two liquid inhaling inlets, a tubular hydrate reaction unit, a gasliquid-solid three-phase separation unit, a first slurry pump, a hydrate dissociation unit provided with a first pressure maintaining valve at its top, a second slurry pump, and a solution saturation tank provided with a third safety valve at its top, which are communicated sequentially, further comprising a chemical absorption tower, a second corrosionresistant pump, a heat exchanger, a regeneration tower, a third corrosion-resistant pump, and a reservoir containing a CO 2 chemical absorbent, which are communicated sequentially, wherein, the reservoir is communicated with an upper portion of the chemical absorption tower through a first corrosion-resistant pump to form a cycle; the flow distributor is communicated with a bottom inlet of the solution saturation tank, and a bottom outlet of the solution saturation tank is communicated with the two liquid inhaling inlets of the venturi jet unit through sequentially a liquid-phase mass flow meter and a ninth stop valve; a second safety valve is disposed at a top of the gas-liquid-solid three-phase separation unit; the gas-liquid-solid three-phase separation unit is communicated with a lower portion of the chemical absorption tower through sequentially a third one-way gas valve, a second pressure maintaining valve and a fourth one-way gas valve; an upper portion of the chemical absorption tower is communicated with a hydrogen collecting tank provided with a first safety valve through a fifth one-way gas valve; the regeneration tower is further communicated with the hydrate dissociation unit, and regenerated carbon dioxide gas is directed to the hydrate dissociation unit in which it will be mixed with the carbon dioxide produced during the dissociation and then subjected to a subsequent processing."
-        " A child motion apparatus comprising: a base frame assembly for providing standing support on a floor; a column connected with the base frame assembly; a support arm extending generally horizontally relative to the column, the support arm having a first and a second end portion, the first end portion being assembled with the column and having a channel extending generally vertically, the support arm further being connected with the column via a hinge about which the support arm is rotatable generally horizontally relative to the column; a child seat connected with the second end portion of the support arm; a vertical actuating mechanism supported by the base frame assembly and operable to drive the column to slide upward and downward relative to the base frame assembly; and a horizontal actuating mechanism operable to drive the support arm to oscillate generally horizontally relative to the column, the horizontal actuating mechanism including a driving part movable along a circular path and guided for sliding movement along the channel at the first end portion of the support arm, wherein a circular motion of the driving part causes the driving part to slide along the channel and thereby drives an oscillating movement of the support arm."
-    )
+def split_main(main):
+    # get stuff after colon as colontail
+    colon_tail = split_tail_after_colon_as_subs(main)
 
-    nlp = spacy.load("en_core_web_sm")
+    #normalize the main head
+    if ':' in main:
+        main_head = main.split(':', 1)[0].strip(" ,.")
+    else:
+        main_head = main
 
-    head, body = detect_head(TEXT, nlp)
-    req_texts = split_requirements(body, nlp)
-    main_with_presubs = rethread_requirements(req_texts, nlp)
+    # split off initial wherein
+    head_only, wh_from_main = split_wherein(main_head)
+    return colon_tail, head_only, wh_from_main
 
+def attach_subrequirements(main_with_presubs, nlp, parse=None):
+    #parse says per main whether to look for structural subclauses with the parser (default: all of them)
     # (top level, requirements)
     req_with_subs: List[Tuple[str, List[str]]] = []
+    split = [(split_main(main), pre_subs) for main, pre_subs in main_with_presubs]
+    if parse is None:
+        parse = [True] * len(split)
+    prefetch(nlp, (head_only for ((_tail, head_only, _wh), _pre), p in zip(split, parse) if p))
 
-    for main, pre_subs in main_with_presubs:
-        # get stuff after colon as colontail
-        colon_tail = split_tail_after_colon_as_subs(main)
-
-        #normalize the main head
-        if ':' in main:
-            main_head = main.split(':', 1)[0].strip(" ,.")
-        else:
-            main_head = main
-
-        # split off initial wherein
-        head_only, wh_from_main = split_wherein(main_head)
-
+    for ((colon_tail, head_only, wh_from_main), pre_subs), p in zip(split, parse):
         # extra subrequirements from the head
-        structural = extract_subrequirements(head_only, nlp)
+        structural = extract_subrequirements(head_only, nlp) if p else []
 
         # add all up: from colon tail,any preexisting subs attached upstream (pre_subs)
         # wherein pulled out of the head, structural subclauses found by NLP
@@ -416,5 +539,250 @@ if __name__ == "__main__":
 
         #store clean with subclasses
         req_with_subs.append((head_only, flat_subs))
+    return req_with_subs
+
+def build_outlines(texts, nlp):
+    #the whole pipeline for a batch of claims, stage by stage so every stage parses its texts together
+    #returns (head, requirements with subs) per claim, ready for render_outline
+    heads_bodies = [detect_head(t, nlp) for t in texts]
+    all_reqs = split_requirements_many([body for _head, body in heads_bodies], nlp)
+    prefetch(nlp, (r.strip() for reqs in all_reqs for r in reqs if r.strip()))
+    threaded = [rethread_requirements(reqs, nlp) for reqs in all_reqs]
+    prefetch(nlp, (split_main(main)[1] for t in threaded for main, _pre in t))
+    outlines = []
+    for (head, _body), main_with_presubs in zip(heads_bodies, threaded):
+        outlines.append((head, attach_subrequirements(main_with_presubs, nlp)))
+    prefetch_actions((p for _head, reqs in outlines for p in outline_pieces(reqs)), nlp)
+    return outlines
+
+# ---------- tiered engine ----------
+#most claims are a clean "comprising: a ...; b ...; and c ..." list, and for those the regex splitting above already
+#gives the same outline the parser would. each requirement gets a confidence score and only the shaky ones go to spacy
+
+DET_START_RE = re.compile(r"^\s*(?:an?|the|said|each|at least one|one or more|a plurality of|first|second)\b", re.I)
+CLAUSE_CUE_RE = re.compile(
+    r"\b(?:which|that|wherein|whereby|such|so as|configured|adapted|operable|arranged|capable|being|when|while|until|to\s+\w+)\b",
+    re.I)
+FINITE_CUE_RE = re.compile(r"\b(?:is|are|was|were|has|have|had|does|do|can|may|will|shall|must)\b", re.I)
+TIER_THRESHOLD = 0.7
+
+def regex_confidence(text):
+    #1.0 means we are sure the parser would leave this text alone: it reads as a plain noun phrase element
+    #method steps, clauses, lists and finite verbs all knock the score down
+    text = text.strip()
+    if not text:
+        return 1.0
+    score = 1.0
+    if not DET_START_RE.match(text): score -= 0.4 #doesnt open like a device element
+    if ':' in text: score -= 0.5 #colon lists get rethreaded/decomposed
+    if ',' in text or re.search(r"\b(?:and|or)\b", text, re.I): score -= 0.3 #coordination
+    if CLAUSE_CUE_RE.search(text): score -= 0.3 #embedded clause
+    if FINITE_CUE_RE.search(text): score -= 0.3 #a full sentence rather than a phrase
+    words = len(text.split())
+    if words > 16: score -= min(0.4, (words - 16) * 0.02) #long ones hide more structure
+    return max(0.0, score)
+
+
+class TieredOutliner:
+    #same outlines as build_outlines + render_outline, but only low confidence pieces ever get parsed
+    #stats counts how many heads/requirements/sub pieces went each way, report() prints it
+    def __init__(self, nlp, threshold=TIER_THRESHOLD):
+        self.nlp = nlp
+        self.threshold = threshold
+        self.stats = Counter()
+
+    def quick(self, text): #can the regex tier handle this on its own
+        return regex_confidence(text) >= self.threshold
+
+    def outline(self, texts):
+        nlp = self.nlp
+        texts = list(texts)
+        touched = [False] * len(texts) #did the claim need the parser at all
+
+        heads_bodies = []
+        for i, text in enumerate(texts):
+            found = detect_head_regex(text)
+            if found is None:
+                self.stats["heads_spacy"] += 1
+                touched[i] = True
+                found = detect_head(text, nlp)
+            else:
+                self.stats["heads_regex"] += 1
+            heads_bodies.append(found)
+
+        #a primary element is quick when it scores well and has nothing for safe_np_split to try
+        tagged = []
+        for _head, body in heads_bodies:
+            prims = (split_top_level_semicolons(body) or [body]) if body else []
+            tagged.append([(r, self.quick(r) and len(np_split_parts(r, AND_DET_SPLIT_RE)) <= 1
+                            and len(np_split_parts(r, APPOSITIVE_SPLIT_RE)) <= 1) for r in prims])
+        slow_split = iter(split_requirements_many([r for t in tagged for r, q in t if not q], nlp))
+
+        outlines = []
+        for i, prims in enumerate(tagged):
+            reqs = []
+            for r, q in prims:
+                if q:
+                    self.stats["reqs_regex"] += 1
+                    x = r.strip(" ,.")
+                    if x: reqs.append((x, True))
+                else:
+                    self.stats["reqs_spacy"] += 1
+                    touched[i] = True
+                    reqs.extend((p, False) for p in next(slow_split))
+            mains = self.rethread(reqs, i, touched)
+            parse = [not (q and self.quick(split_main(m)[1])) for m, _subs, q in mains]
+            if any(parse):
+                touched[i] = True
+            outlines.append((heads_bodies[i][0], attach_subrequirements([(m, subs) for m, subs, _q in mains], nlp, parse)))
+
+        #sub pieces: the quick ones are never parsed, the rest are prefetched together for render_outline
+        slow_pieces = []
+        for i, (_head, reqs) in enumerate(outlines):
+            for piece in outline_pieces(reqs):
+                if not self.quick_piece(piece):
+                    slow_pieces.append(piece)
+                    touched[i] = True
+        prefetch_actions(slow_pieces, nlp)
+
+        self.stats["claims"] += len(texts)
+        self.stats["claims_regex_only"] += touched.count(False)
+        return outlines
+
+    def rethread(self, reqs, i, touched):
+        #rethread_requirements, except a quick determiner-led main cant have a VBG root or end in a colon,
+        #so the next requirement just starts a new main without asking the parser
+        nlp = self.nlp
+        pairs = []
+        for r, q in reqs:
+            r = r.strip()
+            if not r: continue
+            if re.match(r'^\s*wherein\b', r, flags=re.I):
+                pairs.append([r, [], q]); continue
+            if pairs:
+                prev, _subs, prev_q = pairs[-1]
+                if prev.rstrip().endswith(':') or not (prev_q and DET_START_RE.match(prev)):
+                    touched[i] = True
+                    if prev.rstrip().endswith(':') and is_np_like(r, nlp):
+                        pairs[-1][1].append(r); continue
+                    if is_np_like(r, nlp) and root_tag(prev, nlp).upper() == "VBG":
+                        pairs[-1][1].append(r); continue
+            pairs.append([r, [], q])
+        return pairs
+
+    def quick_piece(self, piece):
+        return ':' not in piece and self.quick(piece)
+
+    def decompose(self, piece, nlp): #what render_outline uses instead of decompose_actions
+        if self.quick_piece(piece):
+            self.stats["subs_regex"] += 1
+            return [piece]
+        self.stats["subs_spacy"] += 1
+        return decompose_actions(piece, nlp)
+
+    def render(self, head, reqs_with_grouped):
+        render_outline(head, reqs_with_grouped, self.nlp, self.decompose)
+
+    def report(self):
+        s = self.stats
+        lines = []
+        for label, fast, slow in (("heads", "heads_regex", "heads_spacy"),
+                                  ("requirements", "reqs_regex", "reqs_spacy"),
+                                  ("sub pieces", "subs_regex", "subs_spacy")):
+            total = s[fast] + s[slow]
+            if total:
+                lines.append(f"{label}: {s[fast]}/{total} regex only ({100 * s[fast] / total:.0f}%), {s[slow]} spacy")
+        if s["claims"]:
+            lines.append(f"claims that never touched the parser: {s['claims_regex_only']}/{s['claims']}")
+        return "\n".join(lines)
+
+# ---------- incremental ----------
+#for an editor loop where one element of the claim changes and the outline is refreshed: the new claim is compared with
+#the last one element by element (the split_top_level_semicolons pieces), only the elements that are new get split and
+#parsed, and the outline is put back together from those plus everything kept from the last refresh
+
+class IncrementalOutliner:
+    #same outline as build_outlines + render_outline for one claim at a time, stats counts what was reused
+    def __init__(self, nlp, batch_size=BATCH_SIZE):
+        self.nlp = nlp if isinstance(nlp, DocEngine) else DocEngine(nlp, batch_size)
+        self.element_reqs: Dict[str, List[str]] = {} #semicolon element -> its requirements, for the last claim's elements
+        self.attached: Dict[Tuple[str, Tuple[str, ...]], Tuple[str, List[str]]] = {} #(main, pre subs) -> attach_subrequirements result
+        self.actions: Dict[str, List[str]] = {} #sub piece -> decompose_actions result
+        self.head = None
+        self.outline: List[Tuple[str, List[str]]] = []
+        self.stats = Counter()
+
+    def refresh(self, text):
+        #re-outlines the edited claim and returns (head, requirements with subs), the same thing build_outlines gives
+        nlp = self.nlp
+        head, body = detect_head(text, nlp) #regex unless the claim has no colon or "comprising"
+        elements = (split_top_level_semicolons(body) or [body]) if body else []
+
+        new = [e for e in dict.fromkeys(elements) if e not in self.element_reqs]
+        self.stats["elements_reused"] += len(elements) - len(new)
+        self.stats["elements_parsed"] += len(new)
+        for e, reqs in zip(new, split_primaries_many([[e] for e in new], nlp)):
+            self.element_reqs[e] = reqs
+        self.element_reqs = {e: self.element_reqs[e] for e in elements} #drop the elements that were edited away
+
+        #rethreading looks across element boundaries (a "...:" main takes the next ones as subs) so it always runs,
+        #but every text it checks is still parsed from before unless its element changed
+        threaded = rethread_requirements([r for e in elements for r in self.element_reqs[e]], nlp)
+        keys = [(main, tuple(pre)) for main, pre in threaded]
+        todo = [k for k in dict.fromkeys(keys) if k not in self.attached]
+        prefetch(nlp, (split_main(main)[1] for main, _pre in todo))
+        for k, res in zip(todo, attach_subrequirements([(main, list(pre)) for main, pre in todo], nlp)):
+            self.attached[k] = res
+        self.attached = {k: self.attached[k] for k in keys}
+        outline = [self.attached[k] for k in keys]
+
+        pieces = list(dict.fromkeys(outline_pieces(outline)))
+        fresh = [p for p in pieces if p not in self.actions]
+        prefetch_actions(fresh, nlp)
+        for p in fresh:
+            self.actions[p] = decompose_actions(p, nlp)
+        self.actions = {p: self.actions[p] for p in pieces}
+
+        nlp.sweep() #the docs behind reused results arent needed anymore
+        self.head, self.outline = head, outline
+        return head, outline
+
+    def decompose(self, piece, nlp): #what render_outline uses instead of decompose_actions
+        parts = self.actions.get(piece)
+        if parts is None:
+            parts = self.actions[piece] = decompose_actions(piece, nlp)
+        return parts
+
+    def render(self):
+        render_outline(self.head, self.outline, self.nlp, self.decompose)
+
+# ---------- main ----------
+if __name__ == "__main__":
+    # Put any claim text here to test
+    TEXT = (
+        # "A conductor shaping apparatus that shapes at least one first bent portion and at least one second bent portion "
+        # "of a conductor that is bent in a first bend axis and a second bend axis that is orthogonal to the first bend axis, "
+        # "respectively, the conductor shaping apparatus comprising first and second shaping dies that are movable toward and away "
+        # "from each other along a first axis, and that are moved toward each other to shape the at least one first bent portion "
+        # "and the at least one second bent portion, wherein one of the first and second shaping dies is configured to be moved away "
+        # "from the other along a second axis that is different from the first axis such that the conductor is not dragged when the "
+        # "first and second shaping dies are moved away from each other along the first axis after shaping of the first and second "
+        # "bent portions is completed, wherein, the first and second shaping dies are configured such that: the first and second "
+        # "shaping dies approach each other along the first axis until the conductor abuts a first bending portion pressing surface of "
+        # "the second shaping die, the first and second shaping dies thereafter approach each other along the second axis until the "
+        # "conductor abuts a second bending portion pressing surface of the second shaping die, the first and second shaping dies "
+        # "thereafter approach along only the first axis to form the first and second bent portions, and the first and second shaping "
+        # "dies are moved away from each along only the second axis after shaping is complete."
+        # " A nanoscale device comprising an elongated crystalline semiconductor nanostructure having a plurality of substantially plane side facets, and a first facet layer of a superconductor material covering at least a part of one or more of said side facets, wherein the interface between the at least one facet of the elongated crystalline semiconductor nanostructure and the first facet layer is configured to induce a superconductor hard gap in the semiconductor nanostructure."
+        # "A system for managing a conference meeting, the system comprising: an electronic data store; and one or more computer hardware processors in communication with the electronic data store, the one or more computer hardware processors configured to execute computerexecutable instructions to at least: receive a first audio signal from a first voice-enabled device; identify a first user profile based on the first audio signal, wherein identifying the first user profile comprises performing speaker recognition on the first audio signal and using a first user voice profile; receive a second audio signal from a second voice-enabled device; identify the first user voice profile from the second audio signal; generate a group of voice-enabled devices based on identifying the first user voice profile from both the first audio signal and the second audio signal, wherein the group comprises the first voiceenabled device and the second voice-enabled device, wherein the first voice-enabled device and the second voice-enabled device are in different rooms, wherein voice input from a conference call participant is received by the first voice-enabled device and the second voice-enabled device, and wherein the first voice-enabled device is associated with a first account different than a second account associated with the second voice enabled device; receive a third audio signal from the first voice-enabled device; identify a voice command from the third audio signal; determine, using the group, that the voice command was also received by the second voice-enabled device; determine that the voice command corresponds to a command to leave a conference call associated with a meeting; identify a first user profile based on the third audio signal, wherein identifying the first user profile comprises identifying the first user voice profile from the third audio signal; identify an association between the first user profile and the first voice-enabled device; select the first voice enabled device, from the first voice-enabled device and the second voice enabled device, based on the association between the first user profile and the first voice-enabled device; and execute the voice command, wherein execution of the first voice command causes the first voice enabled device to disconnect from the conference call."
+        # " A method for execution by one or more processing modules of one or more computing devices of a dispersed storage network (DSN), the method comprises: receiving and storing data; receiving a corresponding task(s) to be executed on the stored data; selecting a number of distributed storage and task execution (DST EX) units to favorably execute partial tasks of the corresponding task(s), wherein the partial tasks are processed in parallel to complete an overall task within a desired task execution time period; determining task partitioning based on one or more of distributed computing capabilities of the selected DST EX units; determining processing parameters of the data based on the task partitioning; partitioning the task(s) based on the task partitioning to produce the partial tasks; processing the data in accordance with the processing parameters to produce slice groupings, wherein the slice groupings include groups of encoded data slices; and sending the slice groupings and corresponding partial tasks to the DST EX units in accordance with a pillar mapping."
+        # " An apparatus for carbon dioxide gas separation, comprising a gas source, a flow distributor, a gas flow meter, a venturi jet unit provided with two liquid inhaling inlets, a tubular hydrate reaction unit, a gasliquid-solid three-phase separation unit, a first slurry pump, a hydrate dissociation unit provided with a first pressure maintaining valve at its top, a second slurry pump, and a solution saturation tank provided with a third safety valve at its top, which are communicated sequentially, further comprising a chemical absorption tower, a second corrosionresistant pump, a heat exchanger, a regeneration tower, a third corrosion-resistant pump, and a reservoir containing a CO 2 chemical absorbent, which are communicated sequentially, wherein, the reservoir is communicated with an upper portion of the chemical absorption tower through a first corrosion-resistant pump to form a cycle; the flow distributor is communicated with a bottom inlet of the solution saturation tank, and a bottom outlet of the solution saturation tank is communicated with the two liquid inhaling inlets of the venturi jet unit through sequentially a liquid-phase mass flow meter and a ninth stop valve; a second safety valve is disposed at a top of the gas-liquid-solid three-phase separation unit; the gas-liquid-solid three-phase separation unit is communicated with a lower portion of the chemical absorption tower through sequentially a third one-way gas valve, a second pressure maintaining valve and a fourth one-way gas valve; an upper portion of the chemical absorption tower is communicated with a hydrogen collecting tank provided with a first safety valve through a fifth one-way gas valve; the regeneration tower is further communicated with the hydrate dissociation unit, and regenerated carbon dioxide gas is directed to the hydrate dissociation unit in which it will be mixed with the carbon dioxide produced during the dissociation and then subjected to a subsequent processing."
+        " A child motion apparatus comprising: a base frame assembly for providing standing support on a floor; a column connected with the base frame assembly; a support arm extending generally horizontally relative to the column, the support arm having a first and a second end portion, the first end portion being assembled with the column and having a channel extending generally vertically, the support arm further being connected with the column via a hinge about which the support arm is rotatable generally horizontally relative to the column; a child seat connected with the second end portion of the support arm; a vertical actuating mechanism supported by the base frame assembly and operable to drive the column to slide upward and downward relative to the base frame assembly; and a horizontal actuating mechanism operable to drive the support arm to oscillate generally horizontally relative to the column, the horizontal actuating mechanism including a driving part movable along a circular path and guided for sliding movement along the channel at the first end portion of the support arm, wherein a circular motion of the driving part causes the driving part to slide along the channel and thereby drives an oscillating movement of the support arm."
+    )
+
+    nlp = DocEngine(OUTLINE_MODEL) #lazy, a claim the regex tier handles never loads it
+    tiers = TieredOutliner(nlp)
 
-    render_outline(head, req_with_subs, nlp)
+    for head, req_with_subs in tiers.outline([TEXT]):
+        tiers.render(head, req_with_subs)
+    print("\n" + tiers.report())
@@ -0,0 +1,266 @@
+import argparse
+import importlib
+import json
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+import traceback
+from collections import deque
+
+import nlploader
+
+#a pool of worker processes that each load the spacy model once and then parse batches of claims
+#the target is given as "module:function" so the workers import it themselves, for example:
+#   cleantest4:get_claims            modules that load their own model at import, called as fn(text)
+#   rawspacytest:split_requirements  with model="en_core_web_sm", called as fn(text, nlp)
+#   cleantest4:get_claims_many       with batch=True, called once per batch as fn(texts)
+#a worker that crashes (segfault, oom kill, ...) is replaced and its batch goes to another worker
+
+
+class FarmError(RuntimeError):
+    pass
+
+
+def resolve(target): #"cleantest4:get_claims" -> the function
+    mod, sep, name = target.partition(":")
+    if not sep or not name:
+        raise ValueError(f"target should look like module:function, got {target!r}")
+    return getattr(importlib.import_module(mod), name)
+
+
+def _worker(wid, target, model, profile, batch, inbox, results):
+    #one thread per process, otherwise every worker fights over all the cores
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    try:
+        fn = resolve(target)
+        nlp = nlploader.lazy(model, profile) if model else None #lazy so it goes through the parse cache when one is set
+        nlploader.warm() #load it and cleantest4/cleantest3's lazy models now rather than on the first batch
+    except Exception:
+        results.put(("failed", wid, None, traceback.format_exc()))
+        return
+    results.put(("ready", wid, None, None))
+    while True:
+        task = inbox.get()
+        if task is None: #shutdown
+            break
+        bid, texts = task
+        try:
+            if batch:
+                out = list(fn(texts, nlp) if nlp is not None else fn(texts))
+            elif nlp is not None:
+                out = [fn(t, nlp) for t in texts]
+            else:
+                out = [fn(t) for t in texts]
+            results.put(("ok", wid, bid, out))
+        except Exception:
+            results.put(("error", wid, bid, traceback.format_exc()))
+
+
+class WorkerFarm:
+    def __init__(self, target, model=None, workers=None, batch_size=16, batch=False, max_retries=2, start_method="spawn",
+                 profile="split"):
+        self.target = target
+        self.model = model
+        self.profile = profile #which nlploader profile the model is loaded with
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch = batch
+        self.max_retries = max_retries #how many workers a single batch is allowed to take down before we give up on it
+        self.ctx = mp.get_context(start_method) #spawn so workers dont inherit a half loaded torch/spacy from the parent
+        self.results = None
+        self.procs = {}
+        self.inboxes = {}
+        self.ready = set()
+        self.restarts = 0
+
+    def start(self):
+        if self.results is None:
+            self.results = self.ctx.Queue()
+            for wid in range(self.workers):
+                self._spawn(wid)
+        return self
+
+    def _spawn(self, wid):
+        inbox = self.ctx.Queue() #fresh queue, the old one may still hold the task the dead worker was on
+        proc = self.ctx.Process(target=_worker, args=(wid, self.target, self.model, self.profile, self.batch, inbox, self.results), daemon=True)
+        proc.start()
+        self.procs[wid] = proc
+        self.inboxes[wid] = inbox
+        self.ready.discard(wid)
+
+    def wait_ready(self, timeout=None):
+        #blocks until every worker has its model loaded, handy for timing the parsing without the load
+        #a worker killed while loading (oom, segfault) never says ready or failed, so we keep checking they are alive
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while len(self.ready) < self.workers:
+            left = 0.5 if deadline is None else min(0.5, max(0.0, deadline - time.monotonic()))
+            try:
+                msg = self.results.get(timeout=left)
+            except queue.Empty:
+                self._check_loading()
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise FarmError(f"only {len(self.ready)} of {self.workers} workers ready")
+                continue
+            self._control(msg)
+        return self
+
+    def _check_loading(self):
+        #raises for a worker that exited before it was ready, same as a worker that says it failed
+        for wid, proc in list(self.procs.items()):
+            if wid in self.ready or proc.is_alive():
+                continue
+            while True: #whatever it managed to send before it went (a "failed" has the traceback)
+                try:
+                    self._control(self.results.get(timeout=0.1))
+                except queue.Empty:
+                    break
+            if wid not in self.ready:
+                code = proc.exitcode
+                self.close()
+                raise FarmError(f"worker {wid} exited (exit code {code}) before loading {self.target}")
+
+    def _control(self, msg): #handles the ready/failed messages, returns False for anything else
+        kind, wid, _bid, payload = msg
+        if kind == "ready":
+            self.ready.add(wid)
+            return True
+        if kind == "failed": #the model or module wont load, restarting wont help
+            self.close()
+            raise FarmError(f"worker {wid} could not load {self.target}:\n{payload}")
+        return False
+
+    def map(self, texts):
+        #yields one result per text, in input order
+        self.start()
+        batches = self._batches(texts)
+        pending = {} #bid -> texts, everything sent out that hasnt come back
+        assigned = {} #wid -> bid
+        waiting = deque() #bids that lost their worker and need to be sent again
+        retries = {}
+        done = {}
+        next_out = 0
+        pulled = 0
+        exhausted = False
+        window = self.workers * 4 #dont run too far ahead of the oldest unfinished batch
+
+        while True:
+            for wid in range(self.workers):
+                if wid in assigned:
+                    continue
+                bid = None
+                while waiting and bid is None:
+                    b = waiting.popleft()
+                    if b in pending: #could have finished after all
+                        bid = b
+                if bid is None and not exhausted and pulled - next_out < window:
+                    nxt = next(batches, None)
+                    if nxt is None:
+                        exhausted = True
+                    else:
+                        bid, chunk = nxt
+                        pending[bid] = chunk
+                        pulled += 1
+                if bid is None:
+                    break
+                self.inboxes[wid].put((bid, pending[bid]))
+                assigned[wid] = bid
+
+            while next_out in done:
+                yield from done.pop(next_out)
+                next_out += 1
+            if exhausted and not pending:
+                return
+
+            try:
+                msg = self.results.get(timeout=0.5)
+            except queue.Empty:
+                msg = None
+            if msg is not None and not self._control(msg):
+                kind, wid, bid, payload = msg
+                if assigned.get(wid) == bid:
+                    del assigned[wid]
+                if bid in pending: #a requeued batch can come back twice, the second one is dropped
+                    if kind == "error":
+                        raise FarmError(f"{self.target} failed on batch {bid}:\n{payload}")
+                    del pending[bid]
+                    done[bid] = payload
+
+            for wid, proc in list(self.procs.items()): #replace dead workers, their batch goes back in line
+                if proc.is_alive():
+                    continue
+                bid = assigned.pop(wid, None)
+                if bid is not None and bid in pending:
+                    retries[bid] = retries.get(bid, 0) + 1
+                    if retries[bid] > self.max_retries:
+                        raise FarmError(f"batch {bid} crashed {retries[bid]} workers, giving up")
+                    waiting.appendleft(bid)
+                print(f"worker {wid} died (exit code {proc.exitcode}), restarting", file=sys.stderr)
+                self.restarts += 1
+                self._spawn(wid)
+
+    def _batches(self, texts):
+        chunk = []
+        bid = 0
+        for t in texts:
+            chunk.append(t)
+            if len(chunk) >= self.batch_size:
+                yield bid, chunk
+                bid += 1
+                chunk = []
+        if chunk:
+            yield bid, chunk
+
+    def close(self):
+        for wid, proc in self.procs.items():
+            if proc.is_alive():
+                self.inboxes[wid].put(None)
+        for proc in self.procs.values():
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self.procs.clear()
+        self.inboxes.clear()
+        self.results = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    from nonlpbatch import detect_format, read_records
+
+    ap = argparse.ArgumentParser(description="Run one of the claim parsers over a file on every core.")
+    ap.add_argument("target", help="module:function, e.g. cleantest4:get_claims")
+    ap.add_argument("input", help="input file (jsonl, csv or one claim per line), or - for stdin")
+    ap.add_argument("-o", "--output", help="output jsonl file (default stdout)")
+    ap.add_argument("--model", help="load this model in each worker and pass it as the second argument")
+    ap.add_argument("--profile", default="split", choices=sorted(nlploader.PROFILES), help="which components --model loads with")
+    ap.add_argument("--batch", action="store_true", help="the target takes the whole batch (e.g. get_claims_many)")
+    ap.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--batch-size", type=int, default=16)
+    ap.add_argument("--field", default="text")
+    args = ap.parse_args()
+
+    fp_in = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+    fmt = "plain" if args.input == "-" else detect_format(args.input)
+    records = list(read_records(fp_in, fmt, args.field))
+    fp_out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+
+    with WorkerFarm(args.target, args.model, args.workers, args.batch_size, args.batch, profile=args.profile) as farm:
+        t0 = time.perf_counter()
+        farm.wait_ready()
+        t_load = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for (rid, _text), result in zip(records, farm.map(text for _rid, text in records)):
+            fp_out.write(json.dumps({"id": rid, "result": result}, ensure_ascii=False) + "\n")
+        elapsed = time.perf_counter() - t0
+    if fp_out is not sys.stdout:
+        fp_out.close()
+    print(f"{args.workers} workers ready in {t_load:.1f}s, {len(records)} claims in {elapsed:.2f}s "
+          f"({len(records) / elapsed if elapsed else 0:.1f}/sec, {farm.restarts} restarts)", file=sys.stderr)
@@ -0,0 +1,173 @@
+import argparse
+import hashlib
+import os
+import time
+
+import corefwindow
+import nlploader
+
+#the AllenNLP SpanBERT coref model (models/coref-spanbert-local) behind one object that nltktestcont and corefwindow use
+#   coref = SpanBertCoref()          #nothing is loaded until it is first called
+#   coref(texts)                     #clusters per text as (start_char, end_char) lists, the corefwindow callable
+#   coref.predict(texts)             #the predictor's own output per text, in input order
+#texts go through predict_batch_json in batches of similar length, so short claims dont pay for the padding of long
+#ones, torch gets an explicit thread count and the linear layers can be dynamically quantized to int8
+#set COREF_THREADS to pin the thread count and COREF_INT8=1 to quantize
+#run "python spanbertcoref.py claims.txt --quantize" for one-at-a-time vs batched throughput and the int8 deltas
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "coref-spanbert-local")
+THREADS_ENV = "COREF_THREADS"
+INT8_ENV = "COREF_INT8"
+
+
+def buckets(lengths, batch_size=8, max_batch_tokens=4096):
+    #lists of indexes into lengths, shortest texts first, each batch at most batch_size texts and at most
+    #max_batch_tokens once padded to its longest text
+    batch = []
+    for i in sorted(range(len(lengths)), key=lengths.__getitem__):
+        if batch and (len(batch) >= batch_size or (len(batch) + 1) * lengths[i] > max_batch_tokens):
+            yield batch
+            batch = []
+        batch.append(i)
+    if batch:
+        yield batch
+
+def allennlp_clusters(text, pred):
+    #the predictor gives clusters as inclusive [first, last] indexes into its own token list
+    offs = corefwindow.token_offsets(text, pred["document"])
+    return [[(offs[a][0], offs[b][1]) for a, b in cluster] for cluster in pred["clusters"]]
+
+
+class SpanBertCoref:
+    def __init__(self, path=MODEL_PATH, threads=None, quantize=None, batch_size=8, max_batch_tokens=4096):
+        self.path = path
+        self.threads = threads or int(os.environ.get(THREADS_ENV) or 0) or os.cpu_count() or 1
+        self.quantize = quantize if quantize is not None else os.environ.get(INT8_ENV) == "1"
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.predictor = None
+        self.stats = {"texts": 0, "batches": 0, "tokens": 0, "seconds": 0.0}
+
+    def load(self):
+        if self.predictor is None:
+            import torch
+            from allennlp.predictors.predictor import Predictor
+            import allennlp_models.coref #registers the coref model and reader with allennlp
+            torch.set_num_threads(self.threads)
+            try:
+                torch.set_num_interop_threads(1) #batches already run one after another
+            except RuntimeError:
+                pass #only allowed before torch starts any parallel work, e.g. a second SpanBertCoref
+            t0 = time.perf_counter()
+            self.predictor = Predictor.from_path(self.path, cuda_device=-1)
+            self.predictor._model.eval()
+            if self.quantize:
+                self.quantize_model()
+            nlploader.LOAD_STATS.append({"model": self.path, "profile": "int8" if self.quantize else "fp32",
+                                         "seconds": time.perf_counter() - t0, "peak_rss_mb": nlploader.peak_rss_mb(),
+                                         "pipes": [f"threads={self.threads}"]})
+        return self.predictor
+
+    def fingerprint(self):
+        #model id for cached results, from the config (not the weights) so it is cheap and never loads the model
+        with open(os.path.join(self.path, "config.json"), "rb") as fp:
+            digest = hashlib.blake2b(fp.read(), digest_size=8).hexdigest()
+        return f"spanbert-coref:{digest}:{'int8' if self.quantize else 'fp32'}"
+
+    def quantize_model(self):
+        #int8 weights for every nn.Linear (SpanBERT's and the span/antecedent scorers), activations stay float
+        import torch
+        predictor = self.load()
+        predictor._model = torch.quantization.quantize_dynamic(predictor._model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.quantize = True
+
+    def predict(self, texts):
+        predictor = self.load()
+        texts = list(texts)
+        lengths = [corefwindow.count_tokens(t) for t in texts]
+        out = [None] * len(texts)
+        t0 = time.perf_counter()
+        for batch in buckets(lengths, self.batch_size, self.max_batch_tokens):
+            preds = predictor.predict_batch_json([{"document": texts[i]} for i in batch])
+            for i, pred in zip(batch, preds):
+                out[i] = pred
+            self.stats["batches"] += 1
+        self.stats["seconds"] += time.perf_counter() - t0
+        self.stats["texts"] += len(texts)
+        self.stats["tokens"] += sum(lengths)
+        return out
+
+    def __call__(self, texts):
+        texts = list(texts)
+        return [allennlp_clusters(t, pred) for t, pred in zip(texts, self.predict(texts))]
+
+    def __repr__(self):
+        state = "loaded" if self.predictor is not None else "not loaded"
+        return f"SpanBertCoref({self.path!r}, threads={self.threads}, {'int8' if self.quantize else 'fp32'}, {state})"
+
+
+def link_scores(gold, pred):
+    #pairwise (mention, mention) links over every text: precision, recall, f1 of pred against gold
+    from benchcoref import links
+    tp = n_gold = n_pred = 0
+    for g, p in zip(gold, pred):
+        g, p = links(g), links(p)
+        tp += len(g & p)
+        n_gold += len(g)
+        n_pred += len(p)
+    precision = tp / n_pred if n_pred else 1.0
+    recall = tp / n_gold if n_gold else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+def timed(fn, texts):
+    t0 = time.perf_counter()
+    out = fn(texts)
+    return out, time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Throughput and int8 accuracy of the SpanBERT coref runner.")
+    ap.add_argument("input", nargs="?", help="claims file (jsonl/csv/plain as in nonlpbatch.py), default: the bench claims")
+    ap.add_argument("--threads", type=int, default=None)
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--max-batch-tokens", type=int, default=4096)
+    ap.add_argument("--quantize", action="store_true", help="also run the int8 model and compare it to fp32")
+    ap.add_argument("--limit", type=int, default=200, help="most claims to use")
+    args = ap.parse_args()
+
+    if args.input:
+        from nonlpbatch import detect_format, read_records
+        with open(args.input, encoding="utf-8", newline="") as fp:
+            texts = [t for _id, t in read_records(fp, detect_format(args.input)) if t.strip()][:args.limit]
+    else:
+        from benchrawspacy import CLAIMS
+        texts = CLAIMS
+    n_tokens = sum(corefwindow.count_tokens(t) for t in texts)
+
+    coref = SpanBertCoref(threads=args.threads, quantize=False, batch_size=args.batch_size,
+                          max_batch_tokens=args.max_batch_tokens)
+    coref.load()
+    coref([texts[0]]) #first call warms up torch, dont time it
+    print(f"{len(texts)} claims, {n_tokens} tokens, {coref.threads} threads, load {nlploader.LOAD_STATS[-1]['seconds']:.1f}s")
+    print(f"{'':<22} {'seconds':>8} {'claims/s':>9} {'tokens/s':>9} {'precision':>9} {'recall':>7} {'f1':>6}")
+
+    def row(name, seconds, clusters=None, gold=None):
+        cols = f"{name:<22} {seconds:>8.2f} {len(texts) / seconds:>9.2f} {n_tokens / seconds:>9.0f}"
+        if gold is not None:
+            p, r, f = link_scores(gold, clusters)
+            cols += f" {p:>9.3f} {r:>7.3f} {f:>6.3f}"
+        print(cols)
+
+    single, t_single = timed(lambda ts: [coref([t])[0] for t in ts], texts)
+    row("fp32 one at a time", t_single)
+    batched, t_batched = timed(coref, texts)
+    row("fp32 batched", t_batched, batched, single) #padding can nudge the scores, this shows by how much
+    if args.quantize:
+        coref.quantize_model()
+        coref([texts[0]])
+        int8, t_int8 = timed(coref, texts)
+        row("int8 batched", t_int8, int8, batched)
+        same = sum(1 for a, b in zip(batched, int8) if a == b)
+        print(f"int8 gave the same clusters as fp32 on {same}/{len(texts)} claims, "
+              f"{t_batched / t_int8:.2f}x the fp32 batched speed, peak rss {nlploader.peak_rss_mb() or 0:.0f} MB")
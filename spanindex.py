@@ -0,0 +1,80 @@
+from bisect import bisect_left, bisect_right
+
+#span helpers for the rawspacytest pipeline, spans are inclusive (start, end) token index pairs like findBounds returns
+
+
+def drop_nested(spans, longest_first=True):
+    #drops every span that sits inside one we already kept, going left to right, in O(n log n)
+    #longest_first=True: spans with the same start are taken longest first, so only the outermost spans survive
+    #longest_first=False: same start spans go shortest first and dont knock each other out, which is what
+    #decompose_actions has always done with its (start, end) sort
+    if longest_first:
+        kept = []
+        max_end = None
+        for s, e in sorted(set(spans), key=lambda se: (se[0], -se[1])):
+            #everything before this has a start <= s, so it is covered exactly when one of them reaches e
+            if max_end is None or e > max_end:
+                kept.append((s, e))
+                max_end = e
+        return kept
+
+    kept = []
+    max_end = None #furthest end among kept spans with a smaller start
+    group_end = None
+    group_start = None
+    for s, e in sorted(set(spans)):
+        if s != group_start: #new start, the previous group can now cover things
+            if group_end is not None and (max_end is None or group_end > max_end):
+                max_end = group_end
+            group_start, group_end = s, None
+        if max_end is None or e > max_end:
+            kept.append((s, e))
+            if group_end is None or e > group_end:
+                group_end = e
+    return kept
+
+
+class SpanIndex:
+    #static index over spans (plus an optional payload each) for the inside/overlap queries
+    #sorted by start, with a max-end tree on top so overlap searches skip whole runs that end too early
+    def __init__(self, spans, payloads=None):
+        items = sorted(zip(spans, payloads if payloads is not None else [None] * len(spans)), key=lambda it: it[0])
+        self.spans = [sp for sp, _ in items]
+        self.payloads = [p for _, p in items]
+        self.starts = [s for s, _ in self.spans]
+        n = len(self.spans)
+        self.size = 1
+        while self.size < n:
+            self.size *= 2
+        self.max_end = [-1] * (2 * self.size) #leaves at size.., each parent is the max of its two children
+        for i, (_s, e) in enumerate(self.spans):
+            self.max_end[self.size + i] = e
+        for i in range(self.size - 1, 0, -1):
+            self.max_end[i] = max(self.max_end[2 * i], self.max_end[2 * i + 1])
+
+    def __len__(self):
+        return len(self.spans)
+
+    def inside(self, start, end):
+        #(span, payload) for every span within [start, end]
+        lo = bisect_left(self.starts, start)
+        hi = bisect_right(self.starts, end)
+        return [(self.spans[i], self.payloads[i]) for i in range(lo, hi) if self.spans[i][1] <= end]
+
+    def overlapping(self, start, end):
+        #(span, payload) for every span sharing at least one token with [start, end], in start order
+        hi = bisect_right(self.starts, end) #nothing past here starts in time
+        out = []
+        stack = [(1, 0, self.size)]
+        while stack:
+            node, lo, width_end = stack.pop()
+            if lo >= hi or self.max_end[node] < start: #either starts too late or everything under it ends too early
+                continue
+            if node >= self.size:
+                i = node - self.size
+                out.append((self.spans[i], self.payloads[i]))
+                continue
+            mid = (lo + width_end) // 2
+            stack.append((2 * node + 1, mid, width_end)) #right pushed first so the left comes out first
+            stack.append((2 * node, lo, mid))
+        return out
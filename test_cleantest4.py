@@ -0,0 +1,21 @@
+import spacy
+from spacy.tokens import Doc
+
+import cleantest4
+
+
+def mechanism_doc():
+    #"supported" and "operable" both hang off "mechanism", which is outside the requirement span
+    words = ["a", "mechanism", "supported", "by", "the", "frame", "operable", "to", "drive", "the", "column"]
+    heads = [1, 1, 1, 2, 5, 3, 1, 8, 6, 10, 8]
+    deps = ["det", "ROOT", "acl", "agent", "det", "pobj", "amod", "aux", "xcomp", "det", "dobj"]
+    return Doc(spacy.blank("en").vocab, words=words, heads=heads, deps=deps)
+
+
+def test_requirement_with_several_roots_keeps_every_one():
+    doc = mechanism_doc()
+    assert cleantest4.split_req_span(doc[2:]) == ["supported by the frame", "operable to drive the column"]
+
+def test_requirement_with_one_root():
+    doc = mechanism_doc()
+    assert cleantest4.split_req_span(doc[6:]) == ["operable to drive the column"]
@@ -0,0 +1,31 @@
+import nonlpparse
+
+CLAIMS = """1. A device comprising: a housing; and a lid.
+2. The device of claim 1, wherein the lid is red.
+3. The device of claim 2, further comprising: a hinge.
+4. A method of using the device of claim 3, comprising: opening the lid; and closing the lid.
+5. The method of claim 4, wherein the lid is closed slowly."""
+
+
+def test_dependent_claim_takes_parent_subject():
+    claims = {c.number: c for c in nonlpparse.parse_claims(CLAIMS)}
+    assert claims[2].parents == [1]
+    assert (claims[2].preamble, claims[2].root_subject) == ("A device", "A device")
+    assert (claims[3].preamble, claims[3].root_subject) == ("A device", "A device")
+    assert [e.text for e in claims[3].elements] == ["a hinge"]
+
+def test_method_of_using_dependent_claim_keeps_own_preamble():
+    claims = {c.number: c for c in nonlpparse.parse_claims(CLAIMS)}
+    assert claims[4].parents == [3]
+    assert claims[4].preamble == "A method of using the device of claim 3"
+    assert claims[4].root_subject == "A method"
+    assert [e.text for e in claims[4].elements] == ["opening the lid", "closing the lid"]
+    #and a claim hanging off the method claim is a method claim too
+    assert claims[5].preamble == "A method of using the device of claim 3"
+
+def test_claim_sets_in_a_list_dont_share_claim_numbers():
+    raw = ["1. A lid comprising: a hinge.\n2. The lid of claim 1, wherein the hinge is steel.",
+           "1. A method comprising: boiling water.\n2. The method of claim 1, wherein the water is salted."]
+    claims = list(nonlpparse.parse_claims(raw))
+    assert [(c.number, c.parents, c.preamble) for c in claims] == [
+        (1, [], "A lid"), (2, [1], "A lid"), (1, [], "A method"), (2, [1], "A method")]
@@ -1,9 +1,15 @@
-import spacy
 from collections import defaultdict
 
+import antecedents
+import corefcache
+import corefwindow
+import nlploader
+
 #we have two different models, one is a transformer that does the coreference resolution
-nlp_coref = spacy.load("en_coreference_web_trf")
-nlp_parse = spacy.load("en_core_web_lg")
+nlp_coref = nlploader.lazy("en_coreference_web_trf", "full")
+nlp_parse = nlploader.lazy("en_core_web_lg", "attributes") #no ner, getattributes only needs pos/deps/lemmas
+#with COREF_CACHE set, claims resolved on an earlier run come from the cache and never load the model (see corefcache.py)
+coref = corefcache.cached(corefwindow.spacy_coref(nlp_coref), corefcache.spacy_model_id(nlp_coref.model))
 #this other model is used to parse the parts of speech of the given text
 
 text = "A substrate transfer apparatus, comprising: a load lock chamber for generating a" \
@@ -26,28 +32,10 @@ text = "A substrate transfer apparatus, comprising: a load lock chamber for gene
        " in the chamber body opposite the plurality of purge gas ports."
 
 def resolvereferences(text):
-    doc = nlp_coref(text)  # process the text w the spacy nlp pipeline
-
-    tokens = []
-    for t in doc:
-        tokens.append(t.text_with_ws)  # adds tokens to the list if they are there
-    for key in doc.spans:
-        if key.startswith("coref_clusters"):  # checks for keys that match the expected output format of the keys
-            cluster = doc.spans[key]  # gets the item at the key
-            content = cluster[0].text  # the subject
-            cluster_mentions = list(cluster)  # cast the items as a list
-            for i in range(1, len(cluster_mentions)):  # skips first element which is presumed to be the subject
-                mention = cluster_mentions[i]
-                if doc[mention.start:mention.end].text != content:
-                    tokens[mention.start] = content + doc[mention.start].whitespace_
-                    for i in range(mention.start + 1, mention.end):
-                        tokens[i] = ""  # substitutes the mention with the main subject and whitespace
-
-                # Gets rid of the rest of the tokens to avoid duplication
-                for i in range(mention.start + 1, mention.end):
-                    tokens[i] = ""
-    # print(doc.spans.keys())  # prints keyes
-    return "".join(tokens)  #reassembles the modified tokens into one string
+    #"a lid ... the lid" is matched up by the antecedent basis rules, the coref model only runs on the windows with a
+    #pronoun ("it", "which") in them, so most claims never load it (see antecedents.py and corefwindow.py)
+    clusters = antecedents.resolve_clusters(text, coref)
+    return corefwindow.apply_clusters(text, clusters) #each later mention becomes the cluster's first mention
 
 def getattributes(text):
     doc = nlp_parse(text) #we use the other language model here
@@ -88,6 +76,8 @@ def printattributes(attributes):
         for feat in sorted(attributes[np]):
             print("-", feat) #just a quick way to print everything in a nice way
 
+for issue in antecedents.antecedent_basis(text)[1]: #definite mentions with nothing (or more than one thing) to refer to
+    print(f"{issue['problem']} antecedent: {issue['text']}")
 resolved = (resolvereferences(text))
 attr = getattributes(resolved)
 printattributes(attr)